@@ -0,0 +1,129 @@
+import sys
+import asyncio
+from admission import AdmissionController, Overloaded
+
+
+async def _hold(controller, lane, release, order, name, max_wait=None):
+    """Takes a slot in `lane`, records the admission order and keeps the slot until `release` is set."""
+    async with controller.admit(lane, max_wait=max_wait):
+        order.append(name)
+        await release.wait()
+
+
+def test_queue_and_lanes():
+    """Kiểm tra hàng đợi giới hạn, ưu tiên theo làn và từ chối nhanh khi quá tải."""
+    print("\n--- Unit Test for admission module ---")
+
+    async def scenario():
+        controller = AdmissionController(initial_limit=1, max_limit=1, max_queue={"interactive": 2, "batch": 1},
+                                         max_wait=5)
+        release, order = asyncio.Event(), []
+        running = asyncio.create_task(_hold(controller, "interactive", release, order, "first"))
+        await asyncio.sleep(0)
+        assert controller.in_flight == 1
+
+        print("-- Case 1: Full lanes reject at once; waiting requests are admitted by lane, then by arrival")
+        batch = asyncio.create_task(_hold(controller, "batch", release, order, "batch"))
+        await asyncio.sleep(0)
+        interactive = [asyncio.create_task(_hold(controller, "interactive", release, order, f"i{n}"))
+                       for n in range(2)]
+        await asyncio.sleep(0)
+        assert controller.queued("interactive") == 2 and controller.queued("batch") == 1
+        try:
+            await controller.acquire("batch")
+            assert False, "The batch lane is full"
+        except Overloaded as e:
+            assert e.retry_after >= 1
+        try:
+            await controller.acquire("bulk")
+            assert False, "Unknown lanes are refused"
+        except ValueError:
+            pass
+
+        release.set()
+        await asyncio.gather(running, batch, *interactive)
+        assert order == ["first", "i0", "i1", "batch"], order
+        assert controller.in_flight == 0 and controller.queued() == 0
+        print("   -> Result (Case 1): Success!")
+
+        print("-- Case 2: A request that waits too long is rejected and leaves the queue")
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, "interactive", release, order, "long"))
+        await asyncio.sleep(0)
+        try:
+            await controller.acquire("interactive", max_wait=0.05)
+            assert False, "No slot frees up within 50 ms"
+        except Overloaded:
+            pass
+        assert controller.queued() == 0
+        release.set()
+        await running
+        assert controller.in_flight == 0
+        print("   -> Result (Case 2): Success!")
+
+        print("-- Case 3: A client that goes away does not keep its place or slot")
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, "interactive", release, order, "held"))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(controller.acquire("interactive"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        release.set()
+        await running
+        assert controller.in_flight == 0 and controller.queued() == 0
+        assert controller.summary()["rejected"] == 2
+        print("   -> Result (Case 3): Success!")
+
+    asyncio.run(scenario())
+
+
+def test_adaptive_limit():
+    """Kiểm tra giới hạn đồng thời tăng khi độ trễ ổn định và giảm khi độ trễ tăng."""
+    print("\n-- Case 4: The limit grows while latency is stable and the limit is used")
+    controller = AdmissionController(initial_limit=4, min_limit=2, max_limit=20)
+    for _ in range(30):
+        controller._in_flight = controller.limit
+        controller.release(1.0)
+    grown = controller.limit
+    assert grown > 4, grown
+
+    # An idle server does not raise its limit.
+    idle = AdmissionController(initial_limit=4)
+    for _ in range(30):
+        idle._in_flight = 1
+        idle.release(1.0)
+    assert idle.limit == 4
+    print(f"   -> Result (Case 4): Success! (limit {grown})")
+
+    print("-- Case 5: The limit shrinks when requests get slower, down to min_limit")
+    for _ in range(10):
+        controller._in_flight = controller.limit
+        controller.release(5.0)
+    assert controller.limit < grown
+    for _ in range(20):
+        controller._in_flight = controller.limit
+        controller.release(20.0)
+    assert controller.limit <= grown // 2, controller.limit
+
+    small = AdmissionController(initial_limit=4, min_limit=3)
+    for latency in [1.0] + [100.0] * 20:
+        small._in_flight = small.limit
+        small.release(latency)
+    assert small.limit == 3
+    print("   -> Result (Case 5): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_queue_and_lanes()
+        test_adaptive_limit()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
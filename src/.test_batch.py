@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import re
+import tempfile
+from batch import run_batch, completed_ids
+from tools import ToolManager, BaseTool, Final_Answer
+from prompt_template import PromptTemplate
+
+
+class _Agent:
+    """Answers every prompt with a Final_Answer plan, except prompts containing 'broken'."""
+    def __init__(self):
+        self.prompts = []
+
+    def run(self, prompt, hints=None):
+        question = re.search(r"User Input: (.*)", prompt).group(1).strip()
+        self.prompts.append(question)
+        if "broken" in question:
+            # Neither a plan nor a text answer: the executor gives up with a bare message.
+            return {"content": {"oops": True}, "duration": 0.0, "token_usage": 1}
+        return {"content": [{"action": "Final_Answer", "action_input": [question.upper()], "result_id": "a"}],
+                "duration": 0.0, "token_usage": 1}
+
+
+def _agent_stack(agent):
+    tool_manager = ToolManager()
+    tool_manager.add_tool(BaseTool("Final_Answer", Final_Answer), pinned=True)
+    prompt_template = PromptTemplate(system_prompt="{tool_descriptions}", user_input="{user_input}",
+                                     history="{history}", tool_manager=tool_manager)
+    return agent, tool_manager, prompt_template
+
+
+def _write_lines(path: str, lines) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _records(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_batch():
+    """Kiểm tra chế độ batch: ghi kết quả, đếm lỗi và chạy tiếp đúng các câu chưa hoàn thành."""
+    print("\n--- Unit Test for batch module ---")
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "prompts.jsonl")
+        output = os.path.join(tmp, "results.jsonl")
+        _write_lines(source, [json.dumps({"id": "a", "prompt": "first"}),
+                              "plain text prompt",
+                              "",
+                              json.dumps({"id": "b", "prompt": "broken one"})])
+
+        print("-- Case 1: Every prompt gets a record; a bare failure message counts as an error")
+        agent = _Agent()
+        counts = run_batch(source, output, concurrency=2, task=True, agent_stack=_agent_stack(agent))
+        assert counts == {"ok": 2, "error": 1, "skipped": 0}, counts
+        records = {record["id"]: record for record in _records(output)}
+        assert set(records) == {"a", "line-2", "b"}, records
+        assert records["a"]["status"] == "ok" and "FIRST" in records["a"]["output"]
+        assert "PLAIN TEXT PROMPT" in records["line-2"]["output"]
+        assert records["b"]["status"] == "error" and "valid plan" in records["b"]["error"], records["b"]
+        print("   -> Result (Case 1): Success!")
+
+        print("-- Case 2: A restarted batch skips answered ids and retries failed ones")
+        assert completed_ids(output) == {"a", "line-2"}
+        agent = _Agent()
+        counts = run_batch(source, output, concurrency=2, task=True, agent_stack=_agent_stack(agent))
+        assert counts == {"ok": 0, "error": 1, "skipped": 2}, counts
+        assert agent.prompts == ["broken one"], agent.prompts
+        print("   -> Result (Case 2): Success!")
+
+        print("-- Case 3: A partial last line left by a crash is run again")
+        with open(output, "a", encoding="utf-8") as f:
+            f.write('{"id": "c", "status": "o')
+        _write_lines(source, [json.dumps({"id": "c", "prompt": "third"})])
+        assert "c" not in completed_ids(output)
+        counts = run_batch(source, output, concurrency=1, task=True, agent_stack=_agent_stack(_Agent()))
+        assert counts == {"ok": 1, "error": 0, "skipped": 0}, counts
+        assert "c" in completed_ids(output)
+        assert [record["id"] for record in _records(output)].count("c") == 1
+        print("   -> Result (Case 3): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_batch()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import tempfile
+from checkpoint import CheckpointStore
+from tools import ToolManager, BaseTool, Final_Answer
+from agent_executor import AgentExecutor
+from prompt_template import PromptTemplate
+
+
+class _WorkerRestart(BaseException):
+    """Simulates the process being stopped in the middle of a step."""
+
+
+class _ScriptedAgent:
+    """Returns the given plans in order; an exception in the list is raised instead."""
+    def __init__(self, plans):
+        self.plans = list(plans)
+        self.calls = 0
+
+    def run(self, prompt, hints=None):
+        self.calls += 1
+        plan = self.plans.pop(0)
+        if isinstance(plan, BaseException):
+            raise plan
+        return {"content": plan, "duration": 0.0, "token_usage": 10}
+
+
+def test_checkpoint_store():
+    """Kiểm tra lưu, đọc, xóa và dọn dẹp checkpoint trong SQLite."""
+    print("\n--- Unit Test for checkpoint module ---")
+    with tempfile.TemporaryDirectory() as tmp:
+        print("-- Case 1: State is saved and loaded by run id and question")
+        store = CheckpointStore(os.path.join(tmp, "checkpoints.db"), ttl=60)
+        store.save("r1", "question", {"iteration": 2, "context": {"a": 1}})
+        assert store.load("r1", "question") == {"iteration": 2, "context": {"a": 1}}
+        assert store.load("r1", "another question") is None
+        assert store.load("r2") is None
+        store.delete("r1")
+        assert len(store) == 0
+        print("   -> Result (Case 1): Success!")
+
+        print("-- Case 2: Old checkpoints are cleaned up")
+        store = CheckpointStore(os.path.join(tmp, "checkpoints.db"), ttl=0.05)
+        store.save("old", "q", {})
+        time.sleep(0.1)
+        assert store.load("old") is None
+        assert store.cleanup() == 1 and len(store) == 0
+        print("   -> Result (Case 2): Success!")
+
+
+def _executor(agent, tool_manager, store, max_iterations=3):
+    prompt_template = PromptTemplate(system_prompt="Tools:\n{tool_descriptions}", user_input="{user_input}",
+                                     history="{history}", tool_manager=tool_manager)
+    return AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,
+                         max_iterations=max_iterations, json_output=True, checkpoint_store=store)
+
+
+def test_executor_resume():
+    """Kiểm tra chạy lại với cùng run id tiếp tục từ bước đã hoàn thành, không gọi lại LLM và SQL."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CheckpointStore(os.path.join(tmp, "checkpoints.db"))
+        queries = []
+        tool_manager = ToolManager()
+        tool_manager.add_tool(BaseTool("expensive", lambda q: queries.append(q) or 42))
+        tool_manager.add_tool(BaseTool("Final_Answer", Final_Answer), pinned=True)
+
+        print("\n-- Case 3: A run that fails on an LLM call resumes at that iteration")
+        first_plan = [{"action": "expensive", "action_input": ["q1"], "result_id": "a"}]
+        agent = _ScriptedAgent([first_plan, ConnectionError("network down")])
+        executor = _executor(agent, tool_manager, store)
+        try:
+            executor.run("question", run_id="run-1")
+            assert False, "The network error should propagate"
+        except ConnectionError:
+            pass
+        assert len(store) == 1
+
+        agent = _ScriptedAgent([[{"action": "Final_Answer", "action_input": ["Answer @0", "$a"], "result_id": "f"}]])
+        executor = _executor(agent, tool_manager, store)
+        output, _ = executor.run("question", run_id="run-1")
+        assert "Answer 42" in output, output
+        assert queries == ["q1"] and agent.calls == 1
+        assert executor.total_token_usage == 20, "Token usage of the first attempt must be kept"
+        assert len(store) == 0, "Finished runs are removed"
+        print("   -> Result (Case 3): Success!")
+
+        print("-- Case 4: A run stopped inside a plan resumes at the next step")
+        queries.clear()
+        crashes = [_WorkerRestart()]
+
+        def flaky(value):
+            if crashes:
+                raise crashes.pop()
+            return value + 1
+        tool_manager.add_tool(BaseTool("flaky", flaky))
+        plan = [{"action": "expensive", "action_input": ["q2"], "result_id": "a"},
+                {"action": "flaky", "action_input": ["$a"], "result_id": "b"},
+                {"action": "Final_Answer", "action_input": ["Answer @0", "$b"], "result_id": "f"}]
+        executor = _executor(_ScriptedAgent([plan]), tool_manager, store)
+        try:
+            executor.run("question 2", run_id="run-2")
+            assert False, "The restart should propagate"
+        except _WorkerRestart:
+            pass
+
+        agent = _ScriptedAgent([])
+        output, _ = _executor(agent, tool_manager, store).run("question 2", run_id="run-2")
+        assert "Answer 43" in output, output
+        assert queries == ["q2"] and agent.calls == 0
+        print("   -> Result (Case 4): Success!")
+
+        print("-- Case 5: Without a run id nothing is checkpointed")
+        output, _ = _executor(_ScriptedAgent([plan]), tool_manager, store).run("question 3")
+        assert "Answer 43" in output and len(store) == 0
+        print("   -> Result (Case 5): Success!")
+
+        print("-- Case 6: A result that cannot be pickled skips the checkpoint instead of failing the run")
+        import threading
+        tool_manager.add_tool(BaseTool("lock", threading.Lock))
+        plan = [{"action": "lock", "action_input": [], "result_id": "a"},
+                {"action": "Final_Answer", "action_input": ["Done"], "result_id": "f"}]
+        store.save("locked", "q", {"iteration": 0})
+        store.save("locked", "q", {"context": {"a": threading.Lock()}})
+        assert store.load("locked", "q") == {"iteration": 0}, "The previous checkpoint is kept"
+        store.delete("locked")
+        output, _ = _executor(_ScriptedAgent([plan]), tool_manager, store).run("question 4", run_id="run-4")
+        assert "Done" in output, output
+        print("   -> Result (Case 6): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_checkpoint_store()
+        test_executor_resume()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
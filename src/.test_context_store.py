@@ -0,0 +1,95 @@
+import os
+import sys
+from context_store import ContextStore
+from tools import ToolManager, BaseTool, Final_Answer
+from agent_executor import AgentExecutor
+from prompt_template import PromptTemplate
+
+
+def test_context_store():
+    """Kiểm tra kho ngữ cảnh: giá trị lớn chỉ hiện dạng tham chiếu, tràn ra file khi vượt giới hạn bộ nhớ."""
+    print("\n--- Unit Test for context_store module ---")
+    print("-- Case 1: Small values are inlined, large ones shown as handles")
+    store = ContextStore(max_memory_bytes=10_000, inline_chars=50, preview_chars=10)
+    store["total"] = 1250000
+    store["rows"] = "row " * 1000
+    rendered = store.render()
+    assert "'total': 1250000" in rendered
+    assert "<$rows: str, 4000 chars, preview: 'row row ro'...>" in rendered
+    assert len(rendered) < 200
+    assert store["rows"] == "row " * 1000, "The full value must still be available"
+    print("   -> Result (Case 1): Success!")
+
+    print("-- Case 2: Values beyond the memory cap are spilled and read back")
+    store["big1"] = "a" * 8000
+    store["big2"] = "b" * 8000
+    assert store.memory_bytes <= store.max_memory_bytes
+    spilled = list(store._spilled.values())
+    assert spilled and all(os.path.exists(path) for path in spilled)
+    assert store["big1"] == "a" * 8000 and store["rows"] == "row " * 1000
+    assert list(store) == ["total", "rows", "big1", "big2"] and "big1" in store
+    print("   -> Result (Case 2): Success!")
+
+    print("-- Case 3: Clearing removes values and spilled files")
+    store.clear()
+    assert len(store) == 0 and store.memory_bytes == 0
+    assert not any(os.path.exists(path) for path in spilled)
+    assert store.get("total") is None
+    print("   -> Result (Case 3): Success!")
+
+
+class _ScriptedAgent:
+    """Returns the given plans in order, recording the prompts it receives."""
+    def __init__(self, plans):
+        self.plans = list(plans)
+        self.prompts = []
+
+    def run(self, prompt, hints=None):
+        self.prompts.append(prompt)
+        return {"content": self.plans.pop(0), "duration": 0.0, "token_usage": 1}
+
+
+def test_executor_context():
+    """Kiểm tra ngữ cảnh được làm mới cho mỗi lần chạy và kết quả lớn vẫn được truyền đầy đủ cho công cụ."""
+    print("\n-- Case 4: Large results reach tools in full but not the prompt")
+    tool_manager = ToolManager()
+    received = []
+    tool_manager.add_tool(BaseTool("big_query", lambda: "x" * 100_000))
+    tool_manager.add_tool(BaseTool("count_chars", lambda text: received.append(text) or len(text)))
+    tool_manager.add_tool(BaseTool("Final_Answer", Final_Answer), pinned=True)
+    prompt_template = PromptTemplate(system_prompt="Tools:\n{tool_descriptions}", user_input="{user_input}",
+                                     history="{history}", tool_manager=tool_manager)
+    agent = _ScriptedAgent([
+        [{"action": "big_query", "action_input": [], "result_id": "rows"},
+         {"action": "count_chars", "action_input": ["$rows"], "result_id": "n"}],
+        [{"action": "Final_Answer", "action_input": ["Chars: @0", "$n"], "result_id": "final"}],
+    ])
+    executor = AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,
+                             max_iterations=2, json_output=True)
+    output, _ = executor.run("question")
+    assert "Chars: 100000" in output, output
+    assert received == ["x" * 100_000]
+    assert "<$rows: str, 100000 chars" in agent.prompts[1] and len(agent.prompts[1]) < 20_000
+    print("   -> Result (Case 4): Success!")
+
+    print("-- Case 5: Results do not leak into the next run")
+    assert len(executor.context) == 0
+    agent.plans = [[{"action": "count_chars", "action_input": ["$rows"], "result_id": "n"}]] * 2
+    output, _ = executor.run("another question")
+    assert output.startswith("The agent's plan is invalid") and "'$rows' does not refer" in output
+    print("   -> Result (Case 5): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_context_store()
+        test_executor_context()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
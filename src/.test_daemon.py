@@ -0,0 +1,99 @@
+import io
+import os
+import sys
+import socket
+import tempfile
+import threading
+from daemon import AgentServer, send_prompt
+from tools import ToolManager, BaseTool, ToolPolicy, Final_Answer
+from prompt_template import PromptTemplate
+
+
+def shout(text: str):
+    """Prints a line from the tool thread and returns the text in upper case."""
+    print(f"tool says {text}")
+    return text.upper()
+
+
+class _Agent:
+    def run(self, prompt, hints=None):
+        if "broken" in prompt:
+            return {"content": {"oops": True}, "duration": 0.1, "token_usage": 1}
+        return {"content": [{"action": "shout", "action_input": ["hello"], "result_id": "a"},
+                            {"action": "Final_Answer", "action_input": ["$a"], "result_id": "b"}],
+                "duration": 0.5, "token_usage": 7}
+
+
+def _agent_stack():
+    tool_manager = ToolManager()
+    # A policy runs the tool on the tool thread pool, not on the request thread.
+    tool_manager.add_tool(BaseTool("shout", shout, policy=ToolPolicy(timeout=5)))
+    tool_manager.add_tool(BaseTool("Final_Answer", Final_Answer), pinned=True)
+    prompt_template = PromptTemplate(system_prompt="{tool_descriptions}", user_input="{user_input}",
+                                     history="{history}", tool_manager=tool_manager)
+    return _Agent(), tool_manager, prompt_template
+
+
+def test_daemon():
+    """Kiểm tra daemon: trả lời yêu cầu qua unix socket, gửi log của công cụ về client và không chiếm socket đang dùng."""
+    print("\n--- Unit Test for daemon module ---")
+    real_stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "agent.sock")
+        server = AgentServer(socket_path, _agent_stack())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            print("-- Case 1: A request round-trips over the socket, with the logs of tool threads")
+            out, leaked = io.StringIO(), io.StringIO()
+            server.stdout.stream = leaked
+            result = send_prompt(socket_path, "say hello", task=True, out=out)
+            server.stdout.stream = real_stdout
+            assert result["type"] == "result" and "HELLO" in result["output"], result
+            assert result["token_usage"] == 7
+            assert "tool says hello" in out.getvalue(), out.getvalue()
+            assert "tool says" not in leaked.getvalue(), leaked.getvalue()
+            print("   -> Result (Case 1): Success!")
+
+            print("-- Case 2: A second daemon does not take over a live socket")
+            try:
+                AgentServer(socket_path, _agent_stack())
+                assert False, "The socket is in use"
+            except RuntimeError as e:
+                assert "already listening" in str(e)
+            assert send_prompt(socket_path, "again", task=True, out=io.StringIO())["type"] == "result"
+            print("   -> Result (Case 2): Success!")
+
+            print("-- Case 3: A run the executor gives up on still answers with its message")
+            result = send_prompt(socket_path, "broken", task=True, out=io.StringIO())
+            assert result["type"] == "result" and "valid plan" in result["output"], result
+            assert result["token_usage"] == 1, result
+            print("   -> Result (Case 3): Success!")
+        finally:
+            server.shutdown()
+            server.server_close()
+            sys.stdout = real_stdout
+
+        print("-- Case 4: A socket left by a dead daemon is replaced")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale_path = os.path.join(tmp, "stale.sock")
+        stale.bind(stale_path)
+        stale.close()
+        server = AgentServer(stale_path, _agent_stack())
+        server.server_close()
+        sys.stdout = real_stdout
+        print("   -> Result (Case 4): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_daemon()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,147 @@
+import sys
+import time
+from tools import ToolManager, BaseTool, Final_Answer, current_cancel_token, deadline_scope, remaining_time
+from agent_executor import AgentExecutor
+from prompt_template import PromptTemplate
+from llm_abstraction import LLM, LLMScheduler
+
+
+def _slow(seconds):
+    """Sleeps, stopping early when its call is cancelled."""
+    token = current_cancel_token()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if token is not None and token.cancelled:
+            return "stopped"
+        time.sleep(0.01)
+    return "slept"
+
+
+class _ScriptedAgent:
+    """Returns the given plans in order, after `delay` seconds, recording the timeouts it gets."""
+    def __init__(self, plans, delay=0.0):
+        self.plans = list(plans)
+        self.delay = delay
+        self.timeouts = []
+
+    def run(self, prompt, hints=None, timeout=None):
+        self.timeouts.append(timeout)
+        if timeout is not None and self.delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("request timed out")
+        time.sleep(self.delay)
+        return {"content": self.plans.pop(0), "duration": self.delay, "token_usage": 1}
+
+
+def _executor(agent, max_iterations=3):
+    tool_manager = ToolManager()
+    tool_manager.add_tool(BaseTool("fast", lambda: 42))
+    tool_manager.add_tool(BaseTool("slow", _slow))
+    tool_manager.add_tool(BaseTool("Final_Answer", Final_Answer), pinned=True)
+    prompt_template = PromptTemplate(system_prompt="{tool_descriptions}", user_input="{user_input}",
+                                     history="{history}", tool_manager=tool_manager)
+    return AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,
+                         max_iterations=max_iterations, json_output=True)
+
+
+def test_tool_deadline():
+    """Kiểm tra công cụ chỉ được chạy trong thời gian còn lại và bị hủy khi hết hạn."""
+    print("\n--- Unit Test for deadline-aware execution ---")
+    print("-- Case 1: A tool call is cancelled when the run's deadline passes")
+    tool = BaseTool("slow", _slow)
+    assert remaining_time() is None and tool.run(0.01) == "slept", "Without a deadline tools run inline"
+    with deadline_scope(time.monotonic() + 0.1):
+        assert 0 < remaining_time() <= 0.1
+        start = time.monotonic()
+        result = tool.run(5)
+        assert time.monotonic() - start < 1.0
+        assert result["error"] == "DeadlineExceeded", result
+        assert tool.run(0.01)["error"] == "DeadlineExceeded", "No call starts after the deadline"
+    print("   -> Result (Case 1): Success!")
+
+
+def test_executor_deadline():
+    """Kiểm tra tác tử trả về câu trả lời tốt nhất hiện có, đánh dấu là chưa đầy đủ, khi hết thời gian."""
+    print("\n-- Case 2: The last Final_Answer candidate is returned when a step runs out of time")
+    plan = [{"action": "fast", "action_input": [], "result_id": "a"},
+            {"action": "slow", "action_input": [5], "result_id": "b"},
+            {"action": "Final_Answer", "action_input": ["Total @0", "$a"], "result_id": "f"}]
+    executor = _executor(_ScriptedAgent([plan]))
+    start = time.monotonic()
+    output, _ = executor.run("question", timeout_ms=300)
+    assert time.monotonic() - start < 1.5
+    assert "Total 42" in output and executor.partial, output
+    print("   -> Result (Case 2): Success!")
+
+    print("-- Case 3: An iteration that cannot finish in time is not started")
+    agent = _ScriptedAgent([[{"action": "fast", "action_input": [], "result_id": "a"}]] * 3, delay=0.2)
+    executor = _executor(agent)
+    output, _ = executor.run("question", deadline=time.time() + 0.3)
+    assert len(agent.timeouts) == 1, "The second iteration would not fit in the time left"
+    assert executor.partial and "Results so far" in output and "'a': 42" in output, output
+    print("   -> Result (Case 3): Success!")
+
+    print("-- Case 4: The LLM call gets the time left and is abandoned when it runs out")
+    agent = _ScriptedAgent([], delay=5)
+    executor = _executor(agent)
+    output, response_obj = executor.run("question", timeout_ms=150)
+    assert 0 < agent.timeouts[0] <= 0.15
+    assert executor.partial and response_obj is None
+    assert output == "The time budget ran out before any result was available."
+    print("   -> Result (Case 4): Success!")
+
+    print("-- Case 5: Runs with enough time are not partial")
+    executor = _executor(_ScriptedAgent([[plan[0], plan[2]]]))
+    output, _ = executor.run("question", timeout_ms=5000)
+    assert "Total 42" in output and not executor.partial
+    print("   -> Result (Case 5): Success!")
+
+
+def test_llm_timeout():
+    """Kiểm tra LLM truyền thời gian chờ cho yêu cầu HTTP và không chờ slot quá thời gian còn lại."""
+    print("\n-- Case 6: The LLM request carries the time left as its HTTP timeout")
+
+    class _Models:
+        def __init__(self):
+            self.configs = []
+
+        def generate_content(self, model, contents, config=None):
+            self.configs.append(config)
+            response = type("Response", (), {})()
+            response.text = "ok"
+            return response
+
+    class _Client:
+        models = _Models()
+
+    llm = LLM(model_name="flash", client=_Client())
+    llm.generate_content("hello")
+    llm.generate_content("hello", timeout=2.0)
+    assert _Client.models.configs[0] is None
+    assert 1900 <= _Client.models.configs[1]["http_options"]["timeout"] <= 2000
+
+    scheduler = LLMScheduler(max_concurrent=1)
+    llm = LLM(model_name="flash", client=_Client(), scheduler=scheduler)
+    with scheduler.slot():
+        try:
+            llm.generate_content("hello", timeout=0.05)
+            assert False, "No slot is free"
+        except TimeoutError:
+            pass
+    print("   -> Result (Case 6): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_tool_deadline()
+        test_executor_deadline()
+        test_llm_timeout()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
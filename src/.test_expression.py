@@ -0,0 +1,92 @@
+import sys
+from expression import evaluate, to_value, ExpressionError
+from tools import evaluate_expression
+
+
+def _fails(expression, variables=None, message=""):
+    try:
+        evaluate(expression, variables)
+    except ExpressionError as e:
+        assert message in str(e), str(e)
+        return
+    assert False, f"'{expression}' should be refused"
+
+
+def test_arithmetic():
+    """Kiểm tra tính biểu thức số học với biến và danh sách trong một bước."""
+    print("\n--- Unit Test for expression module ---")
+    print("-- Case 1: Whole expressions with variables")
+    assert evaluate("(a + b + c) / months", {"a": 10, "b": 20, "c": 30, "months": 3}) == 20
+    assert evaluate("$a * 2 - 1", {"a": "1,250,000"}) == 2499999
+    assert evaluate("2 ** 10 // 3 % 7") == 5
+    assert evaluate("round(10 / 3, 2)") == 3.33
+    print("   -> Result (Case 1): Success!")
+
+    print("-- Case 2: Lists are evaluated element-wise and reduced with NumPy")
+    sales = [100, 120, 90, 150]
+    assert evaluate("sum(x)", {"x": sales}) == 460
+    assert evaluate("mean(x)", {"x": sales}) == 115
+    assert evaluate("pct_change(x) * 100", {"x": [100, 120, 90]}) == [20, -25]
+    assert evaluate("x - y", {"x": [5, 7], "y": [1, 2]}) == [4, 5]
+    assert evaluate("sum(x[-2:]) + x[0]", {"x": sales}) == 340
+    assert evaluate("max(a, b, c)", {"a": 1, "b": 9, "c": 3}) == 9
+    assert evaluate("share([1, 3])") == [0.25, 0.75]
+    print("   -> Result (Case 2): Success!")
+
+
+def test_tool_results():
+    """Kiểm tra đọc kết quả truy vấn dạng bảng và dạng 'nhãn: giá trị' thành cột số."""
+    print("\n-- Case 3: Query tables and grouped results become columns")
+    import pandas as pd
+    table = pd.DataFrame({"thang": ["2025-01", "2025-02", "2025-03"],
+                          "Rmks": ["KH 01", None, "NGUYEN, NGOC MINH"],
+                          "total net": [1250000.5, -300.0, 4200000.0]}).to_string()
+    assert list(to_value(table)) == [1250000.5, -300.0, 4200000.0]
+    assert evaluate("sum(t)", {"t": table}) == 5449700.5
+
+    two_columns = pd.DataFrame({"month": ["01", "02"], "sales": [10, 20], "refunds": [1, 3]}).to_string()
+    assert evaluate('sum(t["sales"]) - sum(t["refunds"])', {"t": two_columns}) == 26
+    _fails("sum(t)", {"t": two_columns}, message="has several columns (month, sales, refunds)")
+
+    grouped = "2025-01 | S: 100\n2025-02 | S: 150"
+    assert evaluate("last(g) / first(g)", {"g": grouped}) == 1.5
+    truncated = pd.DataFrame({"v": [1, 2]}).to_string() + "\n(showing the first 2 rows; add filters)"
+    assert evaluate("count(v)", {"v": truncated}) == 2
+    print("   -> Result (Case 3): Success!")
+
+
+def test_safety():
+    """Kiểm tra biểu thức không an toàn hoặc không hợp lệ bị từ chối với thông báo rõ ràng."""
+    print("\n-- Case 4: Only arithmetic is allowed")
+    _fails("__import__('os').system('echo hi')", message="unknown function")
+    _fails("x.__class__", {"x": 1}, message="not allowed")
+    _fails("[i for i in range(3)]", message="not allowed")
+    _fails("unknown + 1", message="unknown name 'unknown'")
+    _fails("1 / 0", message="not finite")
+    _fails("1 +", message="invalid syntax")
+    _fails("+".join(["1"] * 900), message="")
+    _fails("sum(x)", {"x": {"error": "ToolTimeout", "message": "timed out"}}, message="error result")
+    print("   -> Result (Case 4): Success!")
+
+    print("-- Case 5: The tool returns errors as messages")
+    assert evaluate_expression("sum(x) / 2", {"x": [2, 4]}) == 3
+    assert evaluate_expression("open('f')").startswith("Cannot evaluate 'open('f')': unknown function")
+    for expression in ["first([])", "max([])", "round(2.5, 1e300)"]:
+        assert evaluate_expression(expression).startswith(f"Cannot evaluate '{expression}': "), expression
+    print("   -> Result (Case 5): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_arithmetic()
+        test_tool_results()
+        test_safety()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
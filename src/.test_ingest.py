@@ -0,0 +1,96 @@
+import os
+import csv
+import sys
+import sqlite3
+import tempfile
+from ingest import ingest, COLUMNS, TABLE_NAME
+
+HEADER = [name.replace("_", " ") for name, _ in COLUMNS]
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+
+def balances(db_file):
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute(f'SELECT "Số_CT_Doc_Nbr", "Tiền_nợ" FROM {TABLE_NAME} ORDER BY "Ngày_CT_Issue_date", rowid').fetchall()
+    conn.close()
+    return rows
+
+def test_ingest():
+    """Kiểm tra nạp CSV theo lô, loại bỏ trùng lặp và tính lại số dư công nợ."""
+    print("\n--- Unit Test for ingest module ---")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "sales.db")
+        january = os.path.join(tmp, "2025_01.csv")
+        write_csv(january, [
+            (1, "02/01/2025", "DOC1", "HANSGN", "A", "", "S", "VND", 1, "1,000", "1,000", "101,000", "KH1"),
+            (2, "02/01/2025", "DOC2", "SGNHAN", "B", "", "S", "VND", 1, "2,000", "2,000", "103,000", "KH2"),
+            (3, "03/01/2025", "DOC3", "", "Bank", "", "D", "VND", 1, "0", "-500", "102,500", ""),
+        ])
+
+        print("-- Case 1: Fresh load keeps the CSV opening balance")
+        stats = ingest([january], db_file=db_file, chunk_size=2, verbose=False)
+        assert stats["inserted"] == 3 and stats["duplicates"] == 0, stats
+        assert balances(db_file) == [("DOC1", 101000), ("DOC2", 103000), ("DOC3", 102500)]
+        print("   -> Result (Case 1): Success!")
+
+        print("-- Case 2: Reloading the same file inserts nothing")
+        stats = ingest([january], db_file=db_file, verbose=False)
+        assert stats["inserted"] == 0 and stats["duplicates"] == 3, stats
+        print("   -> Result (Case 2): Success!")
+
+        print("-- Case 3: Late rows only rebalance from the first changed row onward")
+        late = os.path.join(tmp, "late.csv")
+        write_csv(late, [
+            (4, "02/01/2025", "DOC1", "HANSGN", "A", "", "S", "VND", 1, "1,000", "1,000", "0", "KH1"),
+            (5, "02/01/2025", "DOC4", "HANDAD", "C", "", "S", "VND", 1, "300", "300", "0", "KH3"),
+            (6, "04/01/2025", "DOC5", "DADHAN", "D", "", "S", "VND", 1, "700", "700", "0", "KH3"),
+        ])
+        stats = ingest([late], db_file=db_file, verbose=False)
+        assert stats["inserted"] == 2 and stats["duplicates"] == 1, stats
+        assert balances(db_file) == [("DOC1", 101000), ("DOC2", 103000), ("DOC4", 103300),
+                                     ("DOC3", 102800), ("DOC5", 103500)], balances(db_file)
+        assert stats["rebalanced"] == 3, stats
+        print("   -> Result (Case 3): Success!")
+
+        print("-- Case 4: A failed load keeps the indexes and rebalances the rows it committed")
+        db_file = os.path.join(tmp, "failed.db")
+        first = os.path.join(tmp, "first.csv")
+        write_csv(first, [(1, "02/01/2025", "DOC1", "", "A", "", "S", "VND", 1, "1,000", "1,000", "100,000", "KH1")])
+        ingest([first], db_file=db_file, verbose=False)
+        conn = sqlite3.connect(db_file)
+        conn.execute(f'CREATE INDEX ix_rmks ON {TABLE_NAME} ("Rmks")')
+        conn.commit()
+        conn.close()
+        broken = os.path.join(tmp, "broken.csv")
+        write_csv(broken, [
+            (2, "03/01/2025", "DOC2", "", "B", "", "S", "VND", 1, "500", "500", "0", "KH2"),
+            (3, "not a date", "DOC3", "", "C", "", "S", "VND", 1, "700", "700", "0", "KH3"),
+        ])
+        try:
+            ingest([broken], db_file=db_file, chunk_size=1, commit_every=1, verbose=False)
+            assert False, "The bad date should stop the load"
+        except ValueError:
+            pass
+        conn = sqlite3.connect(db_file)
+        indexes = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        conn.close()
+        assert "ix_rmks" in indexes, indexes
+        assert balances(db_file) == [("DOC1", 100000), ("DOC2", 100500)], balances(db_file)
+        print("   -> Result (Case 4): Success!")
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_ingest()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
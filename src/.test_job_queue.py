@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+from job_queue import JobQueue, QueueFull
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_job_queue():
+    """Kiểm tra hàng đợi công việc: ưu tiên, giới hạn theo khách hàng, hủy và khôi phục sau khi khởi động lại."""
+    print("\n--- Unit Test for job_queue module ---")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.db")
+        order = []
+        release = threading.Event()
+
+        def handler(job_id, payload, cancel_token):
+            order.append(payload["name"])
+            if payload.get("block"):
+                while not release.is_set() and not cancel_token.cancelled:
+                    time.sleep(0.01)
+            return {"answer": payload["name"].upper()}
+
+        print("-- Case 1: Jobs run by priority and results are kept")
+        queue = JobQueue(handler, path=path, workers=1, max_running_per_client=1, poll_interval=0.05)
+        low = queue.submit({"name": "low"}, client_id="a", priority=0)
+        high = queue.submit({"name": "high"}, client_id="b", priority=5)
+        assert queue.get(low)["status"] == "queued" and queue.get(low)["position"] == 1
+        queue.start()
+        assert _wait_for(lambda: queue.get(low)["status"] == "done")
+        assert order == ["high", "low"]
+        assert queue.get(high)["result"] == {"answer": "HIGH"}
+        queue.stop()
+        print("   -> Result (Case 1): Success!")
+
+        print("-- Case 2: One client cannot occupy every worker")
+        order.clear()
+        queue = JobQueue(handler, path=path, workers=2, max_running_per_client=1, poll_interval=0.05).start()
+        first = queue.submit({"name": "a1", "block": True}, client_id="a")
+        assert _wait_for(lambda: queue.get(first)["status"] == "running")
+        queue.submit({"name": "a2"}, client_id="a", priority=9)
+        other = queue.submit({"name": "b1"}, client_id="b")
+        assert _wait_for(lambda: queue.get(other)["status"] == "done")
+        assert order == ["a1", "b1"], order
+        release.set()
+        assert _wait_for(lambda: order == ["a1", "b1", "a2"])
+        queue.stop()
+        print("   -> Result (Case 2): Success!")
+
+        print("-- Case 3: Queued and running jobs can be cancelled")
+        release.clear()
+        queue = JobQueue(handler, path=path, workers=1, poll_interval=0.05).start()
+        running = queue.submit({"name": "long", "block": True}, client_id="c")
+        assert _wait_for(lambda: queue.get(running)["status"] == "running")
+        waiting = queue.submit({"name": "never"}, client_id="d")
+        assert queue.cancel(waiting) and queue.get(waiting)["status"] == "cancelled"
+        assert queue.cancel(running)
+        assert _wait_for(lambda: queue.get(running)["status"] == "cancelled")
+        assert "never" not in order
+        assert not queue.cancel(running), "Finished jobs cannot be cancelled"
+        queue.stop()
+        print("   -> Result (Case 3): Success!")
+
+        print("-- Case 4: Per-client queue limit")
+        queue = JobQueue(handler, path=path, max_queued_per_client=2)
+        queue.submit({"name": "x"}, client_id="e")
+        queue.submit({"name": "y"}, client_id="e")
+        try:
+            queue.submit({"name": "z"}, client_id="e")
+            assert False, "The third job should be refused"
+        except QueueFull:
+            pass
+        print("   -> Result (Case 4): Success!")
+
+        print("-- Case 5: Jobs interrupted by a restart run again")
+        order.clear()
+        with queue._lock:
+            claimed_id, _ = queue._claim()
+        assert queue.get(claimed_id)["status"] == "running"
+        # A new process opens the same queue file.
+        queue = JobQueue(handler, path=path, workers=1, poll_interval=0.05).start()
+        assert _wait_for(lambda: queue.get(claimed_id)["status"] == "done")
+        assert _wait_for(lambda: sorted(order) == ["x", "y"])
+        queue.stop()
+        print("   -> Result (Case 5): Success!")
+
+
+def test_executor_cancel():
+    """Kiểm tra tác tử dừng trước bước tiếp theo khi công việc bị hủy."""
+    print("\n-- Case 6: A cancelled run stops before its next step")
+    from tools import ToolManager, BaseTool, CancelToken, Final_Answer
+    from agent_executor import AgentExecutor
+    from prompt_template import PromptTemplate
+
+    token = CancelToken()
+    calls = []
+    tool_manager = ToolManager()
+    tool_manager.add_tool(BaseTool("first", lambda: calls.append("first") or token.cancel()))
+    tool_manager.add_tool(BaseTool("second", lambda: calls.append("second")))
+    tool_manager.add_tool(BaseTool("Final_Answer", Final_Answer), pinned=True)
+
+    class _Agent:
+        def run(self, prompt, hints=None):
+            return {"content": [{"action": "first", "action_input": [], "result_id": "a"},
+                                {"action": "second", "action_input": [], "result_id": "b"}],
+                    "duration": 0.0, "token_usage": 1}
+
+    prompt_template = PromptTemplate(system_prompt="{tool_descriptions}", user_input="{user_input}",
+                                     history="{history}", tool_manager=tool_manager)
+    executor = AgentExecutor(agent=_Agent(), tool_manager=tool_manager, prompt_template=prompt_template,
+                             max_iterations=3, json_output=True, cancel_token=token)
+    output, _ = executor.run("question")
+    assert output == "The run was cancelled." and calls == ["first"], (output, calls)
+    print("   -> Result (Case 6): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_job_queue()
+        test_executor_cancel()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,150 @@
+import sys
+from llm_abstraction import LLM, ModelRouter
+
+MODELS = ["lite", "flash", "pro"]
+
+
+class _Usage:
+    total_token_count = 5
+
+
+class _Response:
+    def __init__(self, model):
+        self.text = f"answer from {model}"
+        self.usage_metadata = _Usage()
+
+
+class _FakeModels:
+    """Stands in for client.models; fails for the models listed in `failing`."""
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def generate_content(self, model, contents):
+        from google.genai.errors import APIError
+        self.calls.append(model)
+        if model in self.failing:
+            raise APIError(503, {"error": {"message": "unavailable", "status": "UNAVAILABLE"}})
+        return _Response(model)
+
+
+class _FakeClient:
+    def __init__(self, failing=()):
+        self.models = _FakeModels(failing)
+
+
+def test_routing_features():
+    """Kiểm tra việc chọn mô hình theo độ dài prompt, công cụ cần dùng và vòng lặp."""
+    print("\n--- Unit Test for model routing ---")
+    print("-- Case 1: Simple prompts go to the cheapest model")
+    router = ModelRouter(MODELS, long_prompt_tokens=100, explore_rate=0)
+    assert router.choose("what time is it", {"tools": ["get_time"], "iteration": 0}) == ("short/light/first", "lite")
+    print("   -> Result (Case 1): Success!")
+
+    print("-- Case 2: Data tools, long prompts and data follow-ups need stronger models")
+    assert router.choose("total debt in May", {"tools": ["run_sql_query"], "iteration": 0})[1] == "flash"
+    assert router.choose("x" * 1000, {"tools": ["run_sql_query"], "iteration": 0})[1] == "pro"
+    assert router.choose("total debt in May", {"tools": ["run_sql_query"], "iteration": 2})[1] == "pro"
+    print("   -> Result (Case 2): Success!")
+
+
+def test_routing_adapts():
+    """Kiểm tra việc chuyển sang mô hình mạnh hơn khi tỉ lệ thành công thấp và quay lại khi thử nghiệm tốt."""
+    print("\n-- Case 3: A route escalates when the cheap model keeps failing it")
+    router = ModelRouter(MODELS, min_samples=3, explore_rate=0)
+    route, model = router.choose("question", {})
+    for _ in range(3):
+        router.record_outcome(route, model, False)
+    assert router.choose("question", {}) == (route, "flash")
+    # Other routes are not affected.
+    assert router.choose("question", {"iteration": 1})[1] == "lite"
+    print("   -> Result (Case 3): Success!")
+
+    print("-- Case 4: Unhealthy or slow models are skipped")
+    router = ModelRouter(MODELS, min_samples=3, max_latency=2.0, explore_rate=0)
+    for _ in range(3):
+        router.record_call("lite", False, 0.1)
+    assert router.choose("question", {})[1] == "flash"
+    for _ in range(3):
+        router.record_call("flash", True, 5.0)
+    assert router.choose("question", {})[1] == "pro"
+    print("   -> Result (Case 4): Success!")
+
+    print("-- Case 5: Exploration sends some traffic one tier cheaper")
+    router = ModelRouter(MODELS, explore_rate=0.5, seed=1)
+    picks = [router.choose("question", {"tools": ["run_sql_query"]})[1] for _ in range(200)]
+    assert 40 < picks.count("lite") < 160 and picks.count("lite") + picks.count("flash") == 200
+    print("   -> Result (Case 5): Success!")
+
+
+def test_llm_with_router():
+    """Kiểm tra LLM dùng mô hình do bộ định tuyến chọn và chuyển sang mô hình mạnh hơn khi lỗi."""
+    print("\n-- Case 6: LLM calls the routed model and falls back to the next tier")
+    router = ModelRouter(MODELS, explore_rate=0)
+    client = _FakeClient(failing={"lite"})
+    llm = LLM(model_name="unused", client=client, router=router)
+    response, _ = llm.generate_content("hello", hints={"iteration": 0})
+    assert client.models.calls == ["lite", "flash"]
+    assert response.text == "answer from flash"
+    assert llm.last_call == ("short/light/first", "flash")
+    summary = router.summary()["models"]
+    assert summary["lite"]["success_rate"] == 0.0 and summary["flash"]["success_rate"] == 1.0
+
+    # Without a router the configured model is used, as before.
+    client = _FakeClient()
+    response, _ = LLM(model_name="flash", client=client).generate_content("hello")
+    assert client.models.calls == ["flash"]
+    print("   -> Result (Case 6): Success!")
+
+
+def test_fallback_and_opt_in():
+    """Kiểm tra mô hình mạnh nhất chuyển sang mô hình khác khi lỗi và định tuyến chỉ bật khi được yêu cầu."""
+    print("\n-- Case 7: The strongest model falls back to a different model, never to itself")
+    from google.genai.errors import APIError
+    router = ModelRouter(MODELS, long_prompt_tokens=100, explore_rate=0)
+    client = _FakeClient(failing={"pro"})
+    llm = LLM(model_name="unused", client=client, router=router, fallback_model_name="pro")
+    response, _ = llm.generate_content("x" * 1000, hints={"tools": ["run_sql_query"], "iteration": 0})
+    assert client.models.calls == ["pro", "flash"], client.models.calls
+    assert response.text == "answer from flash"
+
+    client = _FakeClient(failing={"pro"})
+    llm = LLM(model_name="unused", client=client, router=ModelRouter(["pro"], explore_rate=0))
+    try:
+        llm.generate_content("hello")
+        assert False, "A single model has nothing to fall back to"
+    except APIError:
+        pass
+    assert client.models.calls == ["pro"]
+    print("   -> Result (Case 7): Success!")
+
+    print("-- Case 8: Routing is off unless AGENT_MODEL_ROUTING=1")
+    import os
+    from llm_abstraction import router_from_env
+    previous = os.environ.pop("AGENT_MODEL_ROUTING", None)
+    try:
+        assert router_from_env() is None
+        os.environ["AGENT_MODEL_ROUTING"] = "1"
+        assert isinstance(router_from_env(), ModelRouter)
+    finally:
+        os.environ.pop("AGENT_MODEL_ROUTING", None)
+        if previous is not None:
+            os.environ["AGENT_MODEL_ROUTING"] = previous
+    print("   -> Result (Case 8): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_routing_features()
+        test_routing_adapts()
+        test_llm_with_router()
+        test_fallback_and_opt_in()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import tempfile
+from memory import ConversationBufferMemory, SessionMemoryStore
+from vector_store import VectorStoreMemory
+from prompt_template import estimate_tokens
+
+def test_conversation_buffer_memory():
+    """Kiểm tra cửa sổ token và tóm tắt các lượt hội thoại cũ."""
+    print("\n--- Unit Test for memory module ---")
+    print("-- Case 1: Recent turns are kept verbatim")
+    memory = ConversationBufferMemory(max_tokens=100, summary_tokens=40)
+    memory.add("What is the total of January?", "The total is 100")
+    history = memory.load()
+    assert "User: What is the total of January?" in history
+    assert "Agent: The total is 100" in history
+    print("   -> Result (Case 1): Success!")
+
+    print("-- Case 2: Old turns are compacted into a bounded summary")
+    for i in range(50):
+        memory.add(f"question number {i} " + "x" * 40, f"answer number {i} " + "y" * 40)
+    assert memory.window_tokens <= memory.max_tokens
+    assert estimate_tokens(memory.summary) <= memory.summary_tokens
+    history = memory.load()
+    assert "Summary of earlier conversation" in history
+    assert "question number 49" in history, "Most recent turn must stay verbatim"
+    assert "question number 0 " not in history, "Oldest turn should have been dropped"
+    print("   -> Result (Case 2): Success!")
+
+    print("-- Case 3: Oversized turn is clipped to the budget")
+    memory.clear()
+    memory.add("z" * 10000, "w" * 10000)
+    assert memory.window_tokens <= memory.max_tokens
+    print("   -> Result (Case 3): Success!")
+
+
+def test_session_memory_store():
+    """Kiểm tra giới hạn số phiên, giới hạn token và loại bỏ phiên nhàn rỗi."""
+    print("\n-- Case 4: Sessions are isolated")
+    store = SessionMemoryStore(max_sessions=3, max_total_tokens=10000, idle_ttl=60)
+    store.add_turn("a", "hello from a", "hi a")
+    store.add_turn("b", "hello from b", "hi b")
+    assert "hello from a" in store.load("a")
+    assert "hello from a" not in store.load("b")
+    print("   -> Result (Case 4): Success!")
+
+    print("-- Case 5: Least recently used session is evicted at the session cap")
+    store.add_turn("c", "hello from c", "hi c")
+    store.load("a")
+    store.add_turn("d", "hello from d", "hi d")
+    assert len(store) == 3
+    assert store.load("b") == "", "Session 'b' should have been evicted"
+    # Reading unknown sessions does not create them, so it cannot evict live ones.
+    for unknown in ("x", "y", "z"):
+        assert store.load(unknown) == ""
+    assert len(store) == 3 and all(f"hello from {s}" in store.load(s) for s in "acd")
+    print("   -> Result (Case 5): Success!")
+
+    print("-- Case 6: Total token cap bounds the footprint")
+    store = SessionMemoryStore(max_sessions=1000, max_total_tokens=200, idle_ttl=60)
+    for i in range(100):
+        store.add_turn(f"s{i}", "q" * 100, "a" * 100)
+    assert store.total_tokens <= 200
+    print("   -> Result (Case 6): Success!")
+
+    print("-- Case 7: Idle sessions are evicted")
+    store = SessionMemoryStore(idle_ttl=0.05)
+    store.add_turn("old", "hello", "hi")
+    time.sleep(0.1)
+    store.get("new")
+    assert len(store) == 1 and store.total_tokens == 0
+    print("   -> Result (Case 7): Success!")
+
+
+def test_vector_store_memory():
+    """Kiểm tra tìm kiếm theo độ tương đồng và lưu/đọc chỉ mục từ file."""
+    print("\n-- Case 8: Most relevant snippet of each kind is retrieved")
+    store = VectorStoreMemory.from_texts({
+        "schema": ["Tiền_nợ: số dư công nợ tích lũy", "Rmks: mã khách hàng", "Curr: loại tiền tệ"],
+        "example": ["SELECT SUM(amount) FROM sales GROUP BY month", "SELECT * FROM sales WHERE Rmks = 'KH05234'"],
+    })
+    assert store.vectors.dtype.name == "float32" and store.vectors.flags["C_CONTIGUOUS"]
+    assert store.search("cong no cuoi thang", k=1, kind="schema")[0][0].startswith("Tiền_nợ")
+    rendered = store.load("mã khách hàng KH05234", k=1)
+    assert "Rmks: mã khách hàng" in rendered and "Rmks = 'KH05234'" in rendered
+    assert "Curr" not in rendered
+    print("   -> Result (Case 8): Success!")
+
+    print("-- Case 9: Persisted index is reloaded memory-mapped")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "knowledge")
+        store.save(path)
+        loaded = VectorStoreMemory.from_file(path)
+        assert loaded.texts == store.texts
+        assert loaded.load("mã khách hàng KH05234", k=1) == rendered
+        del loaded
+    print("   -> Result (Case 9): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_conversation_buffer_memory()
+        test_session_memory_store()
+        test_vector_store_memory()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,131 @@
+import sys
+from tools import ToolManager, BaseTool, calculator, get_current_time, run_sql_query, aggregate_sales, Final_Answer
+from plan_validator import PlanValidator
+from agent_executor import AgentExecutor
+from prompt_template import PromptTemplate
+
+
+def _tool_manager() -> ToolManager:
+    tool_manager = ToolManager()
+    tool_manager.add_tool(BaseTool("calculator", calculator))
+    tool_manager.add_tool(BaseTool("get_time", get_current_time))
+    tool_manager.add_tool(BaseTool("run_sql_query", run_sql_query))
+    tool_manager.add_tool(BaseTool("aggregate_sales", aggregate_sales))
+    tool_manager.add_tool(BaseTool("Final_Answer", Final_Answer), pinned=True)
+    return tool_manager
+
+
+def test_plan_validator():
+    """Kiểm tra việc phát hiện lỗi trong kế hoạch trước khi thực thi."""
+    print("\n--- Unit Test for plan_validator module ---")
+    validator = PlanValidator(_tool_manager())
+
+    print("-- Case 1: A valid plan has no errors")
+    plan = [
+        {"action": "run_sql_query", "action_input": ["SELECT SUM(x) FROM t WHERE y = ?", ["a"]], "result_id": "total"},
+        {"action": "aggregate_sales", "action_input": ["count", "T", None, "2025-01"], "result_id": "count"},
+        {"action": "calculator", "action_input": ["divide", "$total", "$count"], "result_id": "avg"},
+        {"action": "Final_Answer", "action_input": ["Average: @0", "$avg"], "result_id": "final"},
+    ]
+    assert validator.validate(plan) == []
+    assert validator.validate([{"action": "Terminate"}]) == []
+    print("   -> Result (Case 1): Success!")
+
+    print("-- Case 2: Unknown tools and bad arguments are reported")
+    errors = validator.validate([
+        {"action": "run_sql", "action_input": ["SELECT 1"], "result_id": "a"},
+        {"action": "get_time", "action_input": ["year", "month"], "result_id": "b"},
+        {"action": "run_sql_query", "action_input": [42], "result_id": "c"},
+        {"action": "calculator", "action_input": "add 1 2", "result_id": "d"},
+    ])
+    assert len(errors) == 4, errors
+    assert "unknown tool 'run_sql'" in errors[0]
+    assert "wrong arguments for 'get_time'" in errors[1]
+    assert "argument 'query' of 'run_sql_query' should be str" in errors[2]
+    assert "must be a list" in errors[3]
+    print("   -> Result (Case 2): Success!")
+
+    print("-- Case 3: Dangling, forward and cyclic references and duplicate ids")
+    errors = validator.validate([
+        {"action": "calculator", "action_input": ["add", "$missing", 1], "result_id": "a"},
+        {"action": "calculator", "action_input": ["add", "$c", 1], "result_id": "b"},
+        {"action": "calculator", "action_input": ["add", "$b", 1], "result_id": "c"},
+        {"action": "calculator", "action_input": ["add", 1, 1], "result_id": "a"},
+    ])
+    text = " ".join(errors)
+    assert "'$missing' does not refer to any result_id" in text
+    assert "'$c' is used before step 3 produces it" in text
+    assert "Cyclic references between results: b -> c -> b" in text
+    assert "result_id 'a' is already used by step 1" in text
+    # Results of earlier iterations may be referenced.
+    assert validator.validate([{"action": "calculator", "action_input": ["add", "$old", 1], "result_id": "x"}],
+                              available=["old"]) == []
+    # Ids and tool names that are not strings are plan errors, not crashes.
+    errors = validator.validate([
+        {"action": "calculator", "action_input": ["add", 1, 1], "result_id": ["a"]},
+        {"action": "calculator", "action_input": ["add", 1, 1], "result_id": {"id": "b"}},
+        {"action": ["calculator"], "action_input": [], "result_id": "c"},
+    ])
+    assert "Step 1: result_id must be a string, got list." in errors, errors
+    assert "Step 2: result_id must be a string, got dict." in errors, errors
+    assert "Step 3: every action must be an object with an 'action' name." in errors, errors
+    print("   -> Result (Case 3): Success!")
+
+
+class _ScriptedAgent:
+    """Returns the given plans in order, recording the prompts it receives."""
+    def __init__(self, plans):
+        self.plans = list(plans)
+        self.prompts = []
+
+    def run(self, prompt, hints=None):
+        self.prompts.append(prompt)
+        return {"content": self.plans.pop(0), "duration": 0.0, "token_usage": 10}
+
+
+def test_executor_repair_turn():
+    """Kiểm tra tác tử nhận lỗi kế hoạch và sửa trong một lượt trước khi chạy công cụ."""
+    print("\n-- Case 4: Invalid plan is repaired before any tool runs")
+    tool_manager = _tool_manager()
+    calls = []
+    tool_manager.add_tool(BaseTool("expensive", lambda query: calls.append(query) or 7))
+    prompt_template = PromptTemplate(system_prompt="Tools:\n{tool_descriptions}", user_input="{user_input}",
+                                     history="{history}", tool_manager=tool_manager)
+    agent = _ScriptedAgent([
+        [{"action": "expensive", "action_input": ["q"], "result_id": "a"},
+         {"action": "calculator", "action_input": ["add", "$nope", 1], "result_id": "b"}],
+        [{"action": "expensive", "action_input": ["q"], "result_id": "a"},
+         {"action": "Final_Answer", "action_input": ["Result @0", "$a"], "result_id": "final"}],
+    ])
+    executor = AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,
+                             max_iterations=1, json_output=True)
+    output, _ = executor.run("question")
+    assert "Result 7" in output, output
+    assert calls == ["q"], "The expensive step must only run for the repaired plan"
+    assert "'$nope' does not refer to any result_id" in agent.prompts[1]
+    assert executor.total_token_usage == 20
+    print("   -> Result (Case 4): Success!")
+
+    print("-- Case 5: A plan that is still invalid after the repair turn is not run")
+    agent = _ScriptedAgent([[{"action": "expensive", "action_input": ["q", "extra"], "result_id": "a"}]] * 2)
+    executor = AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,
+                             max_iterations=3, json_output=True)
+    output, _ = executor.run("question")
+    assert output.startswith("The agent's plan is invalid") and len(agent.prompts) == 2
+    assert calls == ["q"]
+    print("   -> Result (Case 5): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_plan_validator()
+        test_executor_repair_turn()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,175 @@
+import os
+import sys
+import sqlite3
+import tempfile
+from shards import ShardSet, ShardError, period_bounds
+
+COLUMNS = "STT_Order INTEGER, `Ngày_CT_Issue_date` TEXT, T TEXT, `Thành_tiền_Total_Net` REAL, `Tiền_nợ` REAL, Rmks TEXT"
+
+
+def _rows(year: int):
+    """One sale (S) and one deposit (D) on the 10th of every month; the balance grows by 100 per month."""
+    rows, order = [], 0
+    for month in range(1, 13):
+        order += 1
+        balance = (year - 2023) * 1200 + month * 100
+        rows.append((order, f"{year}-{month:02d}-10 00:00:00", "S", 1000.0 * month, balance, f"KH{month % 2}"))
+        order += 1
+        rows.append((order, f"{year}-{month:02d}-10 00:00:00", "D", -500.0, balance, None))
+    return rows
+
+
+def _make_shards(tmp: str, years) -> dict:
+    """Writes one database per year and returns all rows in a single reference database."""
+    reference = sqlite3.connect(":memory:")
+    reference.execute(f"CREATE TABLE unified_sales_data ({COLUMNS})")
+    for year in years:
+        conn = sqlite3.connect(os.path.join(tmp, f"sales_{year}.db"))
+        conn.execute(f"CREATE TABLE unified_sales_data ({COLUMNS})")
+        conn.executemany("INSERT INTO unified_sales_data VALUES (?, ?, ?, ?, ?, ?)", _rows(year))
+        reference.executemany("INSERT INTO unified_sales_data VALUES (?, ?, ?, ?, ?, ?)", _rows(year))
+        conn.commit()
+        conn.close()
+    return reference
+
+
+def test_shards():
+    """Kiểm tra truy vấn chia theo năm: chọn đúng file, gộp kết quả tổng hợp và lọc theo kỳ."""
+    print("\n--- Unit Test for shards module ---")
+    with tempfile.TemporaryDirectory() as tmp:
+        reference = _make_shards(tmp, [2023, 2024, 2025])
+        shard_set = ShardSet(os.path.join(tmp, "sales_{year}.db"))
+
+        print("-- Case 1: Only the years of the period are opened")
+        assert list(shard_set.shards()) == [2023, 2024, 2025]
+        assert list(shard_set.prune(*period_bounds("2024-07:2025-02"))) == [2024, 2025]
+        assert list(shard_set.prune(*period_bounds("2025"))) == [2025]
+        _, _, _, paths = shard_set.query("SELECT COUNT(*) FROM unified_sales_data", "2024")
+        assert paths == [os.path.join(tmp, "sales_2024.db")]
+        print("   -> Result (Case 1): Success!")
+
+        print("-- Case 2: SUM, COUNT, MAX, MIN and AVG partials are combined across years")
+        query = ("SELECT T, SUM(`Thành_tiền_Total_Net`) AS total, COUNT(*), MAX(`Tiền_nợ`), "
+                 "MIN(`Thành_tiền_Total_Net`), AVG(`Thành_tiền_Total_Net`) FROM unified_sales_data "
+                 "GROUP BY T ORDER BY total DESC")
+        names, rows, plan, paths = shard_set.query(query, "2023:2025")
+        assert len(paths) == 3 and plan.parsed.aggregated
+        assert names == ["T", "total", "COUNT(*)", "MAX(`Tiền_nợ`)", "MIN(`Thành_tiền_Total_Net`)",
+                         "AVG(`Thành_tiền_Total_Net`)"], names
+        assert rows == reference.execute(query).fetchall(), rows
+        print("   -> Result (Case 2): Success!")
+
+        print("-- Case 3: A partly covered year only contributes rows of the period")
+        query = ("SELECT substr(`Ngày_CT_Issue_date`, 1, 7) AS thang, SUM(`Thành_tiền_Total_Net`) "
+                 "FROM unified_sales_data WHERE T = ? GROUP BY thang HAVING SUM(`Thành_tiền_Total_Net`) > 2000 "
+                 "ORDER BY thang LIMIT 3 OFFSET 1")
+        _, rows, _, _ = shard_set.query(query, "2024-11:2025-03", params=("S",))
+        expected = reference.execute(
+            query.replace("FROM unified_sales_data WHERE",
+                          "FROM unified_sales_data WHERE `Ngày_CT_Issue_date` >= '2024-11' AND "
+                          "`Ngày_CT_Issue_date` < '2025-04' AND"), ("S",)).fetchall()
+        assert rows == expected == [("2024-12", 12000.0), ("2025-03", 3000.0)], rows
+        print("   -> Result (Case 3): Success!")
+
+        print("-- Case 4: The closing balance is the last row across years")
+        query = ("SELECT `Tiền_nợ` FROM unified_sales_data "
+                 "ORDER BY `Ngày_CT_Issue_date` DESC, STT_Order DESC LIMIT 1")
+        names, rows, _, _ = shard_set.query(query, "2023-06:2024-09")
+        assert names == ["Tiền_nợ"] and rows == [(2100.0,)], (names, rows)
+        _, rows, _, _ = shard_set.query("SELECT DISTINCT Rmks FROM unified_sales_data WHERE T = 'S' ORDER BY Rmks",
+                                        "2023:2025")
+        assert rows == [("KH0",), ("KH1",)], rows
+        print("   -> Result (Case 4): Success!")
+
+        print("-- Case 5: Queries that cannot be merged are refused with a reason")
+        for query, period, message in [
+            ("SELECT COUNT(*) FROM unified_sales_data", "2019", "Years available: 2023, 2024, 2025"),
+            ("SELECT COUNT(DISTINCT Rmks) FROM unified_sales_data", "2024", "DISTINCT"),
+            ("SELECT Rmks FROM unified_sales_data UNION SELECT T FROM unified_sales_data", "2024", "Compound"),
+            ("SELECT COUNT(*) FROM unified_sales_data", "last year", "Unrecognized period"),
+        ]:
+            try:
+                shard_set.query(query, period)
+                assert False, f"{query} over {period} should be refused"
+            except ShardError as e:
+                assert message in str(e), str(e)
+        print("   -> Result (Case 5): Success!")
+
+        print("-- Case 6: Subqueries are refused instead of being merged per shard")
+        # KH0 and KH1 buy in both years: a DISTINCT subquery counted per shard and summed would give 4.
+        distinct = "SELECT DISTINCT Rmks FROM unified_sales_data WHERE Rmks IS NOT NULL"
+        expected = reference.execute(f"SELECT COUNT(*) FROM ({distinct} AND `Ngày_CT_Issue_date` >= '2024')"
+                                     ).fetchone()[0]
+        per_shard = sum(len(shard_set.query(distinct, year)[1]) for year in ("2024", "2025"))
+        assert expected == 2 and per_shard == 4, (expected, per_shard)
+        for query in [f"SELECT COUNT(*) FROM ({distinct})",
+                      "SELECT T, COUNT(*) * 1.0 / (SELECT COUNT(*) FROM unified_sales_data) "
+                      "FROM unified_sales_data GROUP BY T",
+                      f"WITH c AS ({distinct}) SELECT COUNT(*) FROM c",
+                      f"SELECT COUNT(*) FROM unified_sales_data WHERE Rmks IN ({distinct})"]:
+            try:
+                shard_set.query(query, "2024:2025")
+                assert False, f"{query} should be refused"
+            except ShardError as e:
+                assert "Subqueries" in str(e), str(e)
+        # The same question without a subquery merges to the single-database answer.
+        _, rows, _, paths = shard_set.query(distinct, "2024:2025")
+        assert len(paths) == 2 and len(rows) == expected, rows
+        print("   -> Result (Case 6): Success!")
+
+
+def test_run_sharded_query():
+    """Kiểm tra công cụ run_sharded_query trả về kết quả đã gộp hoặc thông báo lỗi."""
+    print("\n-- Case 7: run_sharded_query returns merged results and readable errors")
+    import shards
+    from tools import run_sharded_query
+    with tempfile.TemporaryDirectory() as tmp:
+        _make_shards(tmp, [2024, 2025])
+        original = dict(shards.SHARD_PATTERNS)
+        shards.SHARD_PATTERNS["unified_sales_data"] = os.path.join(tmp, "sales_{year}.db")
+        shards._shard_sets.clear()
+        try:
+            total = run_sharded_query("SELECT SUM(`Thành_tiền_Total_Net`) FROM unified_sales_data WHERE T = ?",
+                                      "2024-12:2025-01", params=("S",))
+            assert total == 13000.0, total
+            table = run_sharded_query("SELECT Rmks, COUNT(*) AS n FROM unified_sales_data WHERE T = 'S' GROUP BY Rmks",
+                                      "2024:2025")
+            assert "KH0" in table and "12" in table, table
+            assert run_sharded_query("SELECT COUNT(*) FROM other", "2024", table="other").startswith(
+                "Sharded query rejected: 'other' is not sharded")
+            assert run_sharded_query("DELETE FROM unified_sales_data", "2024").startswith("Query rejected")
+
+            # A slow sharded call is explained on one of its shards, not on the default database.
+            import tools
+            from tools import BaseTool
+            from profiler import ToolProfiler, fingerprint
+            profiler = ToolProfiler(slow_threshold=0)
+            saved, tools.tool_profiler = tools.tool_profiler, profiler
+            query = "SELECT COUNT(*) FROM unified_sales_data WHERE T = ?"
+            try:
+                assert BaseTool("run_sharded_query", run_sharded_query).run(query, "2024:2025", ("S",)) == 24
+            finally:
+                tools.tool_profiler = saved
+            plan = profiler.queries[fingerprint(query)].plan
+            assert plan and any("unified_sales_data" in line for line in plan), plan
+            assert not any("unavailable" in line for line in plan), plan
+        finally:
+            shards.SHARD_PATTERNS.clear()
+            shards.SHARD_PATTERNS.update(original)
+            shards._shard_sets.clear()
+    print("   -> Result (Case 7): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_shards()
+        test_run_sharded_query()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
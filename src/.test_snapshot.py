@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+from snapshot import DatabaseSnapshot
+
+
+def _make_db(db_file: str, values):
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(v,) for v in values])
+    conn.commit()
+    conn.close()
+
+
+def _total(conn) -> int:
+    return conn.execute("SELECT SUM(x) FROM t").fetchone()[0]
+
+
+def test_snapshot_reload():
+    """Kiểm tra bản sao trong bộ nhớ: đọc đúng dữ liệu, nạp lại khi file thay đổi và không làm hỏng truy vấn đang chạy."""
+    print("\n--- Unit Test for snapshot module ---")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "sales.db")
+        _make_db(db_file, range(10))
+
+        print("-- Case 1: Queries are served from memory")
+        snapshot = DatabaseSnapshot(db_file, check_interval=0.05)
+        conn = snapshot.connect()
+        assert _total(conn) == 45
+        assert snapshot.generation == 1
+        assert snapshot.reload() is False, "Unchanged file must not be reloaded"
+        print("   -> Result (Case 1): Success!")
+
+        print("-- Case 2: A commit on disk is picked up, open readers keep their generation")
+        writer = sqlite3.connect(db_file)
+        writer.execute("INSERT INTO t VALUES (100)")
+        writer.commit()
+        assert _total(snapshot.connect()) == 45, "Snapshot must not change before a reload"
+        assert snapshot.reload() is True and snapshot.generation == 2
+        assert _total(snapshot.connect()) == 145
+        assert _total(conn) == 45, "A reader opened before the swap must keep its snapshot"
+        conn.close()
+        print("   -> Result (Case 2): Success!")
+
+        print("-- Case 3: The poller swaps in new data in the background")
+        snapshot.start()
+        writer.execute("DELETE FROM t")
+        writer.commit()
+        writer.close()
+        deadline = time.time() + 5
+        while snapshot.generation < 3 and time.time() < deadline:
+            time.sleep(0.02)
+        assert snapshot.generation == 3
+        assert _total(snapshot.connect()) is None
+        print("   -> Result (Case 3): Success!")
+
+        print("-- Case 4: A replaced database file is detected")
+        replacement = os.path.join(tmp, "new.db")
+        _make_db(replacement, [7])
+        os.replace(replacement, db_file)
+        deadline = time.time() + 5
+        while snapshot.generation < 4 and time.time() < deadline:
+            time.sleep(0.02)
+        assert _total(snapshot.connect()) == 7
+        snapshot.close()
+        print("   -> Result (Case 4): Success!")
+
+
+def test_run_sql_query_uses_snapshot():
+    """Kiểm tra run_sql_query đọc từ bản sao trong bộ nhớ khi bật AGENT_SQL_SNAPSHOT."""
+    print("\n-- Case 5: run_sql_query reads the snapshot when enabled")
+    from tools import run_sql_query
+    import snapshot as snapshot_module
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "sales.db")
+        _make_db(db_file, [1, 2, 3])
+        os.environ["AGENT_SQL_SNAPSHOT"] = "1"
+        try:
+            assert run_sql_query("SELECT SUM(x) FROM t", (), db_file) == 6
+            shared = snapshot_module.get_snapshot(db_file)
+            # Writes to the file are not visible until the snapshot is reloaded.
+            conn = sqlite3.connect(db_file)
+            conn.execute("INSERT INTO t VALUES (4)")
+            conn.commit()
+            conn.close()
+            shared.reload()
+            assert run_sql_query("SELECT SUM(x) FROM t", (), db_file) == 10
+            shared.close()
+        finally:
+            del os.environ["AGENT_SQL_SNAPSHOT"]
+    print("   -> Result (Case 5): Success!")
+
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_snapshot_reload()
+        test_run_sql_query_uses_snapshot()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,48 @@
+import os
+import sys
+import subprocess
+
+# Modules that must only be imported when they are actually used.
+HEAVY_MODULES = ["pandas", "numpy", "google.genai", "sqlite3"]
+# Cumulative import time budget for `import main`, in microseconds.
+IMPORT_BUDGET_US = 150_000
+
+def import_times(module: str) -> dict:
+    """Runs `python -X importtime -c 'import <module>'` and returns {module: cumulative_us}."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+def test_cli_startup():
+    """Kiểm tra CLI không nạp các thư viện nặng khi khởi động."""
+    print("\n--- Startup Test for main.py ---")
+    print("-- Case 1: Heavy modules are imported lazily")
+    times = import_times("main")
+    loaded = [m for m in HEAVY_MODULES if m in times]
+    assert not loaded, f"Heavy modules imported at startup: {loaded}"
+    print("   -> Result (Case 1): Success!")
+
+    print("-- Case 2: Import time stays within budget")
+    assert times["main"] < IMPORT_BUDGET_US, f"import main took {times['main'] / 1000:.1f} ms"
+    print(f"   -> Result (Case 2): Success! ({times['main'] / 1000:.1f} ms)")
+
+def run_all_tests():
+    """Runs all defined test functions."""
+    try:
+        test_cli_startup()
+        print("\n*** ALL TESTS PASSED! ***")
+    except AssertionError as e:
+        print(f"\n*** TEST FAILED! ***")
+        print(f"Assertion Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_all_tests()
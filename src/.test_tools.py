@@ -1,7 +1,15 @@
+import os
 import math
+import time
+import sqlite3
 import datetime
+import tempfile
 import pandas as pd
-from tools import ToolManager, BaseTool, get_current_time, calculator, Final_Answer, run_sql_query
+# Keep the slow-query log of the tests out of the working tree.
+os.environ.setdefault("AGENT_SLOW_QUERY_LOG", "")
+from profiler import ToolProfiler, fingerprint
+from sql_guard import default_guard, SqlGuard, SqlGuardError
+from tools import ToolManager, BaseTool, ToolPolicy, get_current_time, calculator, Final_Answer, run_sql_query, aggregate_sales
 
 # --- Mock/Helper Functions for Testing ---
 
@@ -74,6 +82,21 @@ def test_tool_manager_registration():
     print("   -> Result (Case 3): Success!")
 
 
+    print("-- Case 3b: Relevance-based Tool Selection")
+    def lookup_weather(city: str):
+        """Returns the weather forecast, temperature and rain for a city."""
+        return "sunny"
+
+    register.add_tool(BaseTool("lookup_weather", lookup_weather))
+    register.add_tool(BaseTool("Final_Answer", Final_Answer), pinned=True)
+    selected = [tool.name for tool in register.select_tools("what is the weather forecast in Hanoi?", k=1)]
+    assert selected == ["lookup_weather", "Final_Answer"], selected
+    assert len(register.select_tools("anything", k=None)) == 4
+    savings = register.description_savings("what is the weather forecast in Hanoi?", k=1)
+    assert savings["saved_tokens"] == savings["all_tokens"] - savings["selected_tokens"] > 0
+    print("   -> Result (Case 3b): Success!")
+
+
     print("\n-- Case 4: BaseTool Error Handling (Division by Zero)")
     def problematic_func(a, b):
         """Always raises an error."""
@@ -85,6 +108,47 @@ def test_tool_manager_registration():
     print("   -> Result (Case 4): Success!")
 
 
+def test_tool_policies():
+    """Kiểm tra giới hạn thời gian, hủy truy vấn SQL và giới hạn số lệnh chạy đồng thời."""
+    print("\n-- Case 4b: Tool Timeout Returns a Structured Error")
+    def slow_tool(seconds):
+        """Sleeps for a while."""
+        time.sleep(seconds)
+        return "done"
+
+    slow = BaseTool("slow_tool", slow_tool, policy=ToolPolicy(timeout=0.2, max_concurrency=1))
+    assert slow.run(0) == "done"
+    start = time.monotonic()
+    result = slow.run(1)
+    assert isinstance(result, dict) and result["error"] == "ToolTimeout", result
+    assert time.monotonic() - start < 0.6
+    # The timed-out call still holds the only slot.
+    assert slow.run(0)["error"] in ("ToolBusy", "ToolTimeout")
+    time.sleep(1)
+    assert slow.run(0) == "done"
+    print("   -> Result (Case 4b): Success!")
+
+    print("-- Case 4c: Runaway SQL Is Interrupted")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "big.db")
+        conn = sqlite3.connect(db_file)
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(3000)])
+        conn.commit()
+        conn.close()
+
+        sql_tool = BaseTool("run_sql_query", run_sql_query, policy=ToolPolicy(timeout=0.3))
+        # The cost guard would refuse this join outright; lift it to exercise the timeout.
+        max_scan_rows, default_guard.max_scan_rows = default_guard.max_scan_rows, 10 ** 12
+        try:
+            result = sql_tool.run("SELECT COUNT(*) FROM t a, t b, t c", (), db_file)
+        finally:
+            default_guard.max_scan_rows = max_scan_rows
+        assert isinstance(result, dict) and result["error"] == "ToolTimeout", result
+        assert sql_tool.run("SELECT COUNT(*) FROM t", (), db_file) == 3000
+    print("   -> Result (Case 4c): Success!")
+
+
 def test_concrete_tools_functionality():
     """Kiểm tra chức năng của các công cụ cụ thể: calculator và get_current_time."""
     print("\n-- Case 5: Calculator Tool")
@@ -101,6 +165,9 @@ def test_concrete_tools_functionality():
     assert calculator('divide', 10, 0) == "Cannot divide by zero."
     # Unsupported operation
     assert calculator('power', 2, 3) == "Unsupported operation: power"
+    # Numbers given as strings (e.g. copied from a query result)
+    assert calculator('add', "1,250,000", "2.5") == 1250002.5
+    assert calculator('add', "ten", 1).startswith("All arguments must be numbers")
     print("   -> Result (Case 5): Success!")
 
 
@@ -137,12 +204,152 @@ def test_final_answer():
     print("   -> Result (Case 7): Success!")
     
     
+def test_aggregate_sales():
+    """Kiểm tra công cụ tổng hợp dữ liệu bằng NumPy và việc làm mới bộ nhớ đệm."""
+    print("\n-- Case 8: aggregate_sales Tool")
+    from ingest import COLUMNS
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "sales.db")
+        conn = sqlite3.connect(db_file)
+        conn.execute("CREATE TABLE unified_sales_data (" + ", ".join(f'"{n}" {t}' for n, t in COLUMNS) + ")")
+        rows = [
+            (1, "2025-01-02 00:00:00", "A", None, "x", None, "S", "VND", 1, 100, 110, 1110, "KH1"),
+            (2, "2025-01-05 00:00:00", "B", None, "x", None, "D", "VND", 1, 0, -50, 1060, None),
+            (3, "2025-02-01 00:00:00", "C", None, "x", None, "S", "VND", 1, 200, 220, 1280, "KH2"),
+            (4, "2025-02-03 00:00:00", "D", None, "x", None, "S", "VND", 1, 300, 330, 1610, "KH1"),
+        ]
+        conn.executemany(f"INSERT INTO unified_sales_data VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+        conn.commit()
+
+        assert aggregate_sales("total_net", None, None, None, db_file) == 610
+        assert aggregate_sales("total_net", "T", None, None, db_file) == "D: -50\nS: 660"
+        assert aggregate_sales("closing_balance", "month", None, None, db_file) == "2025-01: 1060\n2025-02: 1610"
+        assert aggregate_sales("count", None, {"T": "S", "customer": "KH1"}, None, db_file) == 2
+        assert aggregate_sales("total_net", ["month", "T"], None, "2025-02", db_file) == "2025-02 | S: 550"
+        assert aggregate_sales("closing_balance", None, None, "2025-01-01:2025-01-31", db_file) == 1060
+
+        # The cached columns are rebuilt when the database changes.
+        time.sleep(0.01)
+        conn.execute("INSERT INTO unified_sales_data VALUES (5, '2025-03-01 00:00:00', 'E', NULL, 'x', NULL, 'S', 'VND', 1, 10, 10, 1620, 'KH3')")
+        conn.commit()
+        conn.close()
+        assert aggregate_sales("count", None, None, None, db_file) == 5
+
+        # Cache files of a newer version, written by another process, are kept; older ones go.
+        from analytics import get_store
+        store = get_store(db_file)
+        newest = store.version.split("-")[0]
+        older, newer = "col0_1-1.npy", f"col0_{int(newest) + 10**9}-1.npy"
+        for file_name in (older, newer):
+            open(os.path.join(store.cache_dir, file_name), "wb").close()
+        store._save_cache(store.version, dict(store.columns), store.categories)
+        assert not os.path.exists(os.path.join(store.cache_dir, older))
+        assert os.path.exists(os.path.join(store.cache_dir, newer))
+        assert len(store) == 5
+    print("   -> Result (Case 8): Success!")
+
+
+def test_sql_guard():
+    """Kiểm tra bộ lọc SQL: chỉ cho phép truy vấn đọc, tự thêm LIMIT và từ chối truy vấn quá tốn kém."""
+    print("\n-- Case 9: SQL Guard")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "guard.db")
+        conn = sqlite3.connect(db_file)
+        conn.execute("CREATE TABLE t (x INTEGER, label TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"row {i}") for i in range(5000)])
+        conn.commit()
+
+        # Writes and stacked statements never reach the database.
+        for query in ("DELETE FROM t", "SELECT 1; DROP TABLE t", "PRAGMA writable_schema = 1"):
+            assert run_sql_query(query, (), db_file).startswith("Query rejected:"), query
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 5000
+        # Keywords inside string literals do not trigger a rejection.
+        assert run_sql_query("SELECT COUNT(*) FROM t WHERE label != 'x; DELETE'", (), db_file) == 5000
+
+        # Unbounded selects are capped, explicit LIMITs and aggregates are left alone.
+        result = run_sql_query("SELECT x FROM t", (), db_file)
+        assert f"showing the first {default_guard.max_rows} rows" in result
+        assert len(result.splitlines()) == default_guard.max_rows + 2
+        assert "showing" not in run_sql_query("SELECT x FROM t LIMIT 5", (), db_file)
+        assert run_sql_query("WITH s AS (SELECT SUM(x) AS total FROM t) SELECT total FROM s", (), db_file) == sum(range(5000))
+        # The cap keeps the column names of a plain SELECT, even duplicated ones or after a comment.
+        executed, limited = default_guard.prepare(conn, "SELECT label, label FROM t WHERE x < 3 -- two labels")
+        assert limited and [column[0] for column in conn.execute(executed).description] == ["label", "label"]
+        executed, limited = default_guard.prepare(conn, "SELECT x FROM t UNION SELECT x + 1 FROM t")
+        assert limited and executed.startswith("SELECT * FROM (")
+        assert len(conn.execute(executed).fetchall()) == default_guard.max_rows + 1
+
+        # A cartesian product is refused with a hint instead of being run.
+        result = run_sql_query("SELECT COUNT(*) FROM t a, t b", (), db_file)
+        assert result.startswith("Query rejected:") and "WHERE" in result, result
+
+        # Errors in the SQL itself are still reported by the execution step.
+        assert run_sql_query("SELECT missing FROM t", (), db_file).startswith("Query execution error:")
+
+        guard = SqlGuard(max_rows=10, max_scan_rows=100)
+        try:
+            guard.prepare(conn, "SELECT * FROM t")
+            assert False, "Full scan above max_scan_rows should be refused"
+        except SqlGuardError as e:
+            assert "full scan of t" in str(e)
+        conn.close()
+    print("   -> Result (Case 9): Success!")
+
+
+def test_tool_profiler():
+    """Kiểm tra bộ đo thời gian công cụ, dấu vân tay truy vấn và nhật ký truy vấn chậm xoay vòng."""
+    print("\n-- Case 10: Query Fingerprints")
+    assert fingerprint("SELECT * FROM t WHERE Rmks = 'KH1' AND x IN (1, 2, 3) -- note") == \
+        fingerprint("select *  from t\nwhere Rmks = 'KH2' and x in (7)")
+    assert fingerprint("SELECT x1 FROM t2 LIMIT 5") == "select x1 from t2 limit ?"
+    print("   -> Result (Case 10): Success!")
+
+    print("-- Case 11: Slow Queries Are Logged With Their Plan")
+    import tools
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "profile.db")
+        conn = sqlite3.connect(db_file)
+        conn.execute("CREATE TABLE t (x INTEGER, label TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"row {i}") for i in range(1000)])
+        conn.commit()
+        conn.close()
+
+        log_path = os.path.join(tmp, "slow.log")
+        profiler = ToolProfiler(slow_threshold=0, log_path=log_path, max_log_bytes=1000, log_backups=5)
+        saved, tools.tool_profiler = tools.tool_profiler, profiler
+        try:
+            sql_tool = BaseTool("run_sql_query", run_sql_query, policy=ToolPolicy(timeout=5))
+            for i in range(5):
+                sql_tool.run("SELECT x FROM t WHERE x > ? LIMIT 3", (i,), db_file)
+            sql_tool.run("SELECT COUNT(*) FROM t WHERE label = 'row 1'", (), db_file)
+            BaseTool("calculator", calculator).run("add", 1, 2)
+        finally:
+            tools.tool_profiler = saved
+
+        assert profiler.tools["run_sql_query"].calls == 6 and profiler.tools["calculator"].calls == 1
+        limited = profiler.queries[fingerprint("SELECT x FROM t WHERE x > ? LIMIT 3")]
+        assert limited.calls == 5 and limited.rows == 15
+        assert any("SCAN t" in line for line in limited.plan), limited.plan
+        report = profiler.report(n=1)
+        assert "select x from t where x > ? limit ?" in report and "label = ?" not in report
+
+        # The log was rotated and still holds every entry across its files.
+        assert os.path.exists(log_path + ".1")
+        from_log = ToolProfiler.from_log(log_path)
+        assert sum(stats.calls for stats in from_log.queries.values()) == 6
+    print("   -> Result (Case 11): Success!")
+
+
 def run_all_tests():
     """Runs all defined test functions."""
     try:
         test_tool_manager_registration()
+        test_tool_policies()
         test_concrete_tools_functionality()
         test_final_answer()
+        test_aggregate_sales()
+        test_sql_guard()
+        test_tool_profiler()
         # You can add a test for run_sql_query here if you mock the DB interaction.
         print("\n*** ALL TESTS PASSED! ***")
     except AssertionError as e:
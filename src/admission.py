@@ -0,0 +1,213 @@
+import math
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+DEFAULT_LANES = ("interactive", "batch")
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; `retry_after` is the suggested wait in seconds."""
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admission control for the requests of one event loop.
+
+    At most `limit` requests run at once. Others wait in a bounded queue per priority
+    lane; a free slot always goes to the oldest request of the highest lane (the first
+    in `lanes`). A request is rejected at once when its lane's queue is full, and after
+    `max_wait` seconds if it is still waiting, so overload means fast rejections instead
+    of every request slowing down together.
+
+    The limit adapts to observed latency: while recent requests are about as fast as the
+    long-term average, it grows slowly; when they get slower, it shrinks in proportion.
+    Must be used from a single event loop.
+    """
+    def __init__(self, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 32, lanes=DEFAULT_LANES,
+                 max_queue=None, max_wait: float = 10.0, tolerance: float = 1.5, window: int = 10,
+                 smoothing: float = 0.2):
+        """
+        Args:
+            initial_limit (int): Concurrency limit before any latency is observed.
+            min_limit (int): The limit never goes below this.
+            max_limit (int): The limit never goes above this.
+            lanes (Iterable[str]): Priority lanes, highest first.
+            max_queue (dict, optional): Waiting requests allowed per lane (default 32 each).
+            max_wait (float): Seconds a request may wait for a slot before it is rejected.
+            tolerance (float): How much slower than the long-term average recent requests may
+                               be before the limit shrinks.
+            window (int): Number of recent latencies compared with the long-term average.
+            smoothing (float): Weight of each new limit estimate (0-1).
+        """
+        self.lanes = list(lanes)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = {lane: 32 for lane in self.lanes}
+        self.max_queue.update(max_queue or {})
+        self.max_wait = max_wait
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._queues = {lane: deque() for lane in self.lanes}
+        self._recent = deque(maxlen=window)
+        self._long_latency = None
+        self._admitted = 0
+        self._rejected = 0
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def queued(self, lane: str = None) -> int:
+        """Requests waiting in a lane, or in every lane."""
+        if lane is not None:
+            return len(self._queues[lane])
+        return sum(len(queue) for queue in self._queues.values())
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait: the time to drain the current queue."""
+        if not self._recent:
+            return 1
+        latency = sum(self._recent) / len(self._recent)
+        return max(1, min(60, math.ceil(latency * (self.queued() + 1) / max(self.limit, 1))))
+
+    def _reject(self, message: str):
+        self._rejected += 1
+        return Overloaded(message, self.retry_after())
+
+    async def acquire(self, lane: str = DEFAULT_LANES[0], max_wait: float = None) -> None:
+        """
+        Waits for a slot.
+
+        Args:
+            lane (str): The priority lane of the request.
+            max_wait (float, optional): Seconds this request may wait (e.g. its own deadline);
+                                        the controller's max_wait applies if it is shorter.
+
+        Raises:
+            ValueError: If the lane is unknown.
+            Overloaded: If the lane's queue is full or no slot became free in time.
+        """
+        if lane not in self._queues:
+            raise ValueError(f"Unknown lane '{lane}'. Lanes: {', '.join(self.lanes)}.")
+        if self._in_flight < self.limit and not self.queued():
+            self._in_flight += 1
+            self._admitted += 1
+            return
+        queue = self._queues[lane]
+        if len(queue) >= self.max_queue[lane]:
+            raise self._reject(f"The server is busy: {len(queue)} '{lane}' requests are already waiting.")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        wait = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        try:
+            await asyncio.wait({waiter}, timeout=max(wait, 0))
+        except asyncio.CancelledError:
+            # The client went away: give the slot back if it was granted meanwhile.
+            self._abandon(queue, waiter)
+            raise
+        if not waiter.done():
+            self._abandon(queue, waiter)
+            raise self._reject(f"The server is busy: no slot became free within {wait:.1f} seconds.")
+        self._admitted += 1
+
+    def _abandon(self, queue: deque, waiter: asyncio.Future) -> None:
+        if waiter.done() and not waiter.cancelled():
+            self._in_flight -= 1
+            self._grant()
+            return
+        waiter.cancel()
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+
+    def _grant(self) -> None:
+        """Hands free slots to waiting requests, highest lane first."""
+        for lane in self.lanes:
+            queue = self._queues[lane]
+            while queue and self._in_flight < self.limit:
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    def release(self, latency: float = None) -> None:
+        """
+        Frees a slot.
+
+        Args:
+            latency (float, optional): Seconds the request took. Failed requests pass None
+                                       so that their latency does not steer the limit.
+        """
+        self._in_flight -= 1
+        if latency is not None:
+            self._update_limit(latency)
+        self._grant()
+
+    def _update_limit(self, latency: float) -> None:
+        self._recent.append(latency)
+        if self._long_latency is None:
+            self._long_latency = latency
+        else:
+            self._long_latency = 0.95 * self._long_latency + 0.05 * latency
+        short = sum(self._recent) / len(self._recent)
+        # 1.0 while recent requests are within tolerance, down to 0.5 when they are much slower.
+        gradient = max(0.5, min(1.0, self.tolerance * self._long_latency / short)) if short > 0 else 1.0
+        estimate = self._limit * gradient
+        # Only grow when the limit is actually used, otherwise it drifts up while idle.
+        if gradient == 1.0 and self._in_flight + 1 >= self.limit:
+            estimate += math.sqrt(self._limit)
+        new_limit = (1 - self.smoothing) * self._limit + self.smoothing * estimate
+        self._limit = max(float(self.min_limit), min(float(self.max_limit), new_limit))
+
+    @asynccontextmanager
+    async def admit(self, lane: str = DEFAULT_LANES[0], max_wait: float = None):
+        """Holds a slot for the enclosed block and reports its latency when it succeeds."""
+        await self.acquire(lane, max_wait)
+        start = asyncio.get_running_loop().time()
+        latency = None
+        try:
+            yield
+            latency = asyncio.get_running_loop().time() - start
+        finally:
+            self.release(latency)
+
+    def summary(self) -> dict:
+        """Current limit, load and counters, e.g. for monitoring."""
+        return {"limit": self.limit,
+                "in_flight": self._in_flight,
+                "queued": {lane: len(queue) for lane, queue in self._queues.items()},
+                "recent_latency": round(sum(self._recent) / len(self._recent), 3) if self._recent else None,
+                "admitted": self._admitted,
+                "rejected": self._rejected}
+
+
+def controller_from_env():
+    """
+    Builds the AdmissionController configured by AGENT_ADMISSION_* variables, or returns
+    None when AGENT_ADMISSION=0.
+    """
+    import os
+    if os.getenv("AGENT_ADMISSION", "1").lower() in ("0", "false", "no"):
+        return None
+    return AdmissionController(
+        initial_limit=int(os.getenv("AGENT_ADMISSION_INITIAL_LIMIT", "8")),
+        min_limit=int(os.getenv("AGENT_ADMISSION_MIN_LIMIT", "1")),
+        max_limit=int(os.getenv("AGENT_ADMISSION_MAX_LIMIT", "32")),
+        max_queue={"interactive": int(os.getenv("AGENT_ADMISSION_QUEUE", "32")),
+                   "batch": int(os.getenv("AGENT_ADMISSION_BATCH_QUEUE", "8"))},
+        max_wait=float(os.getenv("AGENT_ADMISSION_MAX_WAIT", "10")),
+    )
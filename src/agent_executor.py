@@ -1,8 +1,16 @@
 from typing import Dict, Any, List
 from base_agent import BaseAgent
-from tools import ToolManager
+from tools import ToolManager, deadline_scope
 from prompt_template import PromptTemplate
+from plan_validator import PlanValidator
+from context_store import ContextStore
+import os
 import json
+import time
+
+
+class _DeadlineReached(Exception):
+    """Raised inside a run when its deadline has passed."""
 
 
 class AgentExecutor:
@@ -10,7 +18,7 @@ class AgentExecutor:
     The AgentExecutor is responsible for managing the execution of an agent's
     reasoning and tool-use loop.
     """
-    def __init__(self, agent: BaseAgent, tool_manager: ToolManager, prompt_template: PromptTemplate, max_iterations: int = 5, history: str = None, dev_mode: bool = False, json_output = False):
+    def __init__(self, agent: BaseAgent, tool_manager: ToolManager, prompt_template: PromptTemplate, max_iterations: int = 5, history: str = None, dev_mode: bool = False, json_output = False, checkpoint_store=None, cancel_token=None):
         """
         Initializes the AgentExecutor.
 
@@ -22,6 +30,10 @@ class AgentExecutor:
             history (str): The initial chat history.
             dev_mode (bool): If True, enables verbose logging for debugging.
             json_output (bool): If True, output will be in json format (agent will be able to work with tool)
+            checkpoint_store (CheckpointStore, optional): Saves the run state after every step so
+                                                          that a run can be resumed by its run id.
+            cancel_token (CancelToken, optional): Once cancelled, the run stops before its next
+                                                  LLM call or tool step.
         """
         self.agent = agent
         self.tool_manager = tool_manager
@@ -30,49 +42,166 @@ class AgentExecutor:
         self.history = history
         self.dev_mode = dev_mode
         self.json_output = json_output
-        self.context = {}
+        # Tool results of the current run only; large results are kept out of the prompts.
+        self.context = ContextStore(max_memory_bytes=int(os.getenv("AGENT_CONTEXT_MAX_BYTES", "8000000")),
+                                    inline_chars=int(os.getenv("AGENT_CONTEXT_INLINE_CHARS", "500")))
+        self.total_token_usage = 0
+        self.plan_validator = PlanValidator(tool_manager)
+        self.checkpoint_store = checkpoint_store
+        self.cancel_token = cancel_token
+        # True when the last run returned a best-effort answer because its deadline passed.
+        self.partial = False
+        # True when the last run gave up with an error message (invalid plan, execution error).
+        self.failed = False
+        self._deadline = None
 
-    def run(self, user_input: str) -> str:
+    def run(self, user_input: str, run_id: str = None, deadline: float = None, timeout_ms: int = None) -> str:
         """
         Executes the agent's reasoning loop based on the user's input.
 
         Args:
             user_input (str): The user's initial query.
+            run_id (str, optional): Identifies the run for checkpointing. If a checkpoint of
+                                    the same run and question exists, the run resumes after
+                                    its last completed step.
+            deadline (float, optional): Unix time (time.time()) by which the run must answer.
+            timeout_ms (int, optional): Time budget of the run in milliseconds. With a deadline
+                                        too, whichever comes first applies.
 
         Returns:
-            str: The final answer from the agent.
+            tuple: (final answer, last response object of the agent). When the time runs out the
+                   answer is the best partial one available, and `partial` is set; when the run
+                   gives up, it is the error message and `failed` is set.
         """
-        current_history = self.history if self.history else ""
+        self.partial = False
+        self.failed = False
+        self._deadline = None
+        if deadline is not None:
+            self._deadline = time.monotonic() + (deadline - time.time())
+        if timeout_ms is not None:
+            budget_end = time.monotonic() + timeout_ms / 1000
+            self._deadline = budget_end if self._deadline is None else min(self._deadline, budget_end)
+
+        self.context.clear()
+        try:
+            # Tool calls get the time left and are cancelled when it runs out.
+            with deadline_scope(self._deadline):
+                result = self._run(user_input, run_id)
+        finally:
+            # Results never leak into the next run, and spilled files are removed.
+            self.context.clear()
+        # A run that ended (even with an answer reporting an error) is not resumed again;
+        # one interrupted by an exception or the deadline keeps its checkpoint for the retry.
+        if self.checkpoint_store is not None and run_id is not None and not self.partial:
+            self.checkpoint_store.delete(run_id)
+        return result
+
+    def _checkpoint(self, run_id: str, user_input: str, iteration: int, current_input: str,
+                    plan: list = None, next_step: int = 0, response_obj: Dict[str, Any] = None) -> None:
+        """Saves the state reached after a completed step."""
+        if self.checkpoint_store is None or run_id is None:
+            return
+        self.checkpoint_store.save(run_id, user_input, {
+            "iteration": iteration,
+            "current_input": current_input,
+            "plan": plan,
+            "next_step": next_step,
+            "response_obj": response_obj,
+            "context": {key: self.context[key] for key in self.context},
+            "total_token_usage": self.total_token_usage,
+        })
+
+    def _restore(self, run_id: str, user_input: str):
+        """Loads the checkpoint of a run into the executor, returning its state or None."""
+        if self.checkpoint_store is None or run_id is None:
+            return None
+        state = self.checkpoint_store.load(run_id, user_input)
+        if state is None:
+            return None
+        for key, value in state["context"].items():
+            self.context[key] = value
+        self.total_token_usage = state["total_token_usage"]
+        if self.dev_mode:
+            print(f"Resuming run '{run_id}' at iteration {state['iteration'] + 1}, step {state['next_step'] + 1}")
+        return state
+
+    def _run(self, user_input: str, run_id: str = None):
+        current_history = self.history
         current_input = user_input
+        self.total_token_usage = 0
+        start_iteration, resumed_plan, next_step, response_obj = 0, None, 0, None
+        response_plan = None
+        iteration_times = []
 
-        for i in range(self.max_iterations):
+        state = self._restore(run_id, user_input)
+        if state is not None:
+            start_iteration = state["iteration"]
+            current_input = state["current_input"]
+            resumed_plan, next_step, response_obj = state["plan"], state["next_step"], state["response_obj"]
+
+        for i in range(start_iteration, self.max_iterations):
             if self.dev_mode:
                 print(f"\n--- Iteration {i + 1}/{self.max_iterations} ---")
+            if self._cancelled():
+                return "The run was cancelled.", response_obj
+            # Do not start an iteration that is unlikely to finish in the time left.
+            remaining = self._time_left()
+            if remaining is not None and remaining < (sum(iteration_times) / len(iteration_times) if iteration_times else 0):
+                return self._partial_answer(response_plan, response_obj), response_obj
+            iteration_start = time.monotonic()
 
-            formatted_prompt = self.prompt_template.format_prompt(
-                user_input=current_input
-            )
-            if self.json_output:
-                formatted_prompt = formatted_prompt + self.prompt_template.output_inst()
+            try:
+                if resumed_plan is not None:
+                    # The plan of this iteration was already received and validated.
+                    response_plan, resumed_plan = resumed_plan, None
+                else:
+                    next_step = 0
+                    formatted_prompt = self.prompt_template.format_prompt(
+                        user_input=current_input,
+                        history=current_history,
+                        query=user_input
+                    )
+                    if self.json_output:
+                        formatted_prompt = formatted_prompt + self.prompt_template.output_inst()
 
-            if self.dev_mode:
-                print(f"Agent's Input Prompt: {formatted_prompt}")
+                    if self.dev_mode:
+                        print(f"Agent's Input Prompt: {formatted_prompt}")
+                        if self.prompt_template.tool_manager is not None and self.prompt_template.tool_k is not None:
+                            print(f"Tool selection savings: {self.prompt_template.tool_manager.description_savings(user_input, self.prompt_template.tool_k)}")
 
-            try:
-                response_obj = self.agent.run(formatted_prompt)
-                response_plan = response_obj["content"]
-                if isinstance(response_plan, str):
-                    return response_plan, response_obj
+                    response_obj = self._ask_agent(formatted_prompt, self._routing_hints(user_input, i))
+                    self.total_token_usage += response_obj["token_usage"] or 0
+                    response_plan = response_obj["content"]
+                    if isinstance(response_plan, str):
+                        self._report_outcome(response_obj, not self.json_output)
+                        return response_plan, response_obj
 
-                if self.dev_mode:
-                    print("Agent's Plan Received:")
-                    if isinstance(response_plan, list):
-                        print(json.dumps(response_plan, indent=2))
+                    if self.dev_mode:
+                        print("Agent's Plan Received:")
+                        if isinstance(response_plan, list):
+                            print(json.dumps(response_plan, indent=2))
 
-                if not isinstance(response_plan, list):
-                    return f"The agent failed to provide a valid plan. Response was: '{response_plan}'"
+                    if not isinstance(response_plan, list):
+                        self.failed = True
+                        return f"The agent failed to provide a valid plan. Response was: '{response_plan}'", response_obj
 
-                for action in response_plan:
+                    # Check the whole plan before any tool runs; the agent gets one turn to fix it.
+                    errors = self.plan_validator.validate(response_plan, self.context)
+                    self._report_outcome(response_obj, not errors)
+                    if errors:
+                        response_obj, response_plan, errors = self._repair_plan(user_input, current_history, response_plan, errors)
+                        if errors:
+                            self.failed = True
+                            return f"The agent's plan is invalid: {' '.join(errors)}", response_obj
+                    self._checkpoint(run_id, user_input, i, current_input, response_plan, 0, response_obj)
+
+                for step, action in enumerate(response_plan):
+                    if step < next_step:
+                        continue
+                    if self._cancelled():
+                        return "The run was cancelled.", response_obj
+                    if self._time_left() is not None and self._time_left() <= 0:
+                        return self._partial_answer(response_plan, response_obj), response_obj
                     tool_name = action.get("action")
                     action_input = action.get("action_input")
                     result_id = action.get("result_id")
@@ -94,15 +223,112 @@ class AgentExecutor:
 
                     if tool_name == "Final_Answer":
                         return tool_output, response_obj
+                    self._checkpoint(run_id, user_input, i, current_input, response_plan, step + 1, response_obj)
 
-                current_input = f"User input: {user_input}, Response plan: {response_plan}, Iteration: {i}/{self.max_iterations}, Context board: {self.context}. Please continue with the plan. If the final answer has reached and have no problem, return a list of action with only one action name 'Terminate'"
+                current_input = f"User input: {user_input}, Response plan: {response_plan}, Iteration: {i}/{self.max_iterations}, Context board: {self.context.render()}. Large results are shown as handles with a preview; pass them on with their '$id'. Please continue with the plan. If the final answer has reached and have no problem, return a list of action with only one action name 'Terminate'"
+                self._checkpoint(run_id, user_input, i + 1, current_input, None, 0, response_obj)
+                iteration_times.append(time.monotonic() - iteration_start)
 
+            except _DeadlineReached:
+                return self._partial_answer(response_plan, response_obj), response_obj
             except (ValueError, TypeError, KeyError) as e:
                 print(f"An error occurred during execution: {e}")
-                return f"I encountered an error and could not complete the task: {e}"
+                self.failed = True
+                return f"I encountered an error and could not complete the task: {e}", response_obj
 
         return "Max iterations reached without a final answer.", response_obj
 
+    def _repair_plan(self, user_input: str, history: str, plan: list, errors: List[str]):
+        """
+        Sends the validation errors of a plan back to the agent for one corrected plan.
+
+        Returns:
+            tuple: (response object, the corrected plan, its remaining validation errors)
+        """
+        if self.dev_mode:
+            print("Plan rejected before execution:")
+            for error in errors:
+                print(f"  - {error}")
+
+        repair_input = (f"User input: {user_input}, Your plan: {json.dumps(plan, ensure_ascii=False)}. "
+                        f"The plan was not run because it has these problems: {' '.join(errors)} "
+                        f"Results already available: {list(self.context)}. Return the corrected plan.")
+        formatted_prompt = self.prompt_template.format_prompt(user_input=repair_input, history=history, query=user_input)
+        if self.json_output:
+            formatted_prompt = formatted_prompt + self.prompt_template.output_inst()
+
+        response_obj = self._ask_agent(formatted_prompt, self._routing_hints(user_input, 1))
+        self.total_token_usage += response_obj["token_usage"] or 0
+        repaired = response_obj["content"]
+        if self.dev_mode:
+            print("Agent's Repaired Plan Received:")
+            if isinstance(repaired, list):
+                print(json.dumps(repaired, indent=2))
+        errors = self.plan_validator.validate(repaired, self.context)
+        self._report_outcome(response_obj, not errors)
+        return response_obj, repaired, errors
+
+    def _ask_agent(self, prompt: str, hints: Dict[str, Any]) -> Dict[str, Any]:
+        """Calls the agent, limiting the LLM call to the time left before the deadline."""
+        remaining = self._time_left()
+        if remaining is None:
+            return self.agent.run(prompt, hints=hints)
+        if remaining <= 0:
+            raise _DeadlineReached()
+        try:
+            return self.agent.run(prompt, hints=hints, timeout=remaining)
+        except Exception:
+            # The call was aborted because the time ran out; anything else is a real failure.
+            if self._time_left() <= 0:
+                raise _DeadlineReached()
+            raise
+
+    def _time_left(self):
+        """Seconds left before the deadline of the run, or None if it has none."""
+        return None if self._deadline is None else self._deadline - time.monotonic()
+
+    def _partial_answer(self, plan: list, response_obj: Dict[str, Any]) -> str:
+        """
+        The best answer available when the deadline passes: the last Final_Answer
+        candidate of the plan whose inputs are ready, otherwise the results so far.
+        """
+        self.partial = True
+        if self.dev_mode:
+            print("Deadline reached, returning a partial answer.")
+        final_answer = self.tool_manager.tools.get("Final_Answer")
+        for action in reversed(plan if isinstance(plan, list) else []):
+            if action.get("action") != "Final_Answer" or final_answer is None:
+                continue
+            try:
+                inputs = self._resolve_dependencies(action.get("action_input")) or []
+            except ValueError:
+                continue
+            # A result that is itself an error (e.g. a cancelled query) is no answer.
+            if any(isinstance(value, dict) and "error" in value for value in inputs):
+                continue
+            try:
+                # Called directly: tool calls are refused once the deadline has passed.
+                return final_answer.func(*inputs)
+            except Exception:
+                continue
+        if len(self.context) == 0:
+            return "The time budget ran out before any result was available."
+        return f"The time budget ran out before the task was finished. Results so far: {self.context.render()}"
+
+    def _cancelled(self) -> bool:
+        return self.cancel_token is not None and self.cancel_token.cancelled
+
+    def _routing_hints(self, user_input: str, iteration: int) -> Dict[str, Any]:
+        """Local features the LLM router uses to pick a model for this call."""
+        tool_manager = self.prompt_template.tool_manager or self.tool_manager
+        tools = [tool.name for tool in tool_manager.select_tools(user_input, self.prompt_template.tool_k)]
+        return {"tools": tools, "iteration": iteration}
+
+    def _report_outcome(self, response_obj: Dict[str, Any], success: bool) -> None:
+        report = getattr(self.agent, "report_outcome", None)
+        if report is not None:
+            report(response_obj, success)
+
     def _resolve_dependencies(self, action_input: Any) -> List:
         """
         Resolves input dependencies from the context.
@@ -0,0 +1,291 @@
+import os
+import json
+import sqlite3
+import threading
+import numpy as np
+
+TABLE_NAME = "unified_sales_data"
+DATE_COLUMN = "Ngày_CT_Issue_date"
+NUMERIC_COLUMNS = ["STT_Order", "Tỷ_giá_ROE", "Giá_vé_Ticket_Price", "Thành_tiền_Total_Net", "Tiền_nợ"]
+STRING_COLUMNS = ["Số_CT_Doc_Nbr", "Hành_trình_Route", "Nội_dung_Description", "Thông_tin_khác_Extra_Info",
+                  "T", "Curr", "Rmks"]
+
+# Friendly names the agent may use instead of the raw column names.
+COLUMN_ALIASES = {
+    "type": "T",
+    "customer": "Rmks",
+    "currency": "Curr",
+    "route": "Hành_trình_Route",
+    "doc": "Số_CT_Doc_Nbr",
+}
+METRICS = {
+    "total_net": ("sum", "Thành_tiền_Total_Net"),
+    "ticket_price": ("sum", "Giá_vé_Ticket_Price"),
+    "count": ("count", None),
+    "closing_balance": ("last", "Tiền_nợ"),
+}
+DATE_GROUPS = {"year": "Y", "month": "M", "day": "D"}
+
+
+def _version_key(version: str) -> tuple:
+    """Orders cache versions by the modification times they were taken from."""
+    try:
+        return tuple(int(part.split("-")[0]) for part in version.split("_"))
+    except ValueError:
+        return ()
+
+
+class _ColumnData:
+    """The arrays and category lists of one database version, published together."""
+    def __init__(self, version: str = None, columns: dict = None, categories: dict = None):
+        self.version = version
+        self.columns = columns or {}
+        self.categories = categories or {}
+
+    def __len__(self):
+        return len(self.columns.get(DATE_COLUMN, ()))
+
+
+class SalesColumnStore:
+    """
+    An in-memory, column-oriented copy of `unified_sales_data` for fast aggregates.
+
+    Numeric columns are int64 arrays, text columns are dictionary-encoded (int32 codes plus
+    a list of distinct values) and issue dates are datetime64[s]. Rows are sorted by
+    (issue date, rowid), so the last row of a group is its closing row. The arrays are
+    cached as .npy files next to the database and memory-mapped on load; the cache is
+    rebuilt whenever the database file changes.
+    """
+    def __init__(self, db_file: str = "sales_data.db", cache_dir: str = None):
+        """
+        Args:
+            db_file (str): The SQLite database file.
+            cache_dir (str, optional): Where to keep the column cache. Defaults to `<db_file>.colcache`.
+        """
+        self.db_file = db_file
+        self.cache_dir = cache_dir or db_file + ".colcache"
+        # Replaced as a whole, so a reader never pairs new codes with old categories.
+        self._data = _ColumnData()
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._data.version
+
+    @property
+    def columns(self) -> dict:
+        return self._data.columns
+
+    @property
+    def categories(self) -> dict:
+        return self._data.categories
+
+    def _db_version(self) -> str:
+        """Identifies the current content of the database file (and its WAL, if any)."""
+        parts = []
+        for path in (self.db_file, self.db_file + "-wal"):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                parts.append(f"{stat.st_mtime_ns}-{stat.st_size}")
+        return "_".join(parts)
+
+    def refresh(self) -> "SalesColumnStore":
+        """Loads the columns, from the cache when it matches the database, else from SQLite."""
+        version = self._db_version()
+        if version == self.version:
+            return self
+        with self._lock:
+            if version == self.version:
+                return self
+            self._data = self._load_cache(version) or self._build(version)
+        return self
+
+    def _load_cache(self, version: str):
+        """Returns the cached _ColumnData of a version, or None if the cache holds another one."""
+        meta_path = os.path.join(self.cache_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != version:
+            return None
+        try:
+            columns = {name: np.load(os.path.join(self.cache_dir, file_name), mmap_mode="r")
+                       for name, file_name in meta["files"].items()}
+        except OSError:
+            # Removed by a process that wrote a newer version meanwhile.
+            return None
+        return _ColumnData(version, columns, meta["categories"])
+
+    def _build(self, version: str) -> _ColumnData:
+        conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True)
+        try:
+            names = [DATE_COLUMN] + NUMERIC_COLUMNS + STRING_COLUMNS
+            select = ", ".join(f'"{name}"' for name in names)
+            rows = conn.execute(f'SELECT {select} FROM "{TABLE_NAME}" ORDER BY "{DATE_COLUMN}", rowid').fetchall()
+        finally:
+            conn.close()
+
+        raw = list(zip(*rows)) if rows else [()] * len(names)
+        columns = {DATE_COLUMN: np.array([d or "NaT" for d in raw[0]], dtype="datetime64[s]")}
+        for i, name in enumerate(NUMERIC_COLUMNS, start=1):
+            columns[name] = np.array([v or 0 for v in raw[i]], dtype=np.int64)
+        categories = {}
+        for i, name in enumerate(STRING_COLUMNS, start=1 + len(NUMERIC_COLUMNS)):
+            values = np.array(["" if v is None else str(v) for v in raw[i]], dtype=object)
+            uniques, codes = np.unique(values, return_inverse=True)
+            columns[name] = codes.astype(np.int32)
+            categories[name] = uniques.tolist()
+
+        self._save_cache(version, columns, categories)
+        return _ColumnData(version, columns, categories)
+
+    def _save_cache(self, version: str, columns: dict, categories: dict) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = {}
+        for i, (name, array) in enumerate(columns.items()):
+            file_name = f"col{i}_{version}.npy"
+            np.save(os.path.join(self.cache_dir, file_name), array)
+            files[name] = file_name
+        # meta.json is swapped in atomically, so readers never see a half-written cache.
+        tmp_path = os.path.join(self.cache_dir, f"meta.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "files": files, "categories": categories}, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.cache_dir, "meta.json"))
+        # Only older versions are removed: another process may have just written a newer one.
+        current = _version_key(version)
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(".npy") or file_name in files.values():
+                continue
+            file_version = file_name[:-len(".npy")].split("_", 1)[-1]
+            if _version_key(file_version) < current:
+                try:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                except OSError:
+                    pass
+
+    def __len__(self):
+        return len(self._data)
+
+    # --- Querying ---
+
+    def _column_name(self, data: _ColumnData, name: str) -> str:
+        name = COLUMN_ALIASES.get(str(name).strip().lower(), str(name).strip())
+        if name not in data.columns and name not in DATE_GROUPS:
+            raise ValueError(f"Unknown column '{name}'. Use one of: {sorted(COLUMN_ALIASES) + STRING_COLUMNS + list(DATE_GROUPS)}")
+        return name
+
+    def _period_mask(self, data: _ColumnData, period: str) -> np.ndarray:
+        """'2025', '2025-01', '2025-01-15' or a 'start:end' range of those (inclusive)."""
+        dates = data.columns[DATE_COLUMN]
+        start, _, end = str(period).partition(":")
+        end = end or start
+        lower = np.datetime64(start.strip())
+        upper = np.datetime64(end.strip())
+        # The end bound covers the whole year/month/day it names.
+        upper = (upper + 1).astype("datetime64[s]")
+        return (dates >= lower.astype("datetime64[s]")) & (dates < upper)
+
+    def _filter_mask(self, data: _ColumnData, filters: dict) -> np.ndarray:
+        mask = np.ones(len(data), dtype=bool)
+        for name, wanted in (filters or {}).items():
+            name = self._column_name(data, name)
+            if name in DATE_GROUPS:
+                raise ValueError(f"Filter dates with `period` instead of '{name}'.")
+            wanted = wanted if isinstance(wanted, (list, tuple)) else [wanted]
+            if name in data.categories:
+                lookup = {value: code for code, value in enumerate(data.categories[name])}
+                codes = [lookup[str(v)] for v in wanted if str(v) in lookup]
+                mask &= np.isin(data.columns[name], codes)
+            else:
+                mask &= np.isin(data.columns[name], np.asarray(wanted, dtype=np.int64))
+        return mask
+
+    def _group_keys(self, data: _ColumnData, group_by):
+        """Returns (integer key per row, function turning a key back into its labels)."""
+        keys = np.zeros(len(data), dtype=np.int64)
+        parts = []
+        for name in group_by:
+            name = self._column_name(data, name)
+            if name in DATE_GROUPS:
+                unit = DATE_GROUPS[name]
+                values = data.columns[DATE_COLUMN].astype(f"datetime64[{unit}]").astype(np.int64)
+                base = int(values.min()) if len(values) else 0
+                codes = values - base
+                size = int(codes.max()) + 1 if len(codes) else 1
+                label = lambda c, base=base, unit=unit: str(np.datetime64(c + base, unit))
+            else:
+                codes = data.columns[name].astype(np.int64)
+                labels = data.categories[name]
+                size = len(labels) or 1
+                label = lambda c, labels=labels: labels[c] or "(empty)"
+            keys = keys * size + codes
+            parts.append((label, size))
+
+        def decode(key):
+            labels = []
+            for label, size in reversed(parts):
+                labels.append(label(key % size))
+                key //= size
+            return tuple(reversed(labels))
+        return keys, decode
+
+    def aggregate(self, metric: str = "total_net", group_by=None, filters: dict = None, period: str = None):
+        """
+        Runs a grouped aggregate with vectorized NumPy code.
+
+        Args:
+            metric (str): 'total_net', 'ticket_price', 'count' or 'closing_balance'.
+            group_by (str | list[str], optional): Columns ('T', 'customer', ...) and/or 'year', 'month', 'day'.
+            filters (dict, optional): {column: value or [values]} equality filters.
+            period (str, optional): '2025-01', '2025' or a 'start:end' range.
+
+        Returns:
+            A scalar when there is no grouping, else a list of (labels, value) rows.
+        """
+        # One consistent version for the whole call, even if a refresh swaps it meanwhile.
+        data = self.refresh()._data
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}'. Use one of: {list(METRICS)}")
+        kind, column = METRICS[metric]
+
+        mask = self._filter_mask(data, filters)
+        if period:
+            mask &= self._period_mask(data, period)
+        rows = np.flatnonzero(mask)
+        values = data.columns[column][rows] if column else None
+
+        if isinstance(group_by, str):
+            group_by = [g for g in group_by.split(",") if g.strip()]
+        if not group_by:
+            if kind == "count":
+                return int(len(rows))
+            if len(rows) == 0:
+                return None
+            return int(values.sum()) if kind == "sum" else int(values[-1])
+
+        keys, decode = self._group_keys(data, group_by)
+        uniques, inverse = np.unique(keys[rows], return_inverse=True)
+        if kind == "count":
+            results = np.bincount(inverse, minlength=len(uniques))
+        elif kind == "sum":
+            results = np.zeros(len(uniques), dtype=np.int64)
+            np.add.at(results, inverse, values)
+        else:
+            # Rows are in date order, so the last occurrence of each group is its closing row.
+            _, last_from_end = np.unique(inverse[::-1], return_index=True)
+            results = values[len(inverse) - 1 - last_from_end]
+        return [(decode(int(key)), int(value)) for key, value in zip(uniques, results)]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_file: str = "sales_data.db") -> SalesColumnStore:
+    """Returns the process-wide column store for a database file, refreshed if the file changed."""
+    with _stores_lock:
+        store = _stores.get(db_file)
+        if store is None:
+            store = _stores[db_file] = SalesColumnStore(db_file)
+    return store.refresh()
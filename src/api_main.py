@@ -1,18 +1,29 @@
 import os
+import time
+from typing import Optional
 from dotenv import load_dotenv
 from google import genai
 
-from llm_abstraction import LLM
+from llm_abstraction import LLM, router_from_env
 from base_agent import BaseAgent, JsonOutputParser
-from tools import ToolManager, BaseTool, get_current_time, calculator, Final_Answer, run_sql_query
+from tools import ToolManager, BaseTool, ToolPolicy, get_current_time, calculator, evaluate_expression, Final_Answer, run_sql_query, run_sharded_query, aggregate_sales
 from agent_executor import AgentExecutor
 from prompt_template import PromptTemplate
+from memory import SessionMemoryStore
+from vector_store import VectorStoreMemory
+from snapshot import snapshots_enabled, get_snapshot
+from checkpoint import store_from_env
+from job_queue import JobQueue, QueueFull
+from admission import Overloaded, controller_from_env
+from ingest import COLUMNS as INGEST_COLUMNS
 
 load_dotenv()
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 app = FastAPI()
@@ -35,78 +46,192 @@ async def root():
     return JSONResponse(content={"message": "Connect Succesful!"},
                         status_code=200)
 
+@app.get("/profile")
+async def profile(n: int = 10, sort_by: str = "total"):
+    """Per-tool timings and the top-n SQL fingerprints seen by this process."""
+    from profiler import tool_profiler
+    try:
+        report = tool_profiler.report(n=n, sort_by=sort_by)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    models = model_router.summary() if model_router is not None else None
+    load = admission.summary() if admission is not None else None
+    return JSONResponse(content={"report": report, "models": models, "admission": load}, status_code=200)
+
+# With AGENT_SQL_SNAPSHOT=1 the database is copied into memory once at startup and
+# reloaded in the background when the file changes.
+if snapshots_enabled():
+    get_snapshot("sales_data.db")
+
+# With AGENT_MODEL_ROUTING=1, picks a model per LLM call; its statistics are shared by every
+# request of this process.
+model_router = router_from_env()
+
+# Bounds the /query requests running at once; the rest wait in priority lanes or get a 429.
+# The limit stays below the 40 threads that run blocking endpoint code.
+admission = controller_from_env()
+
+# Executor state of runs started with a run_id, so that retries resume them.
+checkpoint_store = store_from_env()
+
+# Chat history for follow-up questions, shared by every request of this process.
+session_store = SessionMemoryStore(
+    max_sessions=int(os.getenv("AGENT_MAX_SESSIONS", "5000")),
+    max_total_tokens=int(os.getenv("AGENT_MEMORY_MAX_TOKENS", "2000000")),
+    idle_ttl=float(os.getenv("AGENT_SESSION_TTL", "1800")),
+)
+
+# Every column of `unified_sales_data`, in table order. The names are always in the system
+# prompt; only their descriptions and the examples below are retrieved per question.
+TABLE_COLUMNS = [name for name, _ in INGEST_COLUMNS]
+
+# Column descriptions and examples of `unified_sales_data`. Only the most relevant
+# ones for each question are retrieved into the prompt.
+SCHEMA_SNIPPETS = [
+    "**`STT_Order`**: Số thứ tự giao dịch, đánh dấu thứ tự bản ghi.",
+    "**`Ngày_CT_Issue_date`**: Ngày phát hành chứng từ (ngày, tháng, năm của giao dịch), định dạng `YYYY-MM-DD HH:MM:SS`.",
+    "**`Số_CT_Doc_Nbr`**: Mã chứng từ duy nhất, nhận diện giao dịch.",
+    "**`Hành_trình_Route`**: Lộ trình di chuyển hoặc thông tin giao dịch, có thể trống.",
+    "**`Nội_dung_Description`**: Mô tả chi tiết giao dịch (hành khách hoặc thanh toán).",
+    "**`Thông_tin_khác_Extra_Info`**: Thông tin bổ sung, thường là mã vé, có thể trống.",
+    "**`Curr`**: Loại tiền tệ, thường là `VND`.",
+    "**`Tỷ_giá_ROE`**: Tỷ giá hối đoái, thường là `1` cho `VND`.",
+    "**`Giá_vé_Ticket_Price`**: Giá vé cơ bản, `0` cho giao dịch không bán vé.",
+    "**`Thành_tiền_Total_Net`**: Giá trị thực tế sau phí và hoa hồng, ảnh hưởng công nợ.",
+    "**`Tiền_nợ`**: Số dư công nợ tích lũy sau mỗi giao dịch. Để tìm tổng công nợ cuối kỳ (ví dụ: cuối tháng), bạn cần lấy giá trị cuối cùng của cột này cho tháng đó.",
+    "**`Rmks`**: Ghi chú, chứa mã khách hàng hoặc thông tin liên quan, có thể trống.",
+]
+EXAMPLE_SNIPPETS = [
+    "Ví dụ bán vé (S): (3, '2025-01-02 00:00:00', 'VJAUM4QJY', 'HANVJSGNVJHAN', 'NGUYEN, NGOC MINH', 'UM4QJY / Y / Y', 'S', 'VND', 1, 4558000, 4568000, 99418392, 'KH05234')",
+    "Ví dụ bán vé (S) cho nhân viên: (4, '2025-01-02 00:00:00', 'VJAYJZCP7', 'CXRVJHANVJCXR', 'HUYNH, THI NHI', 'YJZCP7 / Y / Y', 'S', 'VND', 1, 6674800, 6684800, 106103192, 'EMP1000041')",
+    "Ví dụ gửi tiền, thanh toán chuyển khoản ngân hàng (D): (5, '2025-01-03 00:00:00', 'UNT0103/00954', None, 'VCB - 020097041501030758462025udQz75966984972075846minh diep anh ck ()', ' ', 'D', 'VND', 1, 0, -60000000, 46103192, None)",
+    "Ví dụ hoàn vé (R): (5, '2025-02-04 00:00:00', '9264560319455', 'HOAN VE VOID-5I8JR7', 'NGUYEN/BAO KHANH MS', ' ', 'R', 'VND', 1, -300000, -300000, 1170612, None)",
+    "Ví dụ hoàn tiền (R): (82, '2025-07-23 00:00:00', '7382312984156', 'SGNVNHAN', 'TRAN/QUOC HUNG MR', 'F3NLUA / SVNF / S', 'R', 'VND', 1, -3495000, -3130000, 4239851, 'MDANH')",
+    "Ví dụ công nợ cuối tháng 1: SELECT `Tiền_nợ` FROM unified_sales_data WHERE `Ngày_CT_Issue_date` LIKE '2025-01%' ORDER BY `Ngày_CT_Issue_date` DESC, `STT_Order` DESC LIMIT 1",
+    "Ví dụ tổng doanh thu bán vé theo tháng: SELECT substr(`Ngày_CT_Issue_date`, 1, 7) AS thang, SUM(`Thành_tiền_Total_Net`) FROM unified_sales_data WHERE T = 'S' GROUP BY thang",
+    "Ví dụ tổng tiền khách hàng đã gửi/thanh toán: SELECT SUM(`Thành_tiền_Total_Net`) FROM unified_sales_data WHERE T = 'D'",
+    "Ví dụ doanh thu theo mã khách hàng: SELECT Rmks, SUM(`Thành_tiền_Total_Net`) FROM unified_sales_data WHERE T = 'S' GROUP BY Rmks ORDER BY 2 DESC",
+    "Ví dụ doanh thu nhiều năm (mỗi năm một file sales_data_YYYY.db): run_sharded_query với query \"SELECT substr(`Ngày_CT_Issue_date`, 1, 7) AS thang, SUM(`Thành_tiền_Total_Net`) FROM unified_sales_data WHERE T = 'S' GROUP BY thang\" và period \"2024-07:2025-06\"",
+]
+sales_knowledge = VectorStoreMemory.from_texts(
+    {"schema": SCHEMA_SNIPPETS, "example": EXAMPLE_SNIPPETS},
+    path=os.getenv("AGENT_KNOWLEDGE_PATH"),
+)
+
 class Query(BaseModel):
     prompt: str
     iteration: int = 1
     dev_mode: bool = False
     task: bool = False
+    session_id: Optional[str] = None
+    # Retrying a failed request with the same run_id resumes it from its last completed step.
+    run_id: Optional[str] = None
+    # Latency budget: the best answer available is returned (flagged "partial") when it runs out.
+    timeout_ms: Optional[int] = None
+    # Unix time by which the answer is needed; with timeout_ms, the earlier one applies.
+    deadline: Optional[float] = None
+
+class JobRequest(Query):
+    # Higher runs first.
+    priority: int = 0
+
+class ClientUnavailable(Exception):
+    """Raised when the Gemini client cannot be created, e.g. without GEMINI_API_KEY."""
 
 @app.post("/query")
-async def query(query:Query):
+async def query(query:Query, request: Request):
+    if admission is None:
+        try:
+            return JSONResponse(content=await run_in_threadpool(run_query, query), status_code=200)
+        except ClientUnavailable as e:
+            return JSONResponse(content={"error": str(e)}, status_code=500)
+    # Frontends send X-Priority: interactive (the default); scripts and bulk clients send batch.
+    lane = request.headers.get("X-Priority", "interactive").lower()
+    if lane not in admission.lanes:
+        return JSONResponse(content={"error": f"Unknown X-Priority '{lane}'. Use one of: {', '.join(admission.lanes)}."},
+                            status_code=400)
+    # The time budget starts on arrival, so waiting for a slot uses it up too.
+    if query.timeout_ms is not None:
+        arrival_deadline = time.time() + query.timeout_ms / 1000
+        query.deadline = arrival_deadline if query.deadline is None else min(query.deadline, arrival_deadline)
+    max_wait = query.deadline - time.time() if query.deadline is not None else None
+    try:
+        async with admission.admit(lane, max_wait=max_wait):
+            content = await run_in_threadpool(run_query, query)
+    except Overloaded as e:
+        return JSONResponse(content={"error": str(e)}, status_code=429,
+                            headers={"Retry-After": str(e.retry_after)})
+    except ClientUnavailable as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+    return JSONResponse(content=content, status_code=200)
+
+def run_query(query: Query, cancel_token=None) -> dict:
+    """
+    Builds the agent for a query, runs it and returns the response body.
+
+    Args:
+        query (Query): The request.
+        cancel_token (CancelToken, optional): Stops the run between steps when cancelled.
+
+    Raises:
+        ClientUnavailable: If the Gemini client cannot be created. Raised rather than exiting,
+                           since this runs on request and job worker threads.
+    """
     try:
         client = genai.Client()
     except Exception as e:
         print(f"Error initializing Gemini client: {e}")
         print("Please make sure you have the GEMINI_API_KEY environment variable set.")
-        exit()
+        raise ClientUnavailable(f"The Gemini client could not be initialized: {e}") from e
 
     if query:
         model_name="gemini-2.0-flash"
         fallback_model_name="gemini-2.5-flash"
         print("--- Initializing AI Agent Framework ---")
         # 1. Initialize the LLM Abstraction Layer
-        llm = LLM(model_name=model_name,fallback_model_name=fallback_model_name, client=client)
+        llm = LLM(model_name=model_name,fallback_model_name=fallback_model_name, client=client, router=model_router)
     
         # 2. Register Tools with the ToolManager
         tool_manager = ToolManager()
         calculator_tool = BaseTool(name="calculator", func=calculator)
+        evaluate_tool = BaseTool(name="evaluate_expression", func=evaluate_expression,
+                                 keywords="tính toán biểu thức tổng trung bình phần trăm tăng trưởng chia")
         get_time_tool = BaseTool(name="get_time", func=get_current_time)
         final_answer = BaseTool(name="Final_Answer", func=Final_Answer)
-        run_sql_query_tool = BaseTool(name="run_sql_query", func=run_sql_query)
+        run_sql_query_tool = BaseTool(name="run_sql_query", func=run_sql_query,
+                                      keywords="truy vấn dữ liệu doanh thu công nợ khách hàng giao dịch bán vé hoàn tiền tháng tổng",
+                                      policy=ToolPolicy(timeout=float(os.getenv("AGENT_SQL_TIMEOUT", "20")),
+                                                        max_concurrency=int(os.getenv("AGENT_SQL_CONCURRENCY", "4"))))
+        run_sharded_query_tool = BaseTool(name="run_sharded_query", func=run_sharded_query,
+                                          keywords="truy vấn nhiều năm từ năm đến năm các năm trước so sánh năm doanh thu công nợ",
+                                          policy=ToolPolicy(timeout=float(os.getenv("AGENT_SQL_TIMEOUT", "20")),
+                                                            max_concurrency=int(os.getenv("AGENT_SQL_CONCURRENCY", "4"))))
+        aggregate_sales_tool = BaseTool(name="aggregate_sales", func=aggregate_sales,
+                                        keywords="tổng doanh thu công nợ cuối kỳ cuối tháng số dư đếm số giao dịch theo tháng theo khách hàng theo loại")
         tool_manager.add_tool(run_sql_query_tool)
+        tool_manager.add_tool(run_sharded_query_tool)
+        tool_manager.add_tool(aggregate_sales_tool)
         tool_manager.add_tool(get_time_tool)
         tool_manager.add_tool(calculator_tool)
-        tool_manager.add_tool(final_answer)
+        tool_manager.add_tool(evaluate_tool)
+        tool_manager.add_tool(final_answer, pinned=True)
     
-        # 3. Create the Prompt Template to inform the agent about its tools
-        tool_descriptions = "\n".join([f"- {tool.name}: {tool.description}" for tool in tool_manager.get_all_tools()])
+        # 3. Create the Prompt Template to inform the agent about its tools.
+        # Only the tools relevant to the question are described (see AGENT_TOOL_K).
+        tool_k = os.getenv("AGENT_TOOL_K")
         prompt_template = PromptTemplate(
-            system_prompt=f"""
+            system_prompt="""
 Bạn là một trợ lý phân tích dữ liệu chuyên nghiệp. Nhiệm vụ của bạn là giải quyết các vấn đề phức tạp bằng cách tạo ra một chuỗi các lệnh gọi công cụ.
 
 Cấu trúc Dữ liệu
 Tất cả dữ liệu từ các tệp CSV đã được hợp nhất vào một bảng duy nhất trong cơ sở dữ liệu SQLite.
 Tên file: `sales_data.db`.
 Tên table: `unified_sales_data`
-
-Các cột trong bảng:
-**`STT_Order`**: Số thứ tự giao dịch, đánh dấu thứ tự bản ghi.
-**`Ngày_CT_Issue_date`**: Ngày phát hành chứng từ, định dạng `YYYY-MM-DD HH:MM:SS`.
-**`Số_CT_Doc_Nbr`**: Mã chứng từ duy nhất, nhận diện giao dịch.
-**`Hành_trình_Route`**: Lộ trình di chuyển hoặc thông tin giao dịch, có thể trống.
-**`Nội_dung_Description`**: Mô tả chi tiết giao dịch (hành khách hoặc thanh toán).
-**`Thông_tin_khác_Extra_Info`**: Thông tin bổ sung, thường là mã vé, có thể trống.
+Các cột (đặt tên cột trong dấu backtick khi viết SQL): """ + ", ".join(f"`{column}`" for column in TABLE_COLUMNS) + """
 
 IMPORTANT, PAY MORE ATTENTION TO THIS
 **`T`**: Loại giao dịch. **S** (bán vé) làm tăng công nợ. **D** (gửi tiền) làm giảm công nợ. **R** (hoàn tiền) và **V** (hủy giao dịch) cũng ảnh hưởng đến công nợ.
-
-**`Curr`**: Loại tiền tệ, thường là `VND`.
-**`Tỷ_giá_ROE`**: Tỷ giá hối đoái, thường là `1` cho `VND`.
-**`Giá_vé_Ticket_Price`**: Giá vé cơ bản, `0` cho giao dịch không bán vé.
-**`Thành_tiền_Total_Net`**: Giá trị thực tế sau phí và hoa hồng, ảnh hưởng công nợ.
-**`Tiền_nợ`**: Số dư công nợ tích lũy sau mỗi giao dịch. Để tìm tổng công nợ cuối kỳ (ví dụ: cuối tháng), bạn cần lấy giá trị cuối cùng của cột này cho tháng đó.
-**`Rmks`**: Ghi chú, chứa mã khách hàng hoặc thông tin liên quan, có thể trống.
-
-Đây là ví dụ của bảng:
-(3, '2025-01-02 00:00:00', 'VJAUM4QJY', 'HANVJSGNVJHAN', 'NGUYEN, NGOC MINH', 'UM4QJY / Y / Y', 'S', 'VND', 1, 4558000, 4568000, 99418392, 'KH05234')
-(4, '2025-01-02 00:00:00', 'VJAYJZCP7', 'CXRVJHANVJCXR', 'HUYNH, THI NHI', 'YJZCP7 / Y / Y', 'S', 'VND', 1, 6674800, 6684800, 106103192, 'EMP1000041')
-(5, '2025-01-03 00:00:00', 'UNT0103/00954', None, 'VCB - 020097041501030758462025udQz75966984972075846minh diep anh ck ()', ' ', 'D', 'VND', 1, 0, -60000000, 46103192, None)
-
-Các ví dụ khác:
-(5, '2025-02-04 00:00:00', '9264560319455', 'HOAN VE VOID-5I8JR7', 'NGUYEN/BAO KHANH MS', ' ', 'R', 'VND', 1, -300000, -300000, 1170612, None)
-(82, '2025-07-23 00:00:00', '7382312984156', 'SGNVNHAN', 'TRAN/QUOC HUNG MR', 'F3NLUA / SVNF / S', 'R', 'VND', 1, -3495000, -3130000, 4239851, 'MDANH')
-
-
+Mô tả các cột và ví dụ liên quan đến câu hỏi được liệt kê trong phần "Relevant schema and examples".
 
 Năm nay là năm 2025.
 Bạn có quyền truy cập vào các công cụ sau:
@@ -116,25 +241,96 @@ Hãy tự tin với câu trả lời của mình và luôn đưa ra kết quả
 Bạn phải cung cấp một kế hoạch giải quyết hoàn toàn yêu cầu của người dùng.
     """,
             user_input="{user_input}",
-            history="{history}"
+            history="{history}",
+            knowledge=sales_knowledge,
+            knowledge_k=int(os.getenv("AGENT_KNOWLEDGE_K", "4")),
+            tool_manager=tool_manager,
+            tool_k=int(tool_k) if tool_k else 3
             )
     
         # 4. Create the Agent with the LLM
         agent = BaseAgent(llm=llm)
     
         # 5. Initialize the AgentExecutor with the Agent and ToolManager
-        executor = AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,max_iterations=query.iteration, dev_mode=query.dev_mode, json_output=query.task)
+        history = session_store.load(query.session_id) if query.session_id else None
+        executor = AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,max_iterations=query.iteration, history=history, dev_mode=query.dev_mode, json_output=query.task, checkpoint_store=checkpoint_store if query.run_id else None, cancel_token=cancel_token)
     
         print("\n--- Framework Initialized. Running Demo Task ---")
     
         user_prompt = query.prompt
     
         # 6. Run the AgentExecutor
-        final_output, response_obj= executor.run(user_prompt)
+        final_output, response_obj= executor.run(user_prompt, run_id=query.run_id, deadline=query.deadline, timeout_ms=query.timeout_ms)
         print("\n--- Task Complete ---")
         print(f"Result: {final_output}")
-        return JSONResponse(content={"output":final_output, 
-                                     "duration":response_obj["duration"],
-                                     "token_usage": response_obj["token_usage"],
-                                     "plan": response_obj["content"]},
-                            status_code=200)
+        if query.session_id:
+            session_store.add_turn(query.session_id, user_prompt, final_output)
+        # A run stopped early (deadline, cancellation) may not have an LLM answer yet.
+        response_obj = response_obj or {}
+        return {"output":final_output,
+                "session_id": query.session_id,
+                "duration":response_obj.get("duration"),
+                "token_usage": response_obj.get("token_usage"),
+                "plan": response_obj.get("content"),
+                "partial": executor.partial}
+
+# --- Background jobs ---
+# Long multi-iteration queries are queued and run by background workers; clients poll
+# GET /jobs/{id} instead of keeping a connection open for the whole run.
+
+def _run_job(job_id: str, payload: dict, cancel_token) -> dict:
+    query = Query(**{k: v for k, v in payload.items() if k in Query.model_fields})
+    # Jobs are checkpointed under their id, which also gives GET /jobs/{id} its partial
+    # results and lets a job interrupted by a restart resume where it stopped.
+    query.run_id = query.run_id or f"job:{job_id}"
+    return run_query(query, cancel_token=cancel_token)
+
+job_queue = JobQueue(
+    _run_job,
+    path=os.getenv("AGENT_JOB_DB", "agent_jobs.db"),
+    workers=int(os.getenv("AGENT_JOB_WORKERS", "2")),
+    max_running_per_client=int(os.getenv("AGENT_JOB_MAX_RUNNING_PER_CLIENT", "1")),
+    max_queued_per_client=int(os.getenv("AGENT_JOB_MAX_QUEUED_PER_CLIENT", "20")),
+)
+app.add_event_handler("startup", job_queue.start)
+
+def _partial_result(job: dict):
+    """The steps a running job has completed so far, from its checkpoint."""
+    if checkpoint_store is None or job["status"] != "running":
+        return None
+    run_id = job["payload"].get("run_id") or f"job:{job['id']}"
+    state = checkpoint_store.load(run_id)
+    if state is None:
+        return None
+    return {"iteration": state["iteration"] + 1,
+            "completed_steps": state["next_step"],
+            "results": {key: str(value)[:500] for key, value in state["context"].items()}}
+
+@app.post("/jobs")
+async def create_job(job: JobRequest, request: Request):
+    client_id = request.headers.get("X-Client-Id") or (request.client.host if request.client else "anonymous")
+    try:
+        job_id = job_queue.submit(job.model_dump(exclude={"priority"}), client_id=client_id, priority=job.priority)
+    except QueueFull as e:
+        return JSONResponse(content={"error": str(e)}, status_code=429)
+    return JSONResponse(content={"job_id": job_id, "status": "queued"}, status_code=202)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": f"Unknown job '{job_id}'"}, status_code=404)
+    content = {key: job.get(key) for key in ("status", "position", "priority", "created_at", "started_at",
+                                              "finished_at", "result", "error", "cancel_requested")}
+    content["job_id"] = job_id
+    content["partial"] = _partial_result(job)
+    return JSONResponse(content=jsonable_encoder(content), status_code=200)
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    if not job_queue.cancel(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            return JSONResponse(content={"error": f"Unknown job '{job_id}'"}, status_code=404)
+        return JSONResponse(content={"job_id": job_id, "status": job["status"]}, status_code=409)
+    return JSONResponse(content={"job_id": job_id, "status": job_queue.get(job_id)["status"]}, status_code=202)
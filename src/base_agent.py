@@ -40,17 +40,37 @@ class BaseAgent:
         self.llm = llm
         self.parser = JsonOutputParser()
 
-    def run(self, prompt: str):
+    def run(self, prompt: str, hints: dict = None, timeout: float = None):
+        """
+        Sends a prompt to the LLM and parses its answer.
+
+        Args:
+            prompt (str): The formatted prompt.
+            hints (dict, optional): Routing features for the LLM ('tools', 'iteration').
+            timeout (float, optional): Seconds the LLM call may take.
+
+        Returns:
+            dict: content, duration, token_usage, and the route and model that answered.
+        """
         print("Agent is running, vroom vroom!")
 
         # The LLM call is now handled by the LLM abstraction class.
-        response, responding_time= self.llm.generate_content(contents=prompt)
+        response, responding_time= self.llm.generate_content(contents=prompt, hints=hints, timeout=timeout)
+        route, model = self.llm.last_call
 
         # Now, we use the parser before returning the output.
         print(f"Total token usage: {response.usage_metadata.total_token_count}")
         response_text = self.parser.parse(response.text)
         response_obj = {"content":response_text,
                         "duration": responding_time,
-                        "token_usage": response.usage_metadata.total_token_count}
+                        "token_usage": response.usage_metadata.total_token_count,
+                        "route": route,
+                        "model": model}
         return response_obj
 
+    def report_outcome(self, response_obj: dict, success: bool) -> None:
+        """Tells the LLM's router whether an answer was usable, so routing adapts over time."""
+        router = getattr(self.llm, "router", None)
+        if router is not None:
+            router.record_outcome(response_obj.get("route"), response_obj.get("model"), success)
+
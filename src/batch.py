@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from agent_executor import AgentExecutor
+from llm_abstraction import LLMScheduler
+
+
+def read_prompts(source: str):
+    """
+    Reads batch prompts from a JSONL file or from stdin ('-').
+
+    Each line is either a JSON object with a 'prompt' (and optionally 'id', 'iteration',
+    'task') or a plain-text prompt. Lines without an id get 'line-<n>'.
+
+    Yields:
+        dict: One job per non-empty line.
+    """
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        for n, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError:
+                job = line
+            if not isinstance(job, dict):
+                job = {"prompt": str(job)}
+            job.setdefault("id", f"line-{n}")
+            job["id"] = str(job["id"])
+            yield job
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def completed_ids(output_path: str) -> set:
+    """Returns the ids already answered successfully in a previous (possibly crashed) run."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a partial last line; that job is simply run again.
+                continue
+            if result.get("status") == "ok":
+                done.add(str(result.get("id")))
+    return done
+
+
+def drop_torn_tail(output_path: str) -> None:
+    """
+    Cuts a partial last line (left by a crash mid-write) off the results file, so the
+    next record starts on a line of its own.
+    """
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline >= 0:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position < end:
+            f.truncate(position)
+
+
+def run_job(job: dict, agent_stack, iteration: int, dev_mode: bool, task: bool, checkpoint_store=None) -> dict:
+    """
+    Runs one prompt on its own AgentExecutor and returns the result record.
+    With a checkpoint store, a job that failed midway resumes from its last completed step.
+    """
+    agent, tool_manager, prompt_template = agent_stack
+    executor = AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,
+                             max_iterations=job.get("iteration", iteration), dev_mode=dev_mode,
+                             json_output=job.get("task", task), checkpoint_store=checkpoint_store)
+    start_time = time.time()
+    try:
+        result = executor.run(job["prompt"], run_id=f"batch:{job['id']}")
+    except Exception as e:
+        return {"id": job["id"], "status": "error", "error": str(e),
+                "tokens": executor.total_token_usage, "duration": time.time() - start_time}
+
+    final_output, response_obj = result
+    if executor.failed:
+        # The executor gave up (invalid plan, execution error): the job is recorded as failed
+        # and run again on resume.
+        return {"id": job["id"], "status": "error", "error": final_output,
+                "tokens": executor.total_token_usage, "duration": time.time() - start_time}
+    return {"id": job["id"],
+            "status": "ok",
+            "output": final_output,
+            "plan": response_obj.get("content"),
+            "tokens": executor.total_token_usage,
+            "duration": time.time() - start_time}
+
+
+def run_batch(source: str, output_path: str, concurrency: int = 4, requests_per_minute: float = None,
+              iteration: int = 1, dev_mode: bool = False, task: bool = False, tool_k: int = None,
+              agent_stack=None, checkpoint_store=None) -> dict:
+    """
+    Runs every prompt of a JSONL file through the agent, several at a time.
+
+    Results are appended to `output_path` as soon as each prompt finishes, so a crashed
+    batch can be restarted with the same arguments and skips the ids already answered.
+
+    Args:
+        source (str): JSONL file of prompts, or '-' for stdin.
+        output_path (str): JSONL file to append results to.
+        concurrency (int): Number of prompts run at once.
+        requests_per_minute (float, optional): LLM request rate shared by all prompts.
+        iteration (int): Default maximum iterations per prompt.
+        dev_mode (bool): Enable verbose logging.
+        task (bool): Default for tool calling (JSON plan output).
+        tool_k (int, optional): Only describe the k most relevant tools to the agent.
+        agent_stack (tuple, optional): Prebuilt (agent, tool_manager, prompt_template).
+        checkpoint_store (CheckpointStore, optional): Lets prompts that failed midway resume
+                                                      from their last completed step.
+
+    Returns:
+        dict: Counts of 'ok', 'error' and 'skipped' prompts.
+    """
+    if agent_stack is None:
+        from main import build_agent_stack
+        scheduler = LLMScheduler(max_concurrent=concurrency, requests_per_minute=requests_per_minute)
+        agent_stack = build_agent_stack(tool_k=tool_k, scheduler=scheduler)
+
+    drop_torn_tail(output_path)
+    done = completed_ids(output_path)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    write_lock = threading.Lock()
+    start_time = time.time()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        def process(job):
+            record = run_job(job, agent_stack, iteration, dev_mode, task, checkpoint_store)
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                out.flush()
+                counts[record["status"]] += 1
+                finished = counts["ok"] + counts["error"]
+                print(f"[batch] {job['id']}: {record['status']} in {record['duration']:.2f}s "
+                      f"({finished} done, {time.time() - start_time:.1f}s elapsed)")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending = []
+            for job in read_prompts(source):
+                if job["id"] in done:
+                    counts["skipped"] += 1
+                    continue
+                # Bound the queue so a huge input file is not read into memory at once.
+                pending.append(pool.submit(process, job))
+                if len(pending) >= concurrency * 4:
+                    pending.pop(0).result()
+            for future in pending:
+                future.result()
+
+    print(f"[batch] Finished: {counts}")
+    return counts
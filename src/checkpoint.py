@@ -0,0 +1,113 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from contextlib import closing
+
+
+class CheckpointStore:
+    """
+    Keeps the state of agent runs in a local SQLite file, keyed by run id.
+
+    The executor saves its state after every LLM plan and every tool step, so a run
+    retried with the same id continues from its last completed step instead of paying
+    for the LLM calls and SQL queries again. Checkpoints are deleted when a run
+    finishes, and abandoned ones are removed after `ttl` seconds.
+    """
+    def __init__(self, path: str = "agent_checkpoints.db", ttl: float = 86400, cleanup_interval: float = 300):
+        """
+        Args:
+            path (str): The SQLite file holding the checkpoints.
+            ttl (float): Seconds after its last update that an unfinished run is dropped.
+            cleanup_interval (float): Minimum seconds between two clean-ups of old runs.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS checkpoints ("
+                         "run_id TEXT PRIMARY KEY, user_input TEXT, state BLOB, updated_at REAL)")
+            conn.commit()
+        self.cleanup()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def save(self, run_id: str, user_input: str, state: dict) -> None:
+        """
+        Stores the latest state of a run, replacing the previous one.
+
+        Args:
+            run_id (str): The run.
+            user_input (str): The question the run answers; a resume must ask the same one.
+            state (dict): Picklable executor state. A state that cannot be pickled (e.g. a
+                          tool result holding a connection or a lock) is not saved, and
+                          the run keeps its previous checkpoint.
+        """
+        try:
+            blob = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            print(f"Checkpoint of run '{run_id}' skipped, its state cannot be saved: {e}")
+            return
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+                         (run_id, user_input, blob, time.time()))
+            conn.commit()
+        if time.time() - self._last_cleanup > self.cleanup_interval:
+            self.cleanup()
+
+    def load(self, run_id: str, user_input: str = None):
+        """
+        Returns the saved state of a run, or None if there is none (or it answers
+        another question than `user_input`).
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT user_input, state, updated_at FROM checkpoints WHERE run_id = ?",
+                               (run_id,)).fetchone()
+        if row is None or time.time() - row[2] > self.ttl:
+            return None
+        if user_input is not None and row[0] != user_input:
+            return None
+        try:
+            return pickle.loads(row[1])
+        except Exception:
+            return None
+
+    def delete(self, run_id: str) -> None:
+        """Removes the checkpoint of a finished run."""
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            conn.commit()
+
+    def cleanup(self) -> int:
+        """
+        Deletes checkpoints not updated for `ttl` seconds.
+
+        Returns:
+            int: Number of checkpoints deleted.
+        """
+        with self._lock:
+            self._last_cleanup = time.time()
+        with closing(self._connect()) as conn:
+            deleted = conn.execute("DELETE FROM checkpoints WHERE updated_at < ?", (time.time() - self.ttl,)).rowcount
+            conn.commit()
+        return deleted
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+
+
+def store_from_env():
+    """
+    Builds the CheckpointStore configured by AGENT_CHECKPOINT_DB (default
+    agent_checkpoints.db; empty disables checkpoints) and AGENT_CHECKPOINT_TTL.
+    """
+    path = os.getenv("AGENT_CHECKPOINT_DB", "agent_checkpoints.db")
+    if not path:
+        return None
+    return CheckpointStore(path, ttl=float(os.getenv("AGENT_CHECKPOINT_TTL", "86400")))
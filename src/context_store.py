@@ -0,0 +1,146 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def _size_of(value) -> int:
+    """Approximate size in bytes of a tool result."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(repr(value).encode("utf-8"))
+
+
+class ContextStore:
+    """
+    Holds the tool results of one agent run.
+
+    Values are always returned in full (for `$id` resolution), but only small values are
+    inlined into prompts; larger ones are shown as a handle with a short preview. The
+    values kept in memory are capped at `max_memory_bytes`: beyond it the oldest large
+    values are pickled to a temporary directory and read back when referenced.
+    """
+    def __init__(self, max_memory_bytes: int = 8_000_000, inline_chars: int = 500, preview_chars: int = 200):
+        """
+        Args:
+            max_memory_bytes (int): Bytes of results kept in memory before spilling to disk.
+            inline_chars (int): Results whose text is at most this long are inlined in prompts.
+            preview_chars (int): Length of the preview shown for larger results.
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.inline_chars = inline_chars
+        self.preview_chars = preview_chars
+        self.memory_bytes = 0
+        self._values = OrderedDict()
+        self._spilled = {}
+        self._meta = {}
+        self._spill_dir = None
+        self._lock = threading.Lock()
+
+    def __setitem__(self, key, value) -> None:
+        text = str(value)
+        size = _size_of(value)
+        with self._lock:
+            self._discard(key)
+            self._meta[key] = {"type": type(value).__name__, "chars": len(text), "bytes": size,
+                               "preview": text[:self.preview_chars]}
+            self._values[key] = value
+            self.memory_bytes += size
+            self._spill_if_needed()
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            path = self._spilled.get(key)
+        if path is None:
+            raise KeyError(key)
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key) -> bool:
+        return key in self._meta
+
+    def __iter__(self):
+        return iter(list(self._meta))
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def _discard(self, key) -> None:
+        if key in self._values:
+            self.memory_bytes -= self._meta[key]["bytes"]
+            del self._values[key]
+        path = self._spilled.pop(key, None)
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._meta.pop(key, None)
+
+    def _spill_if_needed(self) -> None:
+        """Moves the oldest large values to disk until memory use is under the cap."""
+        for key in list(self._values):
+            if self.memory_bytes <= self.max_memory_bytes:
+                return
+            meta = self._meta[key]
+            if meta["chars"] <= self.inline_chars:
+                continue
+            if self._spill_dir is None:
+                self._spill_dir = tempfile.mkdtemp(prefix="agent-context-")
+            path = os.path.join(self._spill_dir, f"{len(self._spilled)}-{os.getpid()}-{id(key)}.pkl")
+            try:
+                with open(path, "wb") as f:
+                    pickle.dump(self._values[key], f, protocol=pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError, OSError):
+                # Values that cannot be pickled stay in memory.
+                continue
+            self._spilled[key] = path
+            self.memory_bytes -= meta["bytes"]
+            del self._values[key]
+
+    def render(self) -> str:
+        """
+        Formats the results for a prompt: small values inline, large ones as a handle.
+
+        Returns:
+            str: e.g. "{'total': 1250000, 'rows': <$rows: str, 48211 chars, preview: '...'>}"
+        """
+        parts = []
+        for key in self:
+            meta = self._meta[key]
+            if meta["chars"] <= self.inline_chars:
+                parts.append(f"{key!r}: {self[key]!r}")
+            else:
+                parts.append(f"{key!r}: <${key}: {meta['type']}, {meta['chars']} chars, "
+                             f"preview: {meta['preview']!r}...>")
+        return "{" + ", ".join(parts) + "}"
+
+    def clear(self) -> None:
+        """Drops every result and deletes spilled files."""
+        with self._lock:
+            self._values.clear()
+            self._spilled.clear()
+            self._meta.clear()
+            self.memory_bytes = 0
+            if self._spill_dir is not None:
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+                self._spill_dir = None
+
+    def __del__(self):
+        if getattr(self, "_spill_dir", None) is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+    def __repr__(self):
+        return self.render()
@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import socket
+import socketserver
+import contextvars
+
+from agent_executor import AgentExecutor
+
+
+class _RequestStdout:
+    """
+    Routes print() output of a request to that request's client. The sink is a context
+    variable, so it follows the request into tool pool threads (which run tools in a copy
+    of the caller's context). Code outside a request (e.g. the server's own logging)
+    writes to the real stdout.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.sink = contextvars.ContextVar("daemon_stdout_sink", default=None)
+
+    def write(self, text):
+        sink = self.sink.get()
+        if sink is None:
+            return self.stream.write(text)
+        try:
+            sink(text)
+        except OSError:
+            # The client went away, e.g. while a timed-out tool kept running.
+            return self.stream.write(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one prompt: reads a JSON line, runs a fresh AgentExecutor on the warm
+    agent stack, streams the agent's log lines and finally the result as JSON lines.
+    """
+    def send(self, message: dict):
+        self.wfile.write((json.dumps(message, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # A connection closed without a request, e.g. another daemon checking the socket.
+            return
+        try:
+            request = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self.send({"type": "error", "message": f"Invalid request: {e}"})
+            return
+
+        agent, tool_manager, prompt_template = self.server.agent_stack
+        stdout = self.server.stdout
+        reset_token = stdout.sink.set(lambda text: self.send({"type": "log", "text": text}))
+        try:
+            # Executors are cheap and hold per-run state, so each request gets its own.
+            executor = AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,
+                                     max_iterations=request.get("iteration", 1),
+                                     dev_mode=request.get("dev_mode", False),
+                                     json_output=request.get("task", False))
+            final_output, response_obj = executor.run(request["prompt"])
+            self.send({"type": "result", "output": final_output,
+                       "duration": response_obj.get("duration") if isinstance(response_obj, dict) else None,
+                       "token_usage": response_obj.get("token_usage") if isinstance(response_obj, dict) else None})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            stdout.sink.set(None)
+            self.send({"type": "error", "message": f"Agent failed: {e}"})
+        finally:
+            stdout.sink.reset(reset_token)
+
+
+class AgentServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, agent_stack):
+        """
+        Args:
+            socket_path (str): Path of the unix socket to listen on.
+            agent_stack (tuple): (agent, tool_manager, prompt_template) shared by all requests.
+
+        Raises:
+            RuntimeError: If another daemon is already listening on socket_path.
+        """
+        if os.path.exists(socket_path):
+            # Only a socket left behind by a dead daemon may be replaced.
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(socket_path)
+                except ConnectionRefusedError:
+                    os.remove(socket_path)
+                else:
+                    raise RuntimeError(f"An agent daemon is already listening on {socket_path}.")
+        self.agent_stack = agent_stack
+        self.stdout = sys.stdout if isinstance(sys.stdout, _RequestStdout) else _RequestStdout(sys.stdout)
+        sys.stdout = self.stdout
+        super().__init__(socket_path, AgentRequestHandler)
+        os.chmod(socket_path, 0o600)
+
+
+def serve(socket_path: str, tool_k: int = None):
+    """
+    Builds the agent stack once and answers prompts sent to the unix socket until interrupted.
+
+    Args:
+        socket_path (str): Path of the unix socket to listen on.
+        tool_k (int, optional): Only describe the k most relevant tools to the agent.
+    """
+    from main import build_agent_stack
+
+    try:
+        server = AgentServer(socket_path, build_agent_stack(tool_k=tool_k))
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    print(f"Agent daemon listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down agent daemon.")
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def send_prompt(socket_path: str, prompt: str, iteration: int = 1, dev_mode: bool = False, task: bool = False, out=None):
+    """
+    Sends a prompt to a running daemon and prints its log and result as they arrive.
+
+    Args:
+        socket_path (str): Path of the daemon's unix socket.
+        prompt (str): The user prompt.
+        iteration (int): Maximum number of agent iterations.
+        dev_mode (bool): Enable verbose logging.
+        task (bool): Enable tool calling (JSON plan output).
+        out (file, optional): Where to print, defaults to stdout.
+
+    Returns:
+        dict: The final 'result' (or 'error') message from the daemon.
+    """
+    out = out or sys.stdout
+    request = {"prompt": prompt, "iteration": iteration, "dev_mode": dev_mode, "task": task}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        final = None
+        for line in sock.makefile("r", encoding="utf-8"):
+            message = json.loads(line)
+            if message["type"] == "log":
+                out.write(message["text"])
+                out.flush()
+            elif message["type"] == "result":
+                print("\n--- Task Complete ---", file=out)
+                print(f"Result: {message['output']}", file=out)
+                final = message
+            else:
+                print(f"Error: {message.get('message')}", file=out)
+                final = message
+    return final
@@ -0,0 +1,259 @@
+import re
+import ast
+import numpy as np
+
+# Longest expression accepted, in characters.
+MAX_EXPRESSION_CHARS = 2000
+
+_BINARY_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.mod,
+    ast.Pow: np.power,
+}
+_UNARY_OPS = {ast.UAdd: np.positive, ast.USub: np.negative}
+_CONSTANTS = {"pi": np.pi, "e": np.e}
+_NUMBER = re.compile(r"^[-+]?(\d[\d,]*\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+_LABELLED_LINE = re.compile(r"^(.*):\s*(\S+)$")
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression is not allowed or cannot be evaluated."""
+
+
+def _array(value):
+    return np.atleast_1d(np.asarray(value, dtype=float))
+
+
+def _pct_change(values):
+    values = _array(values)
+    return (values[1:] - values[:-1]) / values[:-1]
+
+
+def _round(value, digits=0):
+    return np.round(value, int(digits))
+
+
+def _reduce(func):
+    """A reduction over one array, or over all its arguments when given several."""
+    def reduced(*args):
+        if not args:
+            raise ExpressionError(f"{func.__name__}() needs at least one argument.")
+        return func(np.concatenate([_array(arg) for arg in args]))
+    return reduced
+
+
+FUNCTIONS = {
+    "sum": _reduce(np.sum),
+    "mean": _reduce(np.mean),
+    "avg": _reduce(np.mean),
+    "median": _reduce(np.median),
+    "min": _reduce(np.min),
+    "max": _reduce(np.max),
+    "std": _reduce(np.std),
+    "var": _reduce(np.var),
+    "count": lambda values: float(np.size(values)),
+    "len": lambda values: float(np.size(values)),
+    "abs": np.abs,
+    "round": _round,
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "exp": np.exp,
+    "cumsum": lambda values: np.cumsum(_array(values)),
+    "diff": lambda values: np.diff(_array(values)),
+    "pct_change": _pct_change,
+    "share": lambda values: _array(values) / np.sum(values),
+    "first": lambda values: _array(values)[0],
+    "last": lambda values: _array(values)[-1],
+}
+
+
+def _parse_number(text: str):
+    text = text.strip()
+    if text in ("None", "NaN", "nan", ""):
+        return np.nan
+    if not _NUMBER.match(text):
+        return None
+    return float(text.replace(",", ""))
+
+
+def _parse_table(lines):
+    """
+    Reads the columns of a DataFrame.to_string() table. Cells are right-aligned under
+    their header, so a column ends where its header ends, provided every row has a
+    space there (otherwise the header contains a space and continues).
+    """
+    header, rows = lines[0], lines[1:]
+    if header.startswith(" "):
+        # Blank out the index labels of the rows.
+        rows = [re.sub(r"^\S+", lambda m: " " * len(m.group()), row) for row in rows]
+    ends = [m.end() for m in re.finditer(r"\S+", header)]
+    ends = [end for end in ends[:-1] if all(len(row) <= end or row[end] == " " for row in rows)] + ends[-1:]
+    columns, start = {}, 0
+    for end in ends:
+        name = header[start:end].strip()
+        cells = [_parse_number(row[start:end]) for row in rows]
+        if cells and all(cell is not None for cell in cells):
+            columns[name] = np.array(cells, dtype=float)
+        start = end
+    return columns
+
+
+def to_value(value):
+    """
+    Converts a tool result to a number, an array of numbers, or a dict of columns.
+
+    Strings are read as a number, as 'label: value' lines (one value per line), or as a
+    text table, whose numeric columns are kept. A table with a single numeric column
+    becomes that column.
+    """
+    if isinstance(value, dict) and "error" in value:
+        raise ExpressionError(f"the value is an error result: {value.get('message', value['error'])}")
+    if isinstance(value, (bool, int, float, np.number)):
+        return float(value)
+    if isinstance(value, dict):
+        return {str(key): to_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        try:
+            return _array(value)
+        except (TypeError, ValueError):
+            raise ExpressionError("a list may only contain numbers.")
+    if isinstance(value, str):
+        number = _parse_number(value)
+        if number is not None:
+            return number
+        lines = [line.rstrip() for line in value.strip("\n").splitlines()
+                 if line.strip() and not line.lstrip().startswith("(")]
+        labelled = [_LABELLED_LINE.match(line.strip()) for line in lines]
+        if lines and all(labelled):
+            numbers = [_parse_number(match.group(2)) for match in labelled]
+            if all(number is not None for number in numbers):
+                return np.array(numbers, dtype=float)
+        columns = _parse_table(lines) if len(lines) > 1 else {}
+        if len(columns) == 1:
+            return next(iter(columns.values()))
+        if columns:
+            return columns
+        raise ExpressionError(f"no numbers found in {value[:60]!r}.")
+    raise ExpressionError(f"unsupported value of type {type(value).__name__}.")
+
+
+class _Evaluator:
+    def __init__(self, variables: dict):
+        self.variables = variables
+
+    def visit(self, node):
+        if isinstance(node, ast.Expression):
+            return self.visit(node.body)
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                if isinstance(node.value, str):
+                    return node.value
+                raise ExpressionError(f"unsupported constant {node.value!r}.")
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            if node.id in self.variables:
+                return self.variables[node.id]
+            if node.id in _CONSTANTS:
+                return _CONSTANTS[node.id]
+            raise ExpressionError(f"unknown name '{node.id}'; pass it in variables, e.g. {{\"{node.id}\": \"$id\"}}.")
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            return _BINARY_OPS[type(node.op)](self.number(node.left), self.number(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            return _UNARY_OPS[type(node.op)](self.number(node.operand))
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return np.concatenate([_array(self.number(element)) for element in node.elts]) if node.elts else np.array([])
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                name = getattr(node.func, "id", ast.unparse(node.func))
+                raise ExpressionError(f"unknown function '{name}'. Available: {', '.join(FUNCTIONS)}.")
+            if node.keywords:
+                raise ExpressionError("functions take positional arguments only.")
+            arguments = [self.number(arg) for arg in node.args]
+            try:
+                return FUNCTIONS[node.func.id](*arguments)
+            except (TypeError, ValueError, IndexError, OverflowError) as e:
+                # e.g. first([]), max([]) or round(2.5, 1e300).
+                raise ExpressionError(f"{node.func.id}(): {e}")
+        if isinstance(node, ast.Subscript):
+            return self.subscript(node)
+        raise ExpressionError(f"'{ast.unparse(node)}' is not allowed.")
+
+    def number(self, node):
+        """Evaluates a node that must be a number or an array."""
+        value = self.visit(node)
+        if isinstance(value, dict):
+            raise ExpressionError(f"'{ast.unparse(node)}' has several columns ({', '.join(value)}); "
+                                  f"pick one, e.g. {ast.unparse(node)}[\"{next(iter(value))}\"].")
+        if isinstance(value, str):
+            raise ExpressionError(f"'{ast.unparse(node)}' is not a number.")
+        return value
+
+    def subscript(self, node):
+        value = self.visit(node.value)
+        if isinstance(node.slice, ast.Slice):
+            bounds = [None if part is None else int(self.number(part))
+                      for part in (node.slice.lower, node.slice.upper, node.slice.step)]
+            return _array(self.number(node.value))[slice(*bounds)]
+        key = self.visit(node.slice)
+        if isinstance(value, dict):
+            if key not in value:
+                raise ExpressionError(f"no column {key!r}; columns: {', '.join(value)}.")
+            return value[key]
+        if isinstance(key, str):
+            raise ExpressionError(f"'{ast.unparse(node.value)}' has no columns.")
+        values = _array(value)
+        try:
+            return values[int(key)]
+        except IndexError:
+            raise ExpressionError(f"index {int(key)} is out of range for {len(values)} values.")
+
+
+def _to_python(value):
+    """Numbers come back as int when whole, arrays as lists."""
+    if isinstance(value, np.ndarray) and value.ndim > 0:
+        return [_to_python(item) for item in value]
+    value = float(value)
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+
+def evaluate(expression: str, variables: dict = None):
+    """
+    Safely evaluates an arithmetic expression over numbers, lists and table columns.
+
+    Only numbers, + - * / // % **, parentheses, lists, indexing and the FUNCTIONS are
+    allowed; anything else (attributes, other calls, comprehensions...) is refused.
+    Operators work element-wise on arrays, so "a / b * 100" also compares two columns.
+
+    Args:
+        expression (str): The expression. `$name` may be used instead of `name`.
+        variables (dict, optional): Values of the names used in the expression,
+                                    converted with to_value().
+
+    Returns:
+        int, float or list: The result.
+
+    Raises:
+        ExpressionError: If the expression is not allowed or its result is not finite.
+    """
+    if not isinstance(expression, str) or not expression.strip():
+        raise ExpressionError("the expression is empty.")
+    if len(expression) > MAX_EXPRESSION_CHARS:
+        raise ExpressionError(f"the expression is longer than {MAX_EXPRESSION_CHARS} characters.")
+    expression = re.sub(r"\$(\w+)", r"\1", expression)
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"invalid syntax: {e.msg}.")
+    values = {str(name): to_value(value) for name, value in (variables or {}).items()}
+    try:
+        with np.errstate(all="ignore"):
+            result = _Evaluator(values).number(tree)
+    except RecursionError:
+        raise ExpressionError("the expression is too deeply nested.")
+    if not np.all(np.isfinite(result)):
+        raise ExpressionError("the result is not finite (division by zero or an invalid operation).")
+    return _to_python(result)
@@ -0,0 +1,285 @@
+import re
+import csv
+import sys
+import time
+import sqlite3
+import argparse
+import datetime
+from functools import lru_cache
+from itertools import islice
+
+TABLE_NAME = "unified_sales_data"
+DATE_COLUMN = "Ngày_CT_Issue_date"
+DOC_COLUMN = "Số_CT_Doc_Nbr"
+NET_COLUMN = "Thành_tiền_Total_Net"
+BALANCE_COLUMN = "Tiền_nợ"
+DEDUP_INDEX = "ux_unified_sales_doc_date"
+
+# Same layout as the table originally built from the CSV exports.
+COLUMNS = [
+    ("STT_Order", "INTEGER"),
+    ("Ngày_CT_Issue_date", "TEXT"),
+    ("Số_CT_Doc_Nbr", "TEXT"),
+    ("Hành_trình_Route", "TEXT"),
+    ("Nội_dung_Description", "TEXT"),
+    ("Thông_tin_khác_Extra_Info", "TEXT"),
+    ("T", "TEXT"),
+    ("Curr", "TEXT"),
+    ("Tỷ_giá_ROE", "INTEGER"),
+    ("Giá_vé_Ticket_Price", "INTEGER"),
+    ("Thành_tiền_Total_Net", "INTEGER"),
+    ("Tiền_nợ", "INTEGER"),
+    ("Rmks", "TEXT"),
+]
+DATE_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y", "%d/%m/%Y %H:%M:%S", "%d-%m-%Y", "%m/%d/%Y"]
+
+
+def _normalize_header(name: str) -> str:
+    """'Ngày CT / Issue date' and 'Ngày_CT_Issue_date' both become 'ngàyctissuedate'."""
+    return re.sub(r"[\W_]+", "", name.strip().lower())
+
+
+def _parse_int(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    value = value.strip().replace(",", "").replace(" ", "")
+    if value == "":
+        return None
+    return int(float(value))
+
+
+# Exports have few distinct dates, so parsed values are cached.
+@lru_cache(maxsize=4096)
+def _parse_date(value: str):
+    value = value.strip()
+    if value == "":
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date '{value}'")
+
+
+def _parse_text(value: str):
+    return value if value != "" else None
+
+
+def _row_converter(header):
+    """
+    Builds a function turning a raw CSV row into a tuple in COLUMNS order.
+    Columns missing from the CSV are filled with NULL.
+    """
+    positions = {_normalize_header(name): i for i, name in enumerate(header)}
+    converters = []
+    for name, sql_type in COLUMNS:
+        position = positions.get(_normalize_header(name))
+        if name == DATE_COLUMN:
+            parse = _parse_date
+        elif sql_type == "INTEGER":
+            parse = _parse_int
+        else:
+            parse = _parse_text
+        converters.append((position, parse))
+
+    missing = [name for (name, _), (position, _) in zip(COLUMNS, converters) if position is None]
+    if DATE_COLUMN in missing or DOC_COLUMN in missing or NET_COLUMN in missing:
+        raise ValueError(f"CSV is missing required columns: {missing}")
+
+    def convert(row):
+        return tuple(parse(row[position]) if position is not None and position < len(row) else None
+                     for position, parse in converters)
+    return convert
+
+
+def read_chunks(csv_path: str, chunk_size: int):
+    """
+    Streams a CSV file as lists of converted rows, never holding more than one chunk.
+
+    Yields:
+        list[tuple]: Up to chunk_size rows in COLUMNS order.
+    """
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        convert = _row_converter(next(reader))
+        while True:
+            chunk = [convert(row) for row in islice(reader, chunk_size) if any(cell.strip() for cell in row)]
+            if not chunk:
+                break
+            yield chunk
+
+
+def prepare_database(conn: sqlite3.Connection) -> list:
+    """
+    Configures the connection for bulk loading, creates the table and the dedup index if
+    needed, and drops the other indexes so they are rebuilt once after the load.
+
+    Returns:
+        list[str]: CREATE INDEX statements to run after loading.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    columns = ",\n".join(f'"{name}" {sql_type}' for name, sql_type in COLUMNS)
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{TABLE_NAME}" (\n{columns}\n)')
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {DEDUP_INDEX} ON "{TABLE_NAME}" ("{DOC_COLUMN}", "{DATE_COLUMN}")')
+
+    deferred = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL AND name != ?",
+        (TABLE_NAME, DEDUP_INDEX)).fetchall()
+    for name, _ in deferred:
+        conn.execute(f'DROP INDEX "{name}"')
+    conn.commit()
+    return [sql for _, sql in deferred]
+
+
+def recompute_balances(conn: sqlite3.Connection, first_new_rowid: int) -> int:
+    """
+    Recomputes the running `Tiền_nợ` balance from the first inserted row onward.
+
+    Rows are ordered by (issue date, rowid). The balance is carried from the row just
+    before the first inserted one; when there is none, the opening balance of the first
+    row is taken from the CSV (its balance minus its net amount).
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+        first_new_rowid (int): Every row with a rowid >= this one was inserted by this load.
+
+    Returns:
+        int: Number of rows whose balance changed.
+    """
+    start = conn.execute(
+        f'SELECT "{DATE_COLUMN}", MIN(rowid) FROM "{TABLE_NAME}" WHERE rowid >= ? '
+        f'AND "{DATE_COLUMN}" = (SELECT MIN("{DATE_COLUMN}") FROM "{TABLE_NAME}" WHERE rowid >= ?)',
+        (first_new_rowid, first_new_rowid)).fetchone()
+    if start is None or start[1] is None:
+        return 0
+    start_date, start_rowid = start
+
+    anchor = conn.execute(
+        f'SELECT "{BALANCE_COLUMN}" FROM "{TABLE_NAME}" '
+        f'WHERE "{DATE_COLUMN}" < ? OR ("{DATE_COLUMN}" = ? AND rowid < ?) '
+        f'ORDER BY "{DATE_COLUMN}" DESC, rowid DESC LIMIT 1',
+        (start_date, start_date, start_rowid)).fetchone()
+
+    rows = conn.execute(
+        f'SELECT rowid, "{NET_COLUMN}", "{BALANCE_COLUMN}" FROM "{TABLE_NAME}" '
+        f'WHERE "{DATE_COLUMN}" > ? OR ("{DATE_COLUMN}" = ? AND rowid >= ?) '
+        f'ORDER BY "{DATE_COLUMN}", rowid',
+        (start_date, start_date, start_rowid))
+
+    balance = None
+    if anchor is not None and anchor[0] is not None:
+        balance = anchor[0]
+    updates = []
+    for rowid, net, current in rows:
+        net = net or 0
+        if balance is None:
+            balance = (current or 0) - net
+        balance += net
+        if balance != current:
+            updates.append((balance, rowid))
+    conn.executemany(f'UPDATE "{TABLE_NAME}" SET "{BALANCE_COLUMN}" = ? WHERE rowid = ?', updates)
+    return len(updates)
+
+
+def ingest(csv_paths, db_file: str = "sales_data.db", chunk_size: int = 5000,
+           commit_every: int = 100_000, rebalance: bool = True, verbose: bool = True) -> dict:
+    """
+    Loads CSV exports into `unified_sales_data`.
+
+    Rows are streamed in chunks and inserted with executemany inside large transactions.
+    Rows whose (Số_CT_Doc_Nbr, date) already exist are skipped, so a file can be loaded
+    again safely. Secondary indexes are rebuilt once at the end.
+
+    Args:
+        csv_paths (list[str]): CSV files to load, in order.
+        db_file (str): The SQLite database file.
+        chunk_size (int): Rows per executemany batch.
+        commit_every (int): Rows per transaction.
+        rebalance (bool): Recompute `Tiền_nợ` from the first inserted row onward.
+        verbose (bool): Print progress and rows-per-second.
+
+    Returns:
+        dict: Rows read, inserted, skipped as duplicates, rebalanced, and elapsed seconds.
+    """
+    start_time = time.time()
+    conn = sqlite3.connect(db_file)
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "rebalanced": 0, "seconds": 0.0}
+    deferred_indexes, first_new_rowid = [], None
+    try:
+        deferred_indexes = prepare_database(conn)
+        first_new_rowid = (conn.execute(f'SELECT MAX(rowid) FROM "{TABLE_NAME}"').fetchone()[0] or 0) + 1
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        insert_sql = f'INSERT OR IGNORE INTO "{TABLE_NAME}" VALUES ({placeholders})'
+
+        pending = 0
+        conn.execute("BEGIN")
+        for csv_path in csv_paths:
+            for chunk in read_chunks(csv_path, chunk_size):
+                before = conn.total_changes
+                conn.executemany(insert_sql, chunk)
+                inserted = conn.total_changes - before
+                stats["read"] += len(chunk)
+                stats["inserted"] += inserted
+                stats["duplicates"] += len(chunk) - inserted
+                pending += len(chunk)
+                if pending >= commit_every:
+                    conn.commit()
+                    conn.execute("BEGIN")
+                    pending = 0
+                if verbose:
+                    elapsed = time.time() - start_time
+                    print(f"[ingest] {csv_path}: {stats['read']} rows read, {stats['inserted']} inserted, "
+                          f"{stats['duplicates']} duplicates ({stats['read'] / max(elapsed, 1e-9):,.0f} rows/s)")
+
+        if rebalance and stats["inserted"]:
+            stats["rebalanced"] = recompute_balances(conn, first_new_rowid)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # Chunks committed before the failure stay, and a re-run skips them as duplicates,
+        # so their balances are fixed now rather than never.
+        if rebalance and first_new_rowid is not None:
+            try:
+                stats["rebalanced"] = recompute_balances(conn, first_new_rowid)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"[ingest] Could not rebalance the rows loaded before the failure: {e}")
+        raise
+    finally:
+        # The secondary indexes were dropped for the load; they come back whatever happened.
+        try:
+            for sql in deferred_indexes:
+                conn.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+
+    stats["seconds"] = time.time() - start_time
+    if verbose:
+        print(f"[ingest] Done: {stats['inserted']} rows inserted, {stats['duplicates']} duplicates skipped, "
+              f"{stats['rebalanced']} balances updated in {stats['seconds']:.2f}s "
+              f"({stats['read'] / max(stats['seconds'], 1e-9):,.0f} rows/s)")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load CSV exports into the unified_sales_data table")
+    parser.add_argument("csv_files", nargs="+", help="CSV files to load, in order")
+    parser.add_argument("--db", default="sales_data.db", help="SQLite database file")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per executemany batch")
+    parser.add_argument("--commit-every", type=int, default=100_000, help="rows per transaction")
+    parser.add_argument("--no-rebalance", action="store_true", help="keep the Tiền_nợ values from the CSV")
+    args = parser.parse_args()
+    try:
+        ingest(args.csv_files, db_file=args.db, chunk_size=args.chunk_size,
+               commit_every=args.commit_every, rebalance=not args.no_rebalance)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Ingestion failed: {e}")
+        sys.exit(1)
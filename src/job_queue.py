@@ -0,0 +1,204 @@
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import closing
+
+from tools import CancelToken
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+# Seconds between two clean-ups of old finished jobs.
+CLEANUP_INTERVAL = 3600
+
+
+class QueueFull(Exception):
+    """Raised when a client already has as many queued jobs as it may."""
+
+
+class JobQueue:
+    """
+    A persistent job queue in a local SQLite file, served by a pool of worker threads.
+
+    Workers take the queued job with the highest priority (oldest first among equals),
+    skipping clients that already have `max_running_per_client` jobs running, so one
+    client cannot occupy every worker. Jobs that were running when the process stopped
+    are queued again on start. Finished jobs are deleted after `ttl` seconds.
+    """
+    def __init__(self, handler, path: str = "agent_jobs.db", workers: int = 2, max_running_per_client: int = 1,
+                 max_queued_per_client: int = 20, ttl: float = 86400, poll_interval: float = 1.0):
+        """
+        Args:
+            handler (callable): handler(job_id, payload, cancel_token) -> result; runs one job.
+                                The result must be JSON-serializable.
+            path (str): The SQLite file holding the queue.
+            workers (int): Number of worker threads.
+            max_running_per_client (int): Jobs of one client that may run at the same time.
+            max_queued_per_client (int): Unfinished jobs one client may have; more are refused.
+            ttl (float): Seconds a finished job is kept for GET requests.
+            poll_interval (float): Seconds an idle worker waits before checking the queue again.
+        """
+        self.handler = handler
+        self.path = path
+        self.workers = workers
+        self.max_running_per_client = max_running_per_client
+        self.max_queued_per_client = max_queued_per_client
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._tokens = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._last_cleanup = 0.0
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                         "id TEXT PRIMARY KEY, client_id TEXT, priority INTEGER, status TEXT, payload TEXT, "
+                         "result TEXT, error TEXT, cancel_requested INTEGER DEFAULT 0, "
+                         "created_at REAL, started_at REAL, finished_at REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, priority, created_at)")
+            conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, payload: dict, client_id: str = "anonymous", priority: int = 0) -> str:
+        """
+        Enqueues a job.
+
+        Returns:
+            str: The job id.
+
+        Raises:
+            QueueFull: If the client already has max_queued_per_client unfinished jobs.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock, closing(self._connect()) as conn:
+            unfinished = conn.execute("SELECT COUNT(*) FROM jobs WHERE client_id = ? AND status IN (?, ?)",
+                                      (client_id, QUEUED, RUNNING)).fetchone()[0]
+            if unfinished >= self.max_queued_per_client:
+                raise QueueFull(f"Client '{client_id}' already has {unfinished} unfinished jobs "
+                                f"(limit {self.max_queued_per_client}).")
+            conn.execute("INSERT INTO jobs (id, client_id, priority, status, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                         (job_id, client_id, priority, QUEUED, json.dumps(payload, ensure_ascii=False), time.time()))
+            conn.commit()
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str):
+        """Returns a job as a dict (payload and result decoded), or None if unknown."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        if job["status"] == QUEUED:
+            with closing(self._connect()) as conn:
+                job["position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND (priority > ? OR (priority = ? AND created_at < ?))",
+                    (QUEUED, job["priority"], job["priority"], job["created_at"])).fetchone()[0]
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a job: a queued job never starts, a running one is asked to stop.
+
+        Returns:
+            bool: False if the job is unknown or already finished.
+        """
+        with self._lock, closing(self._connect()) as conn:
+            now = time.time()
+            updated = conn.execute("UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ? "
+                                   "WHERE id = ? AND status = ?", (CANCELLED, now, job_id, QUEUED)).rowcount
+            if not updated:
+                updated = conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                                       (job_id, RUNNING)).rowcount
+            conn.commit()
+            token = self._tokens.get(job_id)
+        if token is not None:
+            token.cancel()
+        return bool(updated)
+
+    def _claim(self):
+        """Marks the next runnable job as running and returns (id, payload), or None."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, payload FROM jobs j WHERE status = ? AND "
+                "(SELECT COUNT(*) FROM jobs r WHERE r.client_id = j.client_id AND r.status = ?) < ? "
+                "ORDER BY priority DESC, created_at LIMIT 1",
+                (QUEUED, RUNNING, self.max_running_per_client)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (RUNNING, time.time(), row["id"]))
+            conn.commit()
+        return row["id"], json.loads(row["payload"])
+
+    def _finish(self, job_id: str, status: str, result=None, error: str = None) -> None:
+        with self._lock, closing(self._connect()) as conn:
+            self._tokens.pop(job_id, None)
+            conn.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                         (status, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                          error, time.time(), job_id))
+            conn.commit()
+            # A finished job may unblock another job of the same client.
+            self._wakeup.notify_all()
+
+    def _work(self):
+        while not self._stop.is_set():
+            with self._lock:
+                claimed = self._claim()
+                if claimed is None:
+                    self._wakeup.wait(self.poll_interval)
+                    if time.time() - self._last_cleanup > CLEANUP_INTERVAL:
+                        self.cleanup()
+                    continue
+                job_id, payload = claimed
+                token = self._tokens[job_id] = CancelToken()
+            try:
+                result = self.handler(job_id, payload, token)
+            except Exception as e:
+                self._finish(job_id, FAILED, error=str(e))
+                continue
+            self._finish(job_id, CANCELLED if token.cancelled else DONE, result=result)
+
+    def cleanup(self) -> int:
+        """Deletes finished jobs older than ttl. Returns the number deleted."""
+        self._last_cleanup = time.time()
+        with closing(self._connect()) as conn:
+            deleted = conn.execute(f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) "
+                                   f"AND finished_at < ?", (*FINISHED, time.time() - self.ttl)).rowcount
+            conn.commit()
+        return deleted
+
+    def start(self) -> "JobQueue":
+        """Re-queues jobs interrupted by a restart, cleans up old ones and starts the workers."""
+        if self._threads:
+            return self
+        self._stop.clear()
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING))
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE status = ? AND cancel_requested = 1",
+                         (CANCELLED, time.time(), QUEUED))
+            conn.commit()
+        self.cleanup()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        """Stops the workers after their current job."""
+        self._stop.set()
+        with self._lock:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
@@ -1,5 +1,228 @@
-from google import genai
 import time
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class LLMScheduler:
+    """
+    Shares LLM capacity between concurrent agent runs.
+
+    Caps the number of calls in flight and, optionally, spaces call starts so that the
+    request rate stays under the API quota. One scheduler is shared by every LLM
+    instance that should draw from the same quota.
+    """
+    def __init__(self, max_concurrent: int = 4, requests_per_minute: float = None):
+        """
+        Args:
+            max_concurrent (int): Maximum number of LLM calls running at once.
+            requests_per_minute (float, optional): Maximum rate of call starts.
+        """
+        self.max_concurrent = max_concurrent
+        self.min_interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    @contextmanager
+    def slot(self, timeout: float = None):
+        """
+        Blocks until a call may start, and holds the slot for the duration of the call.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a free slot.
+
+        Raises:
+            TimeoutError: If no slot became free within timeout.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No LLM slot became free within {timeout:.1f} seconds.")
+        try:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + self.min_interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+        finally:
+            self._slots.release()
+
+# Cheapest/fastest first.
+DEFAULT_ROUTER_MODELS = ["gemini-2.0-flash-lite", "gemini-2.0-flash", "gemini-2.5-flash"]
+
+
+class _RollingStats:
+    """Success rate and latency over the last `window` outcomes."""
+    def __init__(self, window: int):
+        self.outcomes = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+
+    def add(self, success: bool, latency: float = None) -> None:
+        self.outcomes.append(1 if success else 0)
+        if latency is not None:
+            self.latencies.append(latency)
+
+    @property
+    def samples(self) -> int:
+        return len(self.outcomes)
+
+    @property
+    def success_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 1.0
+
+    @property
+    def latency(self) -> float:
+        """Median latency in seconds, or None before the first call."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 2]
+
+
+class ModelRouter:
+    """
+    Picks a model per LLM call, cheapest first.
+
+    Each call is mapped to a route from local features: prompt size, whether the
+    likely tools are heavy (SQL/aggregation), and whether it is a follow-up iteration.
+    The route sets the cheapest model tier that may serve it. Within the allowed tiers
+    the cheapest model is used unless its recent success rate on that route, or its
+    overall success rate or latency, is below target; then the next tier is tried.
+    A small share of calls explores one tier cheaper, so routes move back down once a
+    cheaper model proves itself.
+    """
+    def __init__(self, models: list, long_prompt_tokens: int = 6000, heavy_tools=("run_sql_query", "aggregate_sales"),
+                 min_success: float = 0.85, max_latency: float = None, min_samples: int = 5,
+                 window: int = 50, explore_rate: float = 0.05, seed: int = None):
+        """
+        Args:
+            models (list[str]): Model names ordered from cheapest/fastest to strongest.
+            long_prompt_tokens (int): Estimated prompt tokens above which a prompt is 'long'.
+            heavy_tools (Iterable[str]): Tools whose use needs a stronger model.
+            min_success (float): Success rate below which a model is skipped for a route.
+            max_latency (float, optional): Median latency in seconds above which a model is skipped.
+            min_samples (int): Outcomes needed before a model's statistics are trusted.
+            window (int): Number of recent outcomes kept per model and per route.
+            explore_rate (float): Share of calls that try one tier cheaper than chosen.
+            seed (int, optional): Seed for the exploration draws.
+        """
+        if not models:
+            raise ValueError("ModelRouter needs at least one model.")
+        self.models = list(models)
+        self.long_prompt_tokens = long_prompt_tokens
+        self.heavy_tools = set(heavy_tools)
+        self.min_success = min_success
+        self.max_latency = max_latency
+        self.min_samples = min_samples
+        self.window = window
+        self.explore_rate = explore_rate
+        self.model_stats = {model: _RollingStats(window) for model in self.models}
+        self.route_stats = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def route_for(self, prompt: str, hints: dict = None):
+        """
+        Describes a call by its local features.
+
+        Args:
+            prompt (str): The prompt to send.
+            hints (dict, optional): 'tools' (names of the tools likely needed) and
+                                    'iteration' (0 for the first call of a run).
+
+        Returns:
+            tuple: (route name, cheapest tier index allowed for it)
+        """
+        from prompt_template import estimate_tokens
+        hints = hints or {}
+        long_prompt = estimate_tokens(prompt) > self.long_prompt_tokens
+        heavy = bool(self.heavy_tools.intersection(hints.get("tools") or ()))
+        follow_up = (hints.get("iteration") or 0) > 0
+        route = "/".join(["long" if long_prompt else "short",
+                          "data" if heavy else "light",
+                          "followup" if follow_up else "first"])
+        tier = int(long_prompt) + int(heavy) + int(follow_up and heavy)
+        return route, min(tier, len(self.models) - 1)
+
+    def _usable(self, route: str, model: str) -> bool:
+        stats = self.model_stats[model]
+        if stats.samples >= self.min_samples:
+            if stats.success_rate < self.min_success:
+                return False
+            if self.max_latency is not None and stats.latency is not None and stats.latency > self.max_latency:
+                return False
+        stats = self.route_stats.get((route, model))
+        return stats is None or stats.samples < self.min_samples or stats.success_rate >= self.min_success
+
+    def choose(self, prompt: str, hints: dict = None):
+        """
+        Picks the model for a call.
+
+        Returns:
+            tuple: (route name, model name)
+        """
+        route, tier = self.route_for(prompt, hints)
+        with self._lock:
+            chosen = len(self.models) - 1
+            for index in range(tier, len(self.models)):
+                if self._usable(route, self.models[index]):
+                    chosen = index
+                    break
+            if chosen > 0 and self._random.random() < self.explore_rate:
+                chosen -= 1
+        return route, self.models[chosen]
+
+    def fallback_for(self, model: str):
+        """
+        The next stronger model. The strongest model falls back to the next weaker one, since
+        retrying the model that just failed rarely helps; None when there is only one model.
+        """
+        index = self.models.index(model) if model in self.models else len(self.models) - 1
+        if index + 1 < len(self.models):
+            return self.models[index + 1]
+        return self.models[index - 1] if index > 0 else None
+
+    def record_call(self, model: str, success: bool, latency: float = None) -> None:
+        """Records whether an API call succeeded and how long it took."""
+        with self._lock:
+            if model in self.model_stats:
+                self.model_stats[model].add(success, latency)
+
+    def record_outcome(self, route: str, model: str, success: bool) -> None:
+        """Records whether a model's answer was usable (e.g. a valid plan) for a route."""
+        if route is None:
+            return
+        with self._lock:
+            self.route_stats.setdefault((route, model), _RollingStats(self.window)).add(success)
+
+    def summary(self) -> dict:
+        """Rolling statistics per model and per route, e.g. for dev mode or monitoring."""
+        with self._lock:
+            return {
+                "models": {model: {"calls": stats.samples, "success_rate": round(stats.success_rate, 3),
+                                   "median_latency": stats.latency}
+                           for model, stats in self.model_stats.items()},
+                "routes": {f"{route} -> {model}": {"calls": stats.samples, "success_rate": round(stats.success_rate, 3)}
+                           for (route, model), stats in self.route_stats.items()},
+            }
+
+
+def router_from_env():
+    """
+    Builds the ModelRouter configured by AGENT_ROUTER_MODELS (comma-separated, cheapest
+    first) when AGENT_MODEL_ROUTING=1. Routing is opt-in: otherwise None is returned and
+    the configured model_name is always used.
+    """
+    import os
+    if os.getenv("AGENT_MODEL_ROUTING", "0").lower() not in ("1", "true", "yes"):
+        return None
+    models = [m.strip() for m in os.getenv("AGENT_ROUTER_MODELS", ",".join(DEFAULT_ROUTER_MODELS)).split(",") if m.strip()]
+    max_latency = os.getenv("AGENT_ROUTER_MAX_LATENCY")
+    return ModelRouter(models, min_success=float(os.getenv("AGENT_ROUTER_MIN_SUCCESS", "0.85")),
+                       max_latency=float(max_latency) if max_latency else None)
+
 
 class LLM:
     """
@@ -8,41 +231,103 @@ class LLM:
     This class encapsulates the specific API calls, making it easy to
     switch between different models or providers in the future.
     """
-    def __init__(self, model_name: str,client: genai.Client, fallback_model_name: str = "gemini-2.5-flash" ):
+    def __init__(self, model_name: str, client: "genai.Client" = None, fallback_model_name: str = "gemini-2.5-flash", scheduler: LLMScheduler = None, router: ModelRouter = None):
         """
         Initializes the LLM.
 
         Args:
             model_name (str): The name of the model to use (e.g., "gemini-2.0-flash-lite").
-            client (genai.Client): The Gemini API client instance.
+            client (genai.Client, optional): The Gemini API client instance. When omitted, a
+                                             client is created on the first call, so that
+                                             importing google.genai is only paid when needed.
+            fallback_model_name (str): The model to retry with when the primary model fails.
+            scheduler (LLMScheduler, optional): Limits concurrency and rate of calls.
+            router (ModelRouter, optional): Picks the model per call. model_name and
+                                            fallback_model_name are then unused.
         """
         self.model_name = model_name
-        self.fallback_model_name = model_name
-        self.client = client
+        self.fallback_model_name = fallback_model_name
+        self._client = client
+        self.scheduler = scheduler
+        self.router = router
+        self._local = threading.local()
+
+    @property
+    def client(self):
+        """The Gemini API client, created on first use."""
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client()
+        return self._client
+
+    @property
+    def last_call(self):
+        """(route, model) of the latest call made by the current thread."""
+        return getattr(self._local, "last_call", (None, self.model_name))
 
-    def generate_content(self, contents: str):
+    def generate_content(self, contents: str, hints: dict = None, timeout: float = None):
         """
         Generates content from the LLM.
 
         Args:
             contents (str): The text prompt to send to the model.
+            hints (dict, optional): Features used by the router: 'tools' likely needed and 'iteration'.
+            timeout (float, optional): Seconds the whole call (waiting for a slot, the request
+                                       and a fallback) may take; the request is aborted after it.
 
         Returns:
             The raw response object from the API.
         """
-        print(f"Calling LLM: {self.model_name}")
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        if self.scheduler is None:
+            return self._generate_content(contents, hints, deadline)
+        with self.scheduler.slot(timeout):
+            return self._generate_content(contents, hints, deadline)
+
+    def _call_model(self, model: str, contents: str, deadline: float = None):
+        options = {}
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No time left to call {model}.")
+            # The HTTP request is aborted when the caller's time runs out.
+            options["config"] = {"http_options": {"timeout": max(1, int(remaining * 1000))}}
         start_time = time.time()
         try:
             response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=contents
+                model=model,
+                contents=contents,
+                **options
             )
+        except Exception:
+            if self.router is not None:
+                self.router.record_call(model, False, time.time() - start_time)
+            raise
+        if self.router is not None:
+            self.router.record_call(model, True, time.time() - start_time)
+        return response
+
+    def _generate_content(self, contents: str, hints: dict = None, deadline: float = None):
+        from google.genai.errors import APIError
+
+        route, model = None, self.model_name
+        fallback = self.fallback_model_name
+        if self.router is not None:
+            route, model = self.router.choose(contents, hints)
+            fallback = self.router.fallback_for(model)
+
+        print(f"Calling LLM: {model}" + (f" (route {route})" if route else ""))
+        start_time = time.time()
+        try:
+            response = self._call_model(model, contents, deadline)
         except APIError:
-            print(f"Primary model {self.model_name} failed, attempt to call fallback model {self.fallback_model_name}")
-            response = self.client.models.generate_content(
-                model=self.fallback_model_name,
-                contents=contents
-            )
+            if fallback is None or fallback == model:
+                # Retrying the same model would only repeat the failure.
+                raise
+            print(f"Primary model {model} failed, attempt to call fallback model {fallback}")
+            model = fallback
+            response = self._call_model(model, contents, deadline)
+        self._local.last_call = (route, model)
         end_time = time.time()
         responding_time = end_time-start_time
         print(f"LLM finished responding in {end_time-start_time:.2f} seconds.")
@@ -1,71 +1,129 @@
 import os
-from dotenv import load_dotenv
 import argparse
-from google import genai
 
-from llm_abstraction import LLM
-from base_agent import BaseAgent, JsonOutputParser
-from tools import ToolManager, BaseTool, get_current_time, calculator, Final_Answer
+# Only light modules are imported at startup. google.genai is imported by the LLM on its
+# first call and pandas/sqlite only when a SQL tool actually runs.
+from llm_abstraction import LLM, router_from_env
+from base_agent import BaseAgent
+from tools import ToolManager, BaseTool, get_current_time, calculator, evaluate_expression, Final_Answer
 from agent_executor import AgentExecutor
 from prompt_template import PromptTemplate
 
-parser = argparse.ArgumentParser(description="Program that process command-line arguments")
-parser.add_argument("-p", "--prompt", type=str, help="prompt for agent")
-parser.add_argument("-i", "--iteration", type=int, default=1 , help="number of call to AI agent")
-parser.add_argument("-d", "--dev_mode", action="store_true", help="enable dev mode")
-parser.add_argument("-t", "--task", action="store_true", help="enable tool calling for agent (output as json)")
+DEFAULT_SOCKET = os.getenv("AGENT_SOCKET", f"/tmp/ai-agent-{os.getuid()}.sock")
 
-args = parser.parse_args()
 
-if args.dev_mode:
-    print("Running in dev mode~")
-if args.task:
-    print("Agent planing for task~")
-if args.prompt:
-    print("Prompt is processing by agent")
-else:
-    assert False, "You need to write some prompt in" 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Program that process command-line arguments")
+    parser.add_argument("-p", "--prompt", type=str, help="prompt for agent")
+    parser.add_argument("-i", "--iteration", type=int, default=1 , help="number of call to AI agent")
+    parser.add_argument("-d", "--dev_mode", action="store_true", help="enable dev mode")
+    parser.add_argument("-t", "--task", action="store_true", help="enable tool calling for agent (output as json)")
+    parser.add_argument("-k", "--tool_k", type=int, default=None, help="only describe the k most relevant tools to the agent (default: all)")
+    parser.add_argument("--serve", action="store_true", help="keep a warm agent running and answer prompts sent over --socket")
+    parser.add_argument("-b", "--batch", type=str, default=None, help="JSONL file of prompts to run ('-' for stdin)")
+    parser.add_argument("-o", "--out", type=str, default="batch_results.jsonl", help="JSONL file for batch results (appended, used to resume)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="number of batch prompts run at once")
+    parser.add_argument("--rpm", type=float, default=None, help="maximum LLM requests per minute in batch mode")
+    parser.add_argument("--timeout_ms", type=int, default=None, help="time budget of the run; the best partial answer is returned when it runs out")
+    parser.add_argument("--profile", action="store_true", help="print per-tool timings and the slowest SQL statements after the run")
+    parser.add_argument("-s", "--socket", type=str, nargs="?", const=DEFAULT_SOCKET, default=None, help="unix socket of the agent daemon (client mode unless --serve)")
 
+    args = parser.parse_args(argv)
+    if args.serve and not args.socket:
+        args.socket = DEFAULT_SOCKET
+    if not args.prompt and not args.serve and not args.batch:
+        parser.error("You need to write some prompt in")
+    return args
 
-load_dotenv()
 
-try:
-    client = genai.Client()
-except Exception as e:
-    print(f"Error initializing Gemini client: {e}")
-    print("Please make sure you have the GEMINI_API_KEY environment variable set.")
-    exit()
+def build_agent_stack(tool_k: int = None, scheduler=None):
+    """
+    Builds the long-lived parts of the agent: LLM, tools, prompt template and agent.
+
+    Args:
+        tool_k (int, optional): Only describe the k most relevant tools to the agent.
+        scheduler (LLMScheduler, optional): Shares LLM capacity between concurrent runs.
+
+    Returns:
+        tuple: (agent, tool_manager, prompt_template)
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
 
-if __name__ == "__main__":
     model_name="gemini-2.0-flash"
     fallback_model_name="gemini-2.5-flash"
     print("--- Initializing AI Agent Framework ---")
     # 1. Initialize the LLM Abstraction Layer
-    llm = LLM(model_name=model_name,fallback_model_name=fallback_model_name, client=client)
+    # With AGENT_MODEL_ROUTING=1 a router picks the model per call; otherwise model_name is used.
+    llm = LLM(model_name=model_name,fallback_model_name=fallback_model_name, scheduler=scheduler, router=router_from_env())
+    try:
+        llm.client
+    except Exception as e:
+        print(f"Error initializing Gemini client: {e}")
+        print("Please make sure you have the GEMINI_API_KEY environment variable set.")
+        exit()
 
     # 2. Register Tools with the ToolManager
     tool_manager = ToolManager()
     calculator_tool = BaseTool(name="calculator", func=calculator)
+    evaluate_tool = BaseTool(name="evaluate_expression", func=evaluate_expression,
+                             keywords="tính toán biểu thức tổng trung bình phần trăm tăng trưởng chia")
     get_time_tool = BaseTool(name="get_time", func=get_current_time)
     final_answer = BaseTool(name="Final_Answer", func=Final_Answer)
     tool_manager.add_tool(get_time_tool)
     tool_manager.add_tool(calculator_tool)
-    tool_manager.add_tool(final_answer)
+    tool_manager.add_tool(evaluate_tool)
+    tool_manager.add_tool(final_answer, pinned=True)
 
     # 3. Create the Prompt Template to inform the agent about its tools
-    tool_descriptions = "\n".join([f"- {tool.name}: {tool.description}" for tool in tool_manager.get_all_tools()])
     prompt_template = PromptTemplate(
-        system_prompt=f"""
+        system_prompt="""
 You are a brilliant computational agent. Your job is to solve complex problems by creating a series of tool calls.
 You have access to the following tools:
 {tool_descriptions}
 """,
         user_input="{user_input}",
-        history="{history}"
+        history="{history}",
+        tool_manager=tool_manager,
+        tool_k=tool_k
         )
 
     # 4. Create the Agent with the LLM
     agent = BaseAgent(llm=llm)
+    return agent, tool_manager, prompt_template
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.serve:
+        from daemon import serve
+        serve(args.socket, tool_k=args.tool_k)
+        return
+
+    if args.batch:
+        from batch import run_batch
+        from checkpoint import store_from_env
+        run_batch(args.batch, args.out, concurrency=args.concurrency, requests_per_minute=args.rpm,
+                  iteration=args.iteration, dev_mode=args.dev_mode, task=args.task, tool_k=args.tool_k,
+                  checkpoint_store=store_from_env())
+        return
+
+    if args.dev_mode:
+        print("Running in dev mode~")
+    if args.task:
+        print("Agent planing for task~")
+    print("Prompt is processing by agent")
+
+    if args.socket:
+        from daemon import send_prompt
+        try:
+            send_prompt(args.socket, args.prompt, iteration=args.iteration, dev_mode=args.dev_mode, task=args.task)
+            return
+        except (FileNotFoundError, ConnectionRefusedError):
+            print(f"No agent daemon listening on {args.socket}, running locally.")
+
+    agent, tool_manager, prompt_template = build_agent_stack(tool_k=args.tool_k)
 
     # 5. Initialize the AgentExecutor with the Agent and ToolManager
     executor = AgentExecutor(agent=agent, tool_manager=tool_manager, prompt_template=prompt_template,max_iterations=args.iteration, dev_mode=args.dev_mode, json_output=args.task)
@@ -75,6 +133,17 @@ You have access to the following tools:
     user_prompt = args.prompt
 
     # 6. Run the AgentExecutor
-    final_output, _ = executor.run(user_prompt)
+    final_output, _ = executor.run(user_prompt, timeout_ms=args.timeout_ms)
     print("\n--- Task Complete ---")
     print(f"Result: {final_output}")
+    if executor.partial:
+        print("(Partial answer: the time budget ran out before the task was finished.)")
+
+    if args.profile:
+        from profiler import tool_profiler
+        print("\n--- Tool Profile ---")
+        print(tool_profiler.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import time
+import threading
+from collections import deque, OrderedDict
+from prompt_template import estimate_tokens
+
+
+def _clip(text: str, max_chars: int) -> str:
+    """Shortens text to max_chars, marking the cut with an ellipsis."""
+    text = " ".join(str(text).split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 3] + "..."
+
+
+class BaseMemory:
+    """
+    A base class for all memory types.
+    Subclasses decide how entries are stored and how they are rendered into a prompt.
+    """
+    def add(self, *args, **kwargs):
+        """Stores a new entry in memory."""
+        raise NotImplementedError
+
+    def load(self, *args, **kwargs) -> str:
+        """Returns the memory rendered as text for a prompt."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Removes every entry from memory."""
+        raise NotImplementedError
+
+
+class ConversationBufferMemory(BaseMemory):
+    """
+    Chat history for a single conversation.
+
+    Recent turns are kept verbatim in a deque (O(1) append and eviction) as long as
+    they fit in `max_tokens`. Older turns are compacted into a short running summary
+    which is itself capped at `summary_tokens`, so the rendered history never grows
+    beyond `max_tokens + summary_tokens`.
+    """
+    def __init__(self, max_tokens: int = 1000, summary_tokens: int = 200):
+        """
+        Initializes the memory.
+
+        Args:
+            max_tokens (int): Token budget for turns kept verbatim.
+            summary_tokens (int): Token budget for the summary of older turns.
+        """
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.turns = deque()
+        self.summary = ""
+        self.window_tokens = 0
+        self.last_access = time.monotonic()
+
+    @property
+    def size_tokens(self) -> int:
+        """Tokens currently held by this memory (verbatim turns plus summary)."""
+        return self.window_tokens + estimate_tokens(self.summary)
+
+    def add(self, user_input: str, output) -> None:
+        """
+        Appends a turn and compacts the oldest turns until the window fits the budget.
+
+        Args:
+            user_input (str): What the user asked.
+            output: What the agent answered.
+        """
+        # A single oversized turn is clipped so it can never blow the budget on its own.
+        max_chars = self.max_tokens * 4
+        user_input = _clip(user_input, max_chars // 2)
+        output = _clip(output, max_chars // 2)
+        tokens = estimate_tokens(user_input) + estimate_tokens(output)
+
+        self.turns.append((user_input, output, tokens))
+        self.window_tokens += tokens
+        while self.window_tokens > self.max_tokens and len(self.turns) > 1:
+            self._compact(self.turns.popleft())
+        self.last_access = time.monotonic()
+
+    def _compact(self, turn) -> None:
+        """Folds an evicted turn into the running summary, dropping the oldest lines if needed."""
+        user_input, output, tokens = turn
+        self.window_tokens -= tokens
+        line = f"- User asked: {_clip(user_input, 80)} -> Agent: {_clip(output, 120)}"
+        lines = (self.summary.split("\n") if self.summary else []) + [line]
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+
+    def load(self) -> str:
+        """
+        Renders the summary and the verbatim window as prompt text.
+
+        Returns:
+            str: The chat history, or an empty string for a new conversation.
+        """
+        self.last_access = time.monotonic()
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        for user_input, output, _ in self.turns:
+            parts.append(f"User: {user_input}\nAgent: {output}")
+        return "\n\n".join(parts)
+
+    def clear(self) -> None:
+        """Forgets the whole conversation."""
+        self.turns.clear()
+        self.summary = ""
+        self.window_tokens = 0
+
+
+class SessionMemoryStore:
+    """
+    A process-wide registry of ConversationBufferMemory objects keyed by session id.
+
+    Sessions are kept in LRU order. Sessions idle for longer than `idle_ttl` seconds are
+    evicted, and the least recently used sessions are dropped whenever the number of
+    sessions or the total tokens held exceed their caps, which bounds the footprint
+    regardless of how many clients are talking to the API.
+    """
+    def __init__(self, max_sessions: int = 5000, max_total_tokens: int = 2_000_000,
+                 idle_ttl: float = 1800, max_tokens_per_session: int = 1000,
+                 summary_tokens: int = 200):
+        """
+        Initializes the store.
+
+        Args:
+            max_sessions (int): Maximum number of live sessions.
+            max_total_tokens (int): Hard cap on tokens held across all sessions.
+            idle_ttl (float): Seconds of inactivity after which a session is evicted.
+            max_tokens_per_session (int): Verbatim window budget for each session.
+            summary_tokens (int): Summary budget for each session.
+        """
+        self.max_sessions = max_sessions
+        self.max_total_tokens = max_total_tokens
+        self.idle_ttl = idle_ttl
+        self.max_tokens_per_session = max_tokens_per_session
+        self.summary_tokens = summary_tokens
+        self.total_tokens = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> ConversationBufferMemory:
+        """
+        Returns the memory for a session, creating it if needed.
+
+        Args:
+            session_id (str): The client-provided session id.
+        """
+        with self._lock:
+            self._evict_idle()
+            memory = self._sessions.get(session_id)
+            if memory is None:
+                memory = ConversationBufferMemory(max_tokens=self.max_tokens_per_session,
+                                                  summary_tokens=self.summary_tokens)
+                self._sessions[session_id] = memory
+                self._enforce_caps()
+            else:
+                self._sessions.move_to_end(session_id)
+            memory.last_access = time.monotonic()
+            return memory
+
+    def load(self, session_id: str) -> str:
+        """
+        Returns the rendered history of a session, or "" for an unknown one. Unknown ids are
+        not added, so that reading them cannot evict a live session.
+        """
+        with self._lock:
+            self._evict_idle()
+            memory = self._sessions.get(session_id)
+            if memory is None:
+                return ""
+            self._sessions.move_to_end(session_id)
+            memory.last_access = time.monotonic()
+            return memory.load()
+
+    def add_turn(self, session_id: str, user_input: str, output) -> None:
+        """
+        Records a finished turn for a session and enforces the process-wide caps.
+
+        Args:
+            session_id (str): The client-provided session id.
+            user_input (str): What the user asked.
+            output: What the agent answered.
+        """
+        memory = self.get(session_id)
+        with self._lock:
+            before = memory.size_tokens
+            memory.add(user_input, output)
+            # The session may have been evicted by another request in the meantime.
+            if self._sessions.get(session_id) is memory:
+                self.total_tokens += memory.size_tokens - before
+                self._enforce_caps()
+
+    def drop(self, session_id: str) -> None:
+        """Removes a session explicitly."""
+        with self._lock:
+            self._remove(session_id)
+
+    def _remove(self, session_id: str) -> None:
+        memory = self._sessions.pop(session_id, None)
+        if memory is not None:
+            self.total_tokens -= memory.size_tokens
+
+    def _evict_idle(self) -> None:
+        # Sessions are in LRU order, so idle ones are always at the front.
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            session_id, memory = next(iter(self._sessions.items()))
+            if memory.last_access >= cutoff:
+                break
+            self._remove(session_id)
+
+    def _enforce_caps(self) -> None:
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions
+                                           or self.total_tokens > self.max_total_tokens):
+            self._remove(next(iter(self._sessions)))
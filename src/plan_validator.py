@@ -0,0 +1,177 @@
+import inspect
+import typing
+from typing import Any, Dict, List
+
+# Actions handled by the executor itself rather than by a tool.
+CONTROL_ACTIONS = {"Terminate"}
+
+# JSON has no tuples and no separate float type for whole numbers.
+_ACCEPTED_TYPES = {
+    str: (str,),
+    int: (int,),
+    float: (int, float),
+    bool: (bool,),
+    tuple: (list, tuple),
+    list: (list, tuple),
+    dict: (dict,),
+}
+
+
+def _references(item: Any) -> List[str]:
+    """Returns the `$id` references found anywhere in an argument."""
+    if isinstance(item, str) and item.startswith("$"):
+        return [item[1:]]
+    if isinstance(item, (list, tuple)):
+        return [ref for value in item for ref in _references(value)]
+    if isinstance(item, dict):
+        return [ref for value in item.values() for ref in _references(value)]
+    return []
+
+
+def _accepted_types(annotation):
+    """Maps a parameter annotation to the Python types a JSON value may have, or None to skip."""
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        return None
+    origin = typing.get_origin(annotation) or annotation
+    if origin is typing.Union:
+        accepted = []
+        for arg in typing.get_args(annotation):
+            types = _accepted_types(arg)
+            if types is None:
+                return None
+            accepted.extend(types)
+        return tuple(accepted)
+    if annotation is type(None):
+        return (type(None),)
+    return _ACCEPTED_TYPES.get(origin)
+
+
+class PlanValidator:
+    """
+    Checks a whole plan before any of its steps run.
+
+    Detects unknown tools, arguments that do not fit a tool's signature, literal
+    arguments of the wrong type, `$id` references to results that do not exist or are
+    produced later (including cycles), and duplicate `result_id`s.
+    """
+    def __init__(self, tool_manager):
+        """
+        Args:
+            tool_manager (ToolManager): The registry the plan's tools are looked up in.
+        """
+        self.tool_manager = tool_manager
+
+    def _check_arguments(self, step: int, tool, args: list) -> List[str]:
+        try:
+            signature = inspect.signature(tool.func)
+        except (TypeError, ValueError):
+            return []
+        try:
+            bound = signature.bind(*args)
+        except TypeError as e:
+            return [f"Step {step}: wrong arguments for '{tool.name}' {signature}: {e}."]
+
+        errors = []
+        for name, value in bound.arguments.items():
+            parameter = signature.parameters[name]
+            if parameter.kind == inspect.Parameter.VAR_POSITIONAL:
+                continue
+            if _references(value) or (value is None and parameter.default is None):
+                continue
+            accepted = _accepted_types(parameter.annotation)
+            if accepted is None:
+                continue
+            if isinstance(value, bool) and bool not in accepted:
+                accepted = ()
+            if not isinstance(value, accepted):
+                errors.append(f"Step {step}: argument '{name}' of '{tool.name}' should be "
+                              f"{getattr(parameter.annotation, '__name__', parameter.annotation)}, "
+                              f"got {type(value).__name__} {value!r}.")
+        return errors
+
+    def validate(self, plan: Any, available: typing.Iterable[str] = ()) -> List[str]:
+        """
+        Validates a plan.
+
+        Args:
+            plan (list): The actions returned by the agent.
+            available (Iterable[str]): Result ids already in the context (from earlier
+                                       iterations), which steps may reference.
+
+        Returns:
+            List[str]: One message per problem found; empty if the plan can run.
+        """
+        if not isinstance(plan, list):
+            return [f"The plan must be a JSON list of actions, got {type(plan).__name__}."]
+
+        errors = []
+        available = set(available)
+        produced_at: Dict[str, int] = {}
+        steps = []
+        for step, action in enumerate(plan, start=1):
+            if not isinstance(action, dict) or not action.get("action") or not isinstance(action["action"], str):
+                errors.append(f"Step {step}: every action must be an object with an 'action' name.")
+                continue
+            result_id = action.get("result_id")
+            if result_id is not None and not isinstance(result_id, str):
+                errors.append(f"Step {step}: result_id must be a string, got {type(result_id).__name__}.")
+                result_id = None
+            if result_id is not None:
+                if result_id in produced_at:
+                    errors.append(f"Step {step}: result_id '{result_id}' is already used by step {produced_at[result_id]}.")
+                else:
+                    produced_at[result_id] = step
+            steps.append((step, action, result_id))
+
+        dependencies: Dict[str, List[str]] = {}
+        for step, action, result_id in steps:
+            tool_name = action["action"]
+            if tool_name in CONTROL_ACTIONS:
+                continue
+            args = action.get("action_input")
+            if args is None:
+                args = []
+            if not isinstance(args, list):
+                errors.append(f"Step {step}: 'action_input' of '{tool_name}' must be a list of arguments.")
+                continue
+
+            references = _references(args)
+            if result_id is not None:
+                dependencies[result_id] = references
+            for ref in references:
+                if ref in produced_at and produced_at[ref] < step:
+                    continue
+                if ref in produced_at:
+                    if ref != result_id:
+                        # Reported once per cycle below; a plain forward reference otherwise.
+                        errors.append(f"Step {step}: '${ref}' is used before step {produced_at[ref]} produces it.")
+                elif ref not in available:
+                    errors.append(f"Step {step}: '${ref}' does not refer to any result_id.")
+
+            if tool_name not in self.tool_manager.tools:
+                errors.append(f"Step {step}: unknown tool '{tool_name}'. "
+                              f"Available tools: {', '.join(self.tool_manager.tools)}.")
+                continue
+            errors.extend(self._check_arguments(step, self.tool_manager.tools[tool_name], args))
+
+        for cycle in self._find_cycles(dependencies):
+            errors.append(f"Cyclic references between results: {' -> '.join(cycle)}.")
+        return errors
+
+    @staticmethod
+    def _find_cycles(dependencies: Dict[str, List[str]]) -> List[List[str]]:
+        cycles, done = [], set()
+
+        def visit(node, path):
+            if node in path:
+                cycles.append(path[path.index(node):] + [node])
+                return
+            if node in done or node not in dependencies:
+                return
+            for ref in dependencies[node]:
+                visit(ref, path + [node])
+            done.add(node)
+
+        for node in dependencies:
+            visit(node, [])
+        return cycles
@@ -0,0 +1,271 @@
+import os
+import re
+import sys
+import time
+import json
+import zlib
+import argparse
+import threading
+from collections import OrderedDict
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.S)
+_NUMBERS = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+# Tools report failures as text; results starting with these count as errors.
+ERROR_PREFIXES = ("Error running tool", "Database error", "Query execution error", "Query rejected",
+                  "An unexpected error")
+
+
+def fingerprint(query: str) -> str:
+    """
+    Normalizes a SQL statement so that queries differing only in their values match.
+
+    "SELECT * FROM t WHERE Rmks = 'KH1' AND x IN (1, 2)" and the same query with other
+    values both become "select * from t where rmks = ? and x in (?+)".
+    """
+    text = _LITERALS.sub(lambda m: " " if m.group(0).startswith(("--", "/*")) else "?", query)
+    text = _NUMBERS.sub("?", text)
+    text = _VALUE_LISTS.sub("(?+)", text)
+    return _SPACES.sub(" ", text).strip().rstrip(";").strip().lower()
+
+
+def fingerprint_id(text: str) -> str:
+    """Short stable identifier of a fingerprint, for grepping logs."""
+    return f"{zlib.crc32(text.encode('utf-8')):08x}"
+
+
+def explain_query_plan(db_file: str, query: str, params=()) -> list:
+    """
+    Returns the EXPLAIN QUERY PLAN of a statement as indented lines, without running it.
+    Errors are returned as a single line instead of being raised.
+    """
+    import sqlite3
+    try:
+        conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return [f"(plan unavailable: {e})"]
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params or ()).fetchall()
+    except sqlite3.Error as e:
+        return [f"(plan unavailable: {e})"]
+    finally:
+        conn.close()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+class _Stats:
+    """Running totals for one tool or one SQL fingerprint."""
+    __slots__ = ("calls", "errors", "total", "max", "rows", "bytes", "sample", "plan")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.sample = None
+        self.plan = None
+
+    def add(self, duration: float, rows: int, size: int, error: bool) -> None:
+        self.calls += 1
+        self.errors += int(error)
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.rows += rows or 0
+        self.bytes += size
+
+
+class ToolProfiler:
+    """
+    Collects timing statistics for every tool call, and per-fingerprint statistics for SQL.
+
+    SQL statements slower than `slow_threshold` seconds are written, with their
+    EXPLAIN QUERY PLAN, as JSON lines to a rotating slow-query log.
+    """
+    def __init__(self, slow_threshold: float = 0.5, log_path: str = "slow_queries.log",
+                 max_log_bytes: int = 1_000_000, log_backups: int = 3, max_fingerprints: int = 1000):
+        """
+        Args:
+            slow_threshold (float): Duration in seconds above which a SQL statement is logged.
+            log_path (str, optional): The slow-query log. None disables logging to a file.
+            max_log_bytes (int): Size at which the log is rotated.
+            log_backups (int): Number of rotated files kept (slow_queries.log.1, ...).
+            max_fingerprints (int): Distinct SQL fingerprints tracked; the least recently
+                                    seen one is dropped beyond this.
+        """
+        self.slow_threshold = slow_threshold
+        self.log_path = log_path
+        self.max_log_bytes = max_log_bytes
+        self.log_backups = log_backups
+        self.max_fingerprints = max_fingerprints
+        self.tools = {}
+        self.queries = OrderedDict()
+        self._lock = threading.Lock()
+        self._logger = None
+
+    def _get_logger(self):
+        # logging is only imported once something slow has to be written.
+        if self._logger is None:
+            import logging
+            import logging.handlers
+            logger = logging.getLogger(f"{__name__}.slow_queries.{id(self)}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(self.log_path, maxBytes=self.max_log_bytes,
+                                                           backupCount=self.log_backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def record(self, tool_name: str, duration: float, result, details: dict = None) -> None:
+        """
+        Records one tool call.
+
+        Args:
+            tool_name (str): The tool that ran.
+            duration (float): Wall-clock seconds the call took.
+            result: What the tool returned.
+            details (dict, optional): Facts reported by the tool itself. SQL tools report
+                                      'sql', 'params', 'db_file' and 'rows'.
+        """
+        details = details or {}
+        size = len(str(result).encode("utf-8")) if result is not None else 0
+        error = ((isinstance(result, dict) and "error" in result) or
+                 (isinstance(result, str) and result.startswith(ERROR_PREFIXES)))
+        rows = details.get("rows")
+        with self._lock:
+            self.tools.setdefault(tool_name, _Stats()).add(duration, rows, size, error)
+
+        sql = details.get("sql")
+        if not sql:
+            return
+        text = fingerprint(sql)
+        with self._lock:
+            stats = self.queries.get(text)
+            if stats is None:
+                stats = self.queries[text] = _Stats()
+                if len(self.queries) > self.max_fingerprints:
+                    self.queries.popitem(last=False)
+            self.queries.move_to_end(text)
+            stats.add(duration, rows, size, error)
+            stats.sample = sql
+
+        if duration >= self.slow_threshold:
+            plan = explain_query_plan(details.get("db_file", "sales_data.db"), details.get("executed_sql", sql),
+                                      details.get("params"))
+            with self._lock:
+                stats.plan = plan
+            if self.log_path:
+                entry = {
+                    "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "tool": tool_name,
+                    "fingerprint_id": fingerprint_id(text),
+                    "fingerprint": text,
+                    "sql": sql,
+                    "duration_ms": round(duration * 1000, 1),
+                    "rows": rows,
+                    "bytes": size,
+                    "error": error,
+                    "plan": plan,
+                }
+                self._get_logger().info(json.dumps(entry, ensure_ascii=False))
+
+    def reset(self) -> None:
+        """Forgets every recorded call."""
+        with self._lock:
+            self.tools.clear()
+            self.queries.clear()
+
+    @staticmethod
+    def _format(rows, title: str, label: str) -> str:
+        lines = [title, f"{'calls':>7} {'errors':>6} {'total_ms':>10} {'avg_ms':>9} {'max_ms':>9} "
+                        f"{'avg_rows':>9} {'avg_kb':>8}  {label}"]
+        for name, stats in rows:
+            calls = max(stats.calls, 1)
+            lines.append(f"{stats.calls:>7} {stats.errors:>6} {stats.total * 1000:>10.1f} "
+                         f"{stats.total * 1000 / calls:>9.1f} {stats.max * 1000:>9.1f} "
+                         f"{stats.rows / calls:>9.1f} {stats.bytes / calls / 1024:>8.1f}  {name}")
+            if stats.plan:
+                lines.extend(f"{'':>7}   plan: {line}" for line in stats.plan)
+        return "\n".join(lines)
+
+    def report(self, n: int = 10, sort_by: str = "total") -> str:
+        """
+        Formats the per-tool summary and the top-n SQL fingerprints.
+
+        Args:
+            n (int): Number of SQL fingerprints to show.
+            sort_by (str): 'total', 'max', 'avg' or 'calls'.
+
+        Returns:
+            str: A plain-text report.
+        """
+        keys = {
+            "total": lambda s: s.total,
+            "max": lambda s: s.max,
+            "avg": lambda s: s.total / max(s.calls, 1),
+            "calls": lambda s: s.calls,
+        }
+        if sort_by not in keys:
+            raise ValueError(f"Unknown sort key '{sort_by}'. Use one of: {list(keys)}")
+        key = keys[sort_by]
+        with self._lock:
+            tools = sorted(self.tools.items(), key=lambda item: key(item[1]), reverse=True)
+            queries = sorted(self.queries.items(), key=lambda item: key(item[1]), reverse=True)[:n]
+        return (self._format(tools, "Tool calls", "tool") + "\n\n" +
+                self._format(queries, f"Top {n} SQL fingerprints by {sort_by} time", "fingerprint"))
+
+    @classmethod
+    def from_log(cls, log_path: str = "slow_queries.log") -> "ToolProfiler":
+        """
+        Rebuilds statistics from a slow-query log and its rotated files, e.g. to report
+        on what a long-running server has logged.
+        """
+        profiler = cls(log_path=None)
+        paths = [f"{log_path}.{i}" for i in range(50, 0, -1)] + [log_path]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    duration = entry["duration_ms"] / 1000
+                    with profiler._lock:
+                        profiler.tools.setdefault(entry["tool"], _Stats()).add(
+                            duration, entry.get("rows"), entry.get("bytes", 0), entry.get("error", False))
+                        stats = profiler.queries.setdefault(entry["fingerprint"], _Stats())
+                        stats.add(duration, entry.get("rows"), entry.get("bytes", 0), entry.get("error", False))
+                        stats.sample = entry.get("sql")
+                        stats.plan = entry.get("plan")
+        return profiler
+
+
+# Process-wide profiler used by BaseTool.run.
+tool_profiler = ToolProfiler(
+    slow_threshold=float(os.getenv("AGENT_SLOW_QUERY_MS", "500")) / 1000,
+    log_path=os.getenv("AGENT_SLOW_QUERY_LOG", "slow_queries.log") or None,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Top SQL fingerprints from the slow-query log")
+    parser.add_argument("log", nargs="?", default=os.getenv("AGENT_SLOW_QUERY_LOG", "slow_queries.log"),
+                        help="slow-query log (rotated files are read too)")
+    parser.add_argument("-n", "--top", type=int, default=10, help="number of fingerprints to show")
+    parser.add_argument("--sort", default="total", choices=["total", "max", "avg", "calls"], help="ranking key")
+    args = parser.parse_args()
+    if not os.path.exists(args.log):
+        print(f"No slow-query log at {args.log}")
+        sys.exit(1)
+    print(ToolProfiler.from_log(args.log).report(n=args.top, sort_by=args.sort))
@@ -1,20 +1,69 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap, model-agnostic token estimate used for prompt budgeting.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: Roughly one token per four characters.
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
 class PromptTemplate:
     """
     A template system for formatting prompts consistently.
     """
-    def __init__(self, system_prompt: str, user_input: str, history: str):
+    def __init__(self, system_prompt: str, user_input: str, history: str, knowledge=None, knowledge_k: int = 4,
+                 tool_manager=None, tool_k: int = None):
+        """
+        Initializes the template.
+
+        Args:
+            system_prompt (str): The fixed instructions sent with every call.
+            user_input (str): Placeholder for the user input.
+            history (str): Default chat history.
+            knowledge (VectorStoreMemory, optional): Schema snippets and examples to retrieve from.
+            knowledge_k (int): Number of snippets of each kind to inject per prompt.
+            tool_manager (ToolManager, optional): Fills the `{tool_descriptions}` placeholder
+                                                  of the system prompt on every call.
+            tool_k (int, optional): Number of relevant (non-pinned) tools to describe. None describes all.
+        """
         self.system_prompt = system_prompt
         self.user_input = user_input
         self.history = history
+        self.knowledge = knowledge
+        self.knowledge_k = knowledge_k
+        self.tool_manager = tool_manager
+        self.tool_k = tool_k
 
-    def format_prompt(self, user_input) -> str:
+    def format_prompt(self, user_input, history: str = None, query: str = None) -> str:
         """
         Formats the prompt with the user input and history.
+
+        Args:
+            user_input (str): The input for the current iteration.
+            history (str, optional): Chat history for this call. Falls back to
+                                     the template's own history when omitted.
+            query (str, optional): The original user question, used to retrieve relevant
+                                   knowledge. Defaults to user_input.
         """
+        history = self.history if history is None else history
+        system_prompt = self.system_prompt
+        if self.tool_manager is not None:
+            tool_descriptions = self.tool_manager.get_descriptions(query or user_input, self.tool_k)
+            system_prompt = system_prompt.replace("{tool_descriptions}", tool_descriptions)
+        knowledge = ""
+        if self.knowledge is not None and len(self.knowledge):
+            relevant = self.knowledge.load(query or user_input, k=self.knowledge_k)
+            knowledge = f"\nRelevant schema and examples:\n{relevant}\n"
         return f"""
-{self.system_prompt}
-
-Chat History: {self.history}
+{system_prompt}
+{knowledge}
+Chat History: {history}
 
 User Input: {user_input}
 """
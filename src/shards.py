@@ -0,0 +1,530 @@
+import os
+import re
+import glob
+import sqlite3
+import datetime
+import threading
+
+from sql_guard import default_guard
+
+TABLE_NAME = "unified_sales_data"
+DATE_COLUMN = "Ngày_CT_Issue_date"
+# Yearly files of each logical table; '{year}' is the 4-digit year.
+SHARD_PATTERNS = {TABLE_NAME: os.getenv("AGENT_SHARD_PATTERN", "sales_data_{year}.db")}
+
+_AGGREGATE_CALL = re.compile(r"\b(SUM|TOTAL|COUNT|MAX|MIN|AVG|GROUP_CONCAT)\s*\(", re.I)
+_CLAUSES = re.compile(r"\b(GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT|WINDOW)\b", re.I)
+_ORDER_TERM = re.compile(r"(?is)^(?P<expr>.*?)(?P<suffix>(\s+COLLATE\s+\w+)?(\s+(ASC|DESC))?(\s+NULLS\s+(FIRST|LAST))?)\s*$")
+_NOT_ALIASES = {"END", "NULL", "TRUE", "FALSE", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ShardError(Exception):
+    """Raised when a query cannot be run across shards. The message is meant for the agent."""
+
+
+def _get_pool():
+    # Separate from the tool pool: a sharded query may itself run on a tool thread.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _pool = ThreadPoolExecutor(max_workers=int(os.getenv("AGENT_SHARD_THREADS", "8")),
+                                       thread_name_prefix="shard")
+        return _pool
+
+
+def period_bounds(period: str):
+    """
+    Turns '2025', '2025-03', '2025-03-15' or an inclusive 'start:end' range of those into
+    (lower, upper) datetimes, upper excluded.
+    """
+    def parse(text, end):
+        text = text.strip()
+        for fmt, step in (("%Y-%m-%d", "day"), ("%Y-%m", "month"), ("%Y", "year")):
+            try:
+                value = datetime.datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+            if not end:
+                return value
+            if step == "day":
+                return value + datetime.timedelta(days=1)
+            if step == "month":
+                return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+            return value.replace(year=value.year + 1)
+        raise ShardError(f"Unrecognized period '{period}'. Use '2025', '2025-03', '2025-03-15' or 'start:end'.")
+
+    start, _, end = str(period).partition(":")
+    lower, upper = parse(start, False), parse(end or start, True)
+    if upper <= lower:
+        raise ShardError(f"The period '{period}' ends before it starts.")
+    return lower, upper
+
+
+def _sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, bytes):
+        return f"X'{value.hex()}'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _mask(query: str) -> str:
+    """
+    Blanks out comments and the inside of string literals and quoted identifiers, keeping
+    every position, so keywords and parentheses can be found in the masked text and cut
+    from the original.
+    """
+    def hide(match):
+        text = match.group(0)
+        if text.startswith(("--", "/*")):
+            return " " * len(text)
+        return text[0] + "_" * (len(text) - 2) + text[-1]
+    return re.sub(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?\*/", hide, query, flags=re.S)
+
+
+def _depths(masked: str) -> list:
+    """Parenthesis depth at every position."""
+    depth, depths = 0, []
+    for char in masked:
+        if char == ")":
+            depth = max(0, depth - 1)
+        depths.append(depth)
+        if char == "(":
+            depth += 1
+    return depths
+
+
+def _top_level(pattern, masked: str, depths: list, start: int = 0, end: int = None):
+    """Matches of a pattern at parenthesis depth 0 between start and end."""
+    end = len(masked) if end is None else end
+    return [m for m in pattern.finditer(masked, start, end) if depths[m.start()] == 0]
+
+
+def _split(query: str, masked: str, depths: list, start: int, end: int) -> list:
+    """Splits query[start:end] at top-level commas into (start, end) spans."""
+    spans, begin = [], start
+    for position in range(start, end):
+        if masked[position] == "," and depths[position] == 0:
+            spans.append((begin, position))
+            begin = position + 1
+    spans.append((begin, end))
+    return spans
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip()).lower()
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _unquote(name: str) -> str:
+    if name[:1] in "\"`[" and len(name) > 1:
+        return name[1:-1].replace('""', '"') if name[0] == '"' else name[1:-1]
+    return name
+
+
+class _Query:
+    """The parts of a SELECT statement needed to split it into shard and merge queries."""
+    def __init__(self, query: str, params=()):
+        query = query.strip().rstrip(";").strip()
+        query = self._inline_params(query, params)
+        masked = _mask(query)
+        depths = _depths(masked)
+        selects = _top_level(re.compile(r"\bSELECT\b", re.I), masked, depths)
+        if not selects:
+            raise ShardError("Only SELECT queries can be run across shards.")
+        if _top_level(re.compile(r"\b(UNION|INTERSECT|EXCEPT)\b", re.I), masked, depths, selects[0].end()):
+            raise ShardError("Compound selects (UNION/INTERSECT/EXCEPT) cannot be merged across shards; "
+                             "run each part separately.")
+        if len(re.findall(r"\bSELECT\b", masked, re.I)) > 1:
+            # A subquery or CTE would only see the rows of its own shard, e.g. a DISTINCT
+            # subquery counted per year and summed counts values present in several years twice.
+            raise ShardError("Subqueries and WITH clauses cannot be merged across shards; query the table "
+                             "directly and combine the results with evaluate_expression if needed.")
+        self.query = query
+        self.prefix = query[:selects[0].start()]
+        position = selects[0].end()
+        distinct = re.compile(r"\s*(DISTINCT|ALL)\b", re.I).match(masked, position)
+        self.distinct = bool(distinct) and distinct.group(1).upper() == "DISTINCT"
+        if distinct:
+            position = distinct.end()
+        froms = _top_level(re.compile(r"\bFROM\b", re.I), masked, depths, position)
+        clauses = _top_level(_CLAUSES, masked, depths, froms[0].end() if froms else position)
+        list_end = froms[0].start() if froms else (clauses[0].start() if clauses else len(query))
+        self.items = [self._item(query, masked, span) for span in _split(query, masked, depths, position, list_end)]
+        body_end = clauses[0].start() if clauses else len(query)
+        self.body = query[list_end:body_end]
+        self.clauses = {}
+        for n, clause in enumerate(clauses):
+            name = re.sub(r"\s+", " ", clause.group(1)).upper()
+            end = clauses[n + 1].start() if n + 1 < len(clauses) else len(query)
+            self.clauses[name] = (query[clause.end():end].strip(), masked[clause.end():end].strip())
+        if "WINDOW" in self.clauses or any(re.search(r"\bOVER\b", item["masked"], re.I) for item in self.items):
+            raise ShardError("Window functions cannot be merged across shards.")
+
+    @staticmethod
+    def _inline_params(query: str, params) -> str:
+        """Writes positional parameters into the query as literals, so its parts can be moved freely."""
+        params = list(params or ())
+        masked = _mask(query)
+        if re.search(r"[?][0-9]|[:@$][A-Za-z_]", masked):
+            raise ShardError("Use '?' placeholders for parameters of sharded queries.")
+        positions = [m.start() for m in re.finditer(r"\?", masked)]
+        if len(positions) != len(params):
+            raise ShardError(f"The query has {len(positions)} '?' placeholders but {len(params)} parameters were given.")
+        for position, value in reversed(list(zip(positions, params))):
+            query = query[:position] + _sql_literal(value) + query[position + 1:]
+        return query
+
+    @staticmethod
+    def _item(query: str, masked: str, span) -> dict:
+        text, bare = query[span[0]:span[1]], masked[span[0]:span[1]]
+        alias = None
+        depths = _depths(bare)
+        # 'expr AS alias' (AS outside any parentheses, unlike CAST(x AS INTEGER)) or 'expr alias'.
+        explicit = [m for m in re.finditer(r"(?is)(?<=\S)\s+AS\s+(\S+)\s*$", bare) if depths[m.start()] == 0]
+        match = (re.match(r"(?is)^(.*?\S)\s+AS\s+(\S+)\s*$", bare[:explicit[-1].end()]) if explicit else
+                 re.match(r"(?is)^(.*[\w)\]\"`'])\s+([A-Za-z_]\w*|\"[^\"]*\"|`[^`]*`|\[[^\]]*\])\s*$", bare))
+        if match and match.group(2).upper() not in _NOT_ALIASES:
+            alias = _unquote(text[match.start(2):match.end(2)])
+            text, bare = text[:match.end(1)], bare[:match.end(1)]
+        return {"expr": text.strip(), "masked": bare.strip(), "alias": alias,
+                "aggregates": _aggregate_calls(text.strip(), bare.strip())}
+
+    @property
+    def aggregated(self) -> bool:
+        having = self.clauses.get("HAVING")
+        return ("GROUP BY" in self.clauses or any(item["aggregates"] for item in self.items)
+                or bool(having and _aggregate_calls(*having)))
+
+    def limit(self):
+        """(count, offset) of the LIMIT clause, or None without one."""
+        if "LIMIT" not in self.clauses:
+            return None
+        text = self.clauses["LIMIT"][0]
+        match = (re.match(r"(?is)^\s*(-?\d+)\s*(?:OFFSET\s+(\d+))?\s*$", text) or
+                 re.match(r"(?is)^\s*(\d+)\s*,\s*(-?\d+)\s*$", text))
+        if not match:
+            raise ShardError("Sharded queries need a LIMIT of plain numbers, e.g. LIMIT 10 or LIMIT 10 OFFSET 20.")
+        if "," in text:
+            return int(match.group(2)), int(match.group(1))
+        return int(match.group(1)), int(match.group(2) or 0)
+
+
+def _aggregate_calls(text: str, masked: str) -> list:
+    """(start, end, function, argument) of the outermost aggregate calls in an expression."""
+    depths = _depths(masked)
+    calls, covered = [], -1
+    for match in _AGGREGATE_CALL.finditer(masked):
+        if match.start() < covered:
+            continue
+        open_at = match.end() - 1
+        close_at = next((i for i in range(open_at + 1, len(masked))
+                         if masked[i] == ")" and depths[i] == depths[open_at]), None)
+        if close_at is None:
+            continue
+        function = match.group(1).upper()
+        argument = text[open_at + 1:close_at]
+        inner = masked[open_at + 1:close_at]
+        inner_depths = _depths(inner)
+        if function in ("MAX", "MIN") and any(c == "," and d == 0 for c, d in zip(inner, inner_depths)):
+            continue  # The scalar max(a, b).
+        if function == "GROUP_CONCAT" or re.match(r"\s*DISTINCT\b", inner, re.I):
+            raise ShardError(f"{function}({argument.strip()}) cannot be merged across shards. Group by the "
+                             f"column instead (GROUP BY ...) and count or combine the groups afterwards.")
+        if re.match(r"\s*FILTER\b", masked[close_at + 1:], re.I):
+            raise ShardError("Aggregates with FILTER cannot be merged across shards; use CASE WHEN inside the aggregate.")
+        calls.append((match.start(), close_at + 1, function, argument))
+        covered = close_at + 1
+    return calls
+
+
+class ShardPlan:
+    """
+    Splits a query into the query run on every shard and the query that merges the
+    shards' rows (loaded into a table named `partials` with columns c0, c1, ...).
+
+    Aggregates are run as partials and re-aggregated: SUM/TOTAL/COUNT partials are
+    summed, MAX/MIN take the max/min, and AVG is run as SUM and COUNT. HAVING, ORDER BY
+    and LIMIT are applied after the merge. Queries without aggregates keep their ORDER BY
+    and LIMIT on each shard (so each shard returns at most its own top rows), and the
+    merge orders and limits again.
+    """
+    def __init__(self, query: str, params=(), names: list = None):
+        """
+        Args:
+            query (str): The SELECT statement over the logical table.
+            params (tuple): Values of its '?' placeholders.
+            names (list[str], optional): Output column names of the query, as SQLite
+                                         reports them (used to name the merged columns).
+        """
+        self.parsed = _Query(query, params)
+        self.names = names or [item["alias"] or item["expr"] for item in self.parsed.items]
+        self.limit = self.parsed.limit()
+        if self.parsed.aggregated:
+            self._plan_aggregate()
+        else:
+            self._plan_rows()
+
+    def _partial(self, expression: str) -> str:
+        column = f"c{len(self._partials)}"
+        self._partials.append(f"{expression} AS {column}")
+        return column
+
+    def _merge_aggregates(self, text: str, masked: str) -> str:
+        """Replaces every aggregate call in an expression with its merge over partial columns."""
+        for start, end, function, argument in reversed(_aggregate_calls(text, masked)):
+            if function == "AVG":
+                total, count = self._partial(f"TOTAL({argument})"), self._partial(f"COUNT({argument})")
+                merged = f"(TOTAL({total}) / NULLIF(SUM({count}), 0))"
+            else:
+                column = self._partial(f"{function}({argument})")
+                merged = {"SUM": f"SUM({column})", "TOTAL": f"TOTAL({column})", "COUNT": f"COALESCE(SUM({column}), 0)",
+                          "MAX": f"MAX({column})", "MIN": f"MIN({column})"}[function]
+            text = text[:start] + merged + text[end:]
+            masked = masked[:start] + "_" * len(merged) + masked[end:]
+        return text
+
+    def _group_terms(self):
+        """GROUP BY terms with positions and aliases replaced by the expressions they stand for."""
+        if "GROUP BY" not in self.parsed.clauses:
+            return []
+        text, masked = self.parsed.clauses["GROUP BY"]
+        aliases = {item["alias"].lower(): item["expr"] for item in self.parsed.items if item["alias"]}
+        terms = []
+        for start, end in _split(text, masked, _depths(masked), 0, len(text)):
+            term = text[start:end].strip()
+            if term.isdigit() and 0 < int(term) <= len(self.parsed.items):
+                term = self.parsed.items[int(term) - 1]["expr"]
+            terms.append(aliases.get(_unquote(term).lower(), term))
+        return terms
+
+    def _plan_aggregate(self):
+        partials = self._partials = []
+        if len(self.names) != len(self.parsed.items):
+            raise ShardError("Select the columns explicitly instead of '*' when aggregating across shards.")
+        keys, merge_items = {}, []
+        group_terms = self._group_terms()
+        for item, name in zip(self.parsed.items, self.names):
+            if item["aggregates"]:
+                expression = self._merge_aggregates(item["expr"], item["masked"])
+            else:
+                column = keys.get(_normalize(item["expr"]))
+                if column is None:
+                    column = keys[_normalize(item["expr"])] = self._partial(item["expr"])
+                # Without GROUP BY a plain column is any value of the (single) group.
+                expression = column if group_terms else f"MAX({column})"
+            merge_items.append(f"{expression} AS {_quote(name)}")
+        for term in group_terms:
+            if _normalize(term) not in keys:
+                keys[_normalize(term)] = self._partial(term)
+
+        merge = f"SELECT {', '.join(merge_items)} FROM partials"
+        if group_terms:
+            merge += f" GROUP BY {', '.join(keys.values())}"
+        if "HAVING" in self.parsed.clauses:
+            merge += f" HAVING {self._merge_aggregates(*self.parsed.clauses['HAVING'])}"
+        if "ORDER BY" in self.parsed.clauses:
+            merge += f" ORDER BY {self._merge_order(keys)}"
+        if self.limit is not None:
+            merge += f" LIMIT {self.limit[0]} OFFSET {self.limit[1]}"
+        self.merge_query = merge
+
+        # Built last: HAVING and ORDER BY may add partial columns.
+        shard = f"{self.parsed.prefix}SELECT {', '.join(partials)} {self.parsed.body}"
+        if group_terms:
+            shard += f" GROUP BY {', '.join(group_terms)}"
+        self.shard_query = shard
+        self.width = len(partials)
+
+    def _merge_order(self, keys: dict) -> str:
+        text, masked = self.parsed.clauses["ORDER BY"]
+        terms = []
+        for start, end in _split(text, masked, _depths(masked), 0, len(text)):
+            match = _ORDER_TERM.match(text[start:end].strip())
+            expression, suffix = match.group("expr"), match.group("suffix")
+            column = keys.get(_normalize(expression))
+            if column is not None:
+                expression = column
+            else:
+                expression = self._merge_aggregates(expression, _mask(expression))
+            terms.append(expression + suffix)
+        return ", ".join(terms)
+
+    def _plan_rows(self):
+        parsed = self.parsed
+        outputs = {name.lower(): n for n, name in enumerate(self.names)}
+        hidden, order = [], []
+        if "ORDER BY" in parsed.clauses:
+            text, masked = parsed.clauses["ORDER BY"]
+            for start, end in _split(text, masked, _depths(masked), 0, len(text)):
+                match = _ORDER_TERM.match(text[start:end].strip())
+                expression, suffix = match.group("expr"), match.group("suffix")
+                if expression.isdigit():
+                    column = int(expression) - 1
+                elif _unquote(expression).lower() in outputs:
+                    column = outputs[_unquote(expression).lower()]
+                elif parsed.distinct:
+                    raise ShardError("With SELECT DISTINCT, ORDER BY must use selected columns in sharded queries.")
+                else:
+                    # Sort keys that are not selected travel as extra columns.
+                    column = len(self.names) + len(hidden)
+                    hidden.append(f"{expression} AS {_quote(f'__order{len(hidden)}')}")
+                order.append(f"c{column}{suffix}")
+
+        select_list = ", ".join(item["expr"] + (f" AS {_quote(item['alias'])}" if item["alias"] else "")
+                                for item in parsed.items)
+        shard = f"{parsed.prefix}SELECT {'DISTINCT ' if parsed.distinct else ''}{select_list}"
+        if hidden:
+            shard += ", " + ", ".join(hidden)
+        shard += " " + parsed.body
+        if order:
+            shard += f" ORDER BY {parsed.clauses['ORDER BY'][0]}"
+        if self.limit is not None and self.limit[0] >= 0:
+            # Each shard returns the rows the merged result could need.
+            shard += f" LIMIT {self.limit[0] + self.limit[1]}"
+        self.shard_query = shard
+        self.width = len(self.names) + len(hidden)
+
+        columns = ", ".join(f"c{n} AS {_quote(name)}" for n, name in enumerate(self.names))
+        merge = f"SELECT {'DISTINCT ' if parsed.distinct else ''}{columns} FROM partials"
+        if order:
+            merge += f" ORDER BY {', '.join(order)}"
+        if self.limit is not None:
+            merge += f" LIMIT {self.limit[0]} OFFSET {self.limit[1]}"
+        self.merge_query = merge
+
+
+class ShardSet:
+    """
+    The yearly database files holding one logical table, e.g. sales_data_2024.db and
+    sales_data_2025.db for `unified_sales_data`.
+
+    A query over a period only opens the files of the years it covers. In each of them
+    the logical table is replaced by a temporary view restricted to the period, the query
+    runs on its own connection in parallel with the others, and the results are merged
+    (see ShardPlan), so query time follows the length of the period, not of the history.
+    """
+    def __init__(self, pattern: str = SHARD_PATTERNS[TABLE_NAME], table: str = TABLE_NAME,
+                 date_column: str = DATE_COLUMN):
+        """
+        Args:
+            pattern (str): Path of the shard files with '{year}' in place of the year.
+            table (str): The logical table, present in every shard.
+            date_column (str): The 'YYYY-MM-DD HH:MM:SS' column the period filters on.
+        """
+        if "{year}" not in pattern:
+            raise ValueError("The shard pattern needs a '{year}' placeholder.")
+        self.pattern = pattern
+        self.table = table
+        self.date_column = date_column
+
+    def shards(self) -> dict:
+        """{year: path} of the shard files that exist."""
+        prefix, suffix = self.pattern.split("{year}", 1)
+        found = {}
+        for path in glob.glob(glob.escape(prefix) + "[0-9][0-9][0-9][0-9]" + glob.escape(suffix)):
+            found[int(path[len(prefix):len(path) - len(suffix)])] = path
+        return dict(sorted(found.items()))
+
+    def prune(self, lower: datetime.datetime, upper: datetime.datetime) -> dict:
+        """{year: path} of the shards that may hold rows in [lower, upper)."""
+        last = (upper - datetime.timedelta(seconds=1)).year
+        return {year: path for year, path in self.shards().items() if lower.year <= year <= last}
+
+    def _connect(self, path: str, year: int, lower, upper, cancel_token=None) -> sqlite3.Connection:
+        from snapshot import connect
+        conn = connect(path)
+        if cancel_token is not None:
+            conn.set_progress_handler(lambda: 1 if cancel_token.cancelled else 0, 1000)
+            cancel_token.on_cancel(conn.interrupt)
+        # A shard only partly inside the period is seen through a view that filters it.
+        if lower > datetime.datetime(year, 1, 1) or upper < datetime.datetime(year + 1, 1, 1):
+            conn.execute(f"CREATE TEMP VIEW {_quote(self.table)} AS SELECT * FROM main.{_quote(self.table)} "
+                         f"WHERE {_quote(self.date_column)} >= '{lower:%Y-%m-%d %H:%M:%S}' "
+                         f"AND {_quote(self.date_column)} < '{upper:%Y-%m-%d %H:%M:%S}'")
+        return conn
+
+    def _run_shard(self, path: str, year: int, lower, upper, query: str, limit_rows: bool, cancel_token=None):
+        conn = self._connect(path, year, lower, upper, cancel_token)
+        try:
+            executed, _ = default_guard.prepare(conn, query)
+            return conn.execute(executed if limit_rows else query).fetchall()
+        finally:
+            conn.close()
+
+    def query(self, query: str, period: str, params=(), cancel_token=None):
+        """
+        Runs a query over the shards covering a period.
+
+        Args:
+            query (str): A SELECT statement over the logical table.
+            period (str): '2025', '2025-03', '2025-03-15' or an inclusive 'start:end' range.
+            params (tuple): Values of the query's '?' placeholders.
+            cancel_token (CancelToken, optional): Interrupts every shard when cancelled.
+
+        Returns:
+            tuple: (column names, merged rows, ShardPlan, list of shard paths read)
+
+        Raises:
+            ShardError: If no shard covers the period or the query cannot be merged.
+            SqlGuardError: If a shard refuses the query (see SqlGuard).
+        """
+        lower, upper = period_bounds(period)
+        shards = self.prune(lower, upper)
+        if not shards:
+            available = ", ".join(str(year) for year in self.shards()) or "none"
+            raise ShardError(f"No shard of '{self.table}' covers {period}. Years available: {available}.")
+
+        # The output names are those the query has on a single shard.
+        year, path = next(iter(shards.items()))
+        conn = self._connect(path, year, lower, upper, cancel_token)
+        try:
+            inlined = _Query._inline_params(query.strip().rstrip(";").strip(), params)
+            default_guard.prepare(conn, inlined)
+            names = [column[0] for column in conn.execute(f"SELECT * FROM ({inlined}) LIMIT 0").description]
+        finally:
+            conn.close()
+
+        plan = ShardPlan(inlined, names=names)
+        # Partial aggregates must be complete; row queries are bounded like run_sql_query.
+        limit_rows = not plan.parsed.aggregated
+        futures = [_get_pool().submit(self._run_shard, path, year, lower, upper, plan.shard_query, limit_rows, cancel_token)
+                   for year, path in shards.items()]
+        rows = [row for future in futures for row in future.result()]
+
+        merger = sqlite3.connect(":memory:")
+        try:
+            width = plan.width
+            merger.execute(f"CREATE TABLE partials ({', '.join(f'c{n}' for n in range(width))})")
+            merger.executemany(f"INSERT INTO partials VALUES ({', '.join('?' * width)})", rows)
+            try:
+                cursor = merger.execute(plan.merge_query)
+            except sqlite3.Error as e:
+                raise ShardError(f"The shard results could not be merged ({e}). Select aggregates and grouped "
+                                 f"columns directly, and combine them with evaluate_expression if needed.")
+            return [column[0] for column in cursor.description], cursor.fetchall(), plan, list(shards.values())
+        finally:
+            merger.close()
+
+
+_shard_sets = {}
+
+
+def get_shard_set(table: str = TABLE_NAME) -> ShardSet:
+    """Returns the ShardSet of a logical table (see SHARD_PATTERNS)."""
+    if table not in SHARD_PATTERNS:
+        raise ShardError(f"'{table}' is not sharded. Sharded tables: {', '.join(SHARD_PATTERNS)}.")
+    if table not in _shard_sets:
+        _shard_sets[table] = ShardSet(SHARD_PATTERNS[table], table)
+    return _shard_sets[table]
@@ -0,0 +1,162 @@
+import os
+import time
+import sqlite3
+import itertools
+import threading
+
+_generations = itertools.count(1)
+
+
+class DatabaseSnapshot:
+    """
+    Serves queries from an in-memory copy of a SQLite database file.
+
+    The file is copied with the backup API into a named, shared-cache in-memory
+    database. Each copy is a separate generation with its own name: a query opens a
+    connection to the current generation and keeps reading it until it closes, even if
+    a newer generation is swapped in meanwhile, so no query ever sees a half-loaded or
+    mixed snapshot. A generation is freed by SQLite when its last connection closes.
+
+    Changes on disk are detected with `PRAGMA data_version` on a watcher connection
+    (commits by other processes) and the file's inode/size/mtime (file replaced).
+    """
+    def __init__(self, db_file: str = "sales_data.db", check_interval: float = 2.0):
+        """
+        Args:
+            db_file (str): The SQLite database file to mirror.
+            check_interval (float): Seconds between two checks for changes on disk.
+        """
+        self.db_file = db_file
+        self.check_interval = check_interval
+        self.generation = 0
+        self.loaded_at = None
+        self._uri = None
+        self._keeper = None
+        self._version = None
+        self._watcher = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _file_version(self):
+        parts = []
+        for path in (self.db_file, self.db_file + "-wal"):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                parts.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        data_version = None
+        try:
+            if self._watcher is None:
+                self._watcher = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True, check_same_thread=False)
+            data_version = self._watcher.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            self._watcher = None
+        return tuple(parts), data_version
+
+    def reload(self) -> bool:
+        """
+        Copies the database file into a new in-memory generation and swaps it in.
+
+        Returns:
+            bool: True if a new generation was loaded, False if the file was unchanged.
+        """
+        with self._reload_lock:
+            version = self._file_version()
+            if version == self._version and self._uri is not None:
+                return False
+            if not os.path.exists(self.db_file):
+                raise FileNotFoundError(f"Database file not found: {self.db_file}")
+
+            start = time.perf_counter()
+            uri = f"file:snapshot_{os.getpid()}_{next(_generations)}?mode=memory&cache=shared"
+            keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            source = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True)
+            try:
+                source.backup(keeper)
+            except sqlite3.Error:
+                keeper.close()
+                raise
+            finally:
+                source.close()
+
+            with self._lock:
+                old_keeper = self._keeper
+                self._uri, self._keeper = uri, keeper
+                self._version = version
+                self.generation += 1
+                self.loaded_at = time.time()
+            # Queries still reading the old generation keep it alive until they close.
+            if old_keeper is not None:
+                old_keeper.close()
+            print(f"[snapshot] Loaded {self.db_file} into memory (generation {self.generation}) "
+                  f"in {time.perf_counter() - start:.3f}s")
+            return True
+
+    def connect(self) -> sqlite3.Connection:
+        """Opens a read connection to the current generation, loading the first one if needed."""
+        if self._uri is None:
+            self.reload()
+        # Connecting under the lock guarantees the generation is still held by its keeper.
+        with self._lock:
+            return sqlite3.connect(self._uri, uri=True)
+
+    def _poll(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.reload()
+            except (OSError, sqlite3.Error) as e:
+                # Keep serving the last good generation; try again on the next tick.
+                print(f"[snapshot] Reload of {self.db_file} failed: {e}")
+
+    def start(self) -> "DatabaseSnapshot":
+        """Loads the snapshot and starts the background thread that reloads it on change."""
+        if self._uri is None:
+            self.reload()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll, name="snapshot-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stops polling and releases the current generation."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._reload_lock, self._lock:
+            for conn in (self._keeper, self._watcher):
+                if conn is not None:
+                    conn.close()
+            self._keeper = self._watcher = self._uri = None
+            self._version = None
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def snapshots_enabled() -> bool:
+    """Whether SQL tools should read from in-memory snapshots (AGENT_SQL_SNAPSHOT=1)."""
+    return os.getenv("AGENT_SQL_SNAPSHOT", "0").lower() in ("1", "true", "yes")
+
+
+def get_snapshot(db_file: str = "sales_data.db") -> DatabaseSnapshot:
+    """Returns the process-wide, started snapshot of a database file."""
+    with _snapshots_lock:
+        snapshot = _snapshots.get(db_file)
+        if snapshot is None:
+            snapshot = DatabaseSnapshot(db_file, check_interval=float(os.getenv("AGENT_SNAPSHOT_CHECK_INTERVAL", "2")))
+            _snapshots[db_file] = snapshot.start()
+    return snapshot
+
+
+def connect(db_file: str = "sales_data.db") -> sqlite3.Connection:
+    """
+    Opens a connection for a read-only query: to the in-memory snapshot when snapshots
+    are enabled, else to the file itself.
+    """
+    if snapshots_enabled():
+        return get_snapshot(db_file).connect()
+    return sqlite3.connect(db_file)
@@ -0,0 +1,147 @@
+import os
+import re
+import sqlite3
+
+_READ_ONLY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+_LITERALS = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.S)
+_PLAN_STEP = re.compile(r"^(SCAN|SEARCH)\s+(\S+)(.*)$")
+
+
+class SqlGuardError(Exception):
+    """Raised when a statement is refused before execution. The message is meant for the agent."""
+
+
+def strip_literals(query: str) -> str:
+    """Replaces string literals and comments so keywords can be matched safely."""
+    return _LITERALS.sub(lambda m: " " if m.group(0).startswith(("--", "/*")) else "?", query)
+
+
+def _top_level(text: str) -> str:
+    """Drops everything nested inside parentheses."""
+    depth, out = 0, []
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            out.append(char)
+    return "".join(out)
+
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    return sqlite3.SQLITE_OK if action in _READ_ONLY_ACTIONS else sqlite3.SQLITE_DENY
+
+
+class SqlGuard:
+    """
+    Checks LLM-written SQL before it runs.
+
+    - Only a single read-only statement (SELECT / WITH ... SELECT) is accepted, and the
+      connection's authorizer denies anything else at execution time as well.
+    - `EXPLAIN QUERY PLAN` is used to estimate how many rows the statement visits; full
+      scans joined with other scans that exceed `max_scan_rows` are refused with a hint.
+    - A LIMIT is added to selects that have none, so huge results are never formatted.
+    """
+    def __init__(self, max_rows: int = 200, max_scan_rows: int = 5_000_000):
+        """
+        Args:
+            max_rows (int): Rows returned at most by a query without its own LIMIT.
+            max_scan_rows (int): Estimated rows visited above which a query is refused.
+        """
+        self.max_rows = max_rows
+        self.max_scan_rows = max_scan_rows
+
+    def prepare(self, conn: sqlite3.Connection, query: str, params=()):
+        """
+        Validates a statement and returns the version to execute.
+
+        Args:
+            conn (sqlite3.Connection): The connection the query will run on.
+            query (str): The SQL statement.
+            params (tuple): Its parameters.
+
+        Returns:
+            tuple: (query to run, True if a LIMIT of max_rows + 1 was added).
+
+        Raises:
+            SqlGuardError: If the statement is not read-only or is too expensive.
+        """
+        query = query.strip().rstrip(";").strip()
+        bare = strip_literals(query)
+        if ";" in bare:
+            raise SqlGuardError("Only one SQL statement can be run per call. Split it into separate run_sql_query steps.")
+        first_word = bare.lstrip("( \n\t").split(None, 1)[0].upper() if bare.strip() else ""
+        if first_word not in ("SELECT", "WITH"):
+            raise SqlGuardError(f"Only read-only SELECT queries are allowed, got '{first_word or query}'.")
+        conn.set_authorizer(_authorizer)
+
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        except sqlite3.DatabaseError as e:
+            if "not authorized" in str(e):
+                raise SqlGuardError("Only read-only SELECT queries are allowed.")
+            # Let the real execution report syntax/column errors the usual way.
+            plan = None
+        if plan is not None:
+            cost, scans = self.estimate_cost(conn, plan, bare)
+            if cost > self.max_scan_rows:
+                raise SqlGuardError(
+                    f"This query would visit about {cost:,} rows ({', '.join(scans)}), above the limit of "
+                    f"{self.max_scan_rows:,}. Add WHERE filters (e.g. on the date), join on a selective condition, "
+                    f"aggregate with GROUP BY, or use the aggregate_sales tool instead.")
+
+        top_level = _top_level(bare)
+        if re.search(r"\bLIMIT\b", top_level, re.I):
+            return query, False
+        if first_word == "SELECT" and not bare.lstrip().startswith("(") and \
+                not re.search(r"\b(?:UNION|INTERSECT|EXCEPT)\b", top_level, re.I):
+            # A plain SELECT takes the LIMIT directly, which keeps duplicate column names as they are
+            # (a wrapping SELECT * would rename them). The newline ends a trailing '--' comment.
+            return f"{query}\nLIMIT {self.max_rows + 1}", True
+        return f"SELECT * FROM ({query}) LIMIT {self.max_rows + 1}", True
+
+    @staticmethod
+    def _rows_in(conn: sqlite3.Connection, table: str) -> int:
+        """Approximate row count of a table (MAX(rowid) is an O(log n) lookup)."""
+        try:
+            return conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        except sqlite3.DatabaseError:
+            return None
+
+    def estimate_cost(self, conn: sqlite3.Connection, plan, bare_query: str):
+        """
+        Estimates rows visited from an EXPLAIN QUERY PLAN result.
+
+        Steps that share a parent are nested loops, so their estimates multiply; separate
+        subqueries add up. A SCAN visits the whole table, an indexed SEARCH about 1%.
+
+        Returns:
+            tuple: (estimated rows, list of human-readable scan descriptions)
+        """
+        aliases = {alias.lower(): table for table, alias in
+                   re.findall(r"\b(?:FROM|JOIN)\s+[\"`\[]?(\w+)[\"`\]]?(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|GROUP|ORDER|LIMIT|LEFT|INNER|CROSS|NATURAL|USING)\b)(\w+))?",
+                              bare_query, re.I) if alias}
+        aliases.update({table.lower(): table for table in aliases.values()})
+        levels = {}
+        scans = []
+        largest = max([self._rows_in(conn, table) or 0 for table in set(aliases.values())] or [0])
+        for _, parent, _, detail in plan:
+            match = _PLAN_STEP.match(detail)
+            if not match:
+                continue
+            kind, name, rest = match.groups()
+            if name.startswith("(") or name == "CONSTANT":
+                continue
+            rows = self._rows_in(conn, aliases.get(name.lower(), name))
+            if rows is None:
+                rows = largest
+            estimate = rows if kind == "SCAN" else max(1, rows // 100)
+            if kind == "SCAN":
+                scans.append(f"full scan of {aliases.get(name.lower(), name)}")
+            levels[parent] = levels.get(parent, 1) * max(1, estimate)
+        return sum(levels.values()), scans
+
+
+default_guard = SqlGuard(max_rows=int(os.getenv("AGENT_SQL_MAX_ROWS", "200")),
+                         max_scan_rows=int(os.getenv("AGENT_SQL_MAX_SCAN_ROWS", "5000000")))
@@ -1,29 +1,245 @@
+import os
 import math
+import time
 import datetime
+import threading
+import contextvars
+from contextlib import contextmanager
 from typing import List, Any
-import sqlite3
-import pandas as pd
+from profiler import tool_profiler
+
+# Number of SQLite virtual machine steps between two cancellation checks.
+SQL_PROGRESS_STEPS = 1000
+
+_current_cancel_token = contextvars.ContextVar("current_cancel_token", default=None)
+_current_call_details = contextvars.ContextVar("current_call_details", default=None)
+# time.monotonic() value by which the current agent run must finish.
+_current_deadline = contextvars.ContextVar("current_deadline", default=None)
+_thread_pool = None
+_process_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_thread_pool():
+    global _thread_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _thread_pool = ThreadPoolExecutor(max_workers=int(os.getenv("AGENT_TOOL_THREADS", "32")),
+                                              thread_name_prefix="tool")
+        return _thread_pool
+
+
+def _get_process_pool():
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+        return _process_pool
+
+
+def tool_error(tool_name: str, error: str, message: str) -> dict:
+    """
+    Builds the structured error returned to the agent when a tool cannot complete.
+
+    Args:
+        tool_name (str): The name of the tool.
+        error (str): A short machine-readable error type, e.g. 'ToolTimeout'.
+        message (str): A hint for the agent on how to proceed.
+    """
+    return {"error": error, "tool": tool_name, "message": message}
+
+
+class CancelToken:
+    """
+    Lets a long-running tool notice that its caller gave up on it.
+    Tools read the token of the current call with `current_cancel_token()`.
+    """
+    def __init__(self, deadline: float = None):
+        """
+        Args:
+            deadline (float, optional): time.monotonic() value after which the call is cancelled.
+        """
+        self.deadline = deadline
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        """True once cancel() was called or the deadline has passed."""
+        if self._event.is_set():
+            return True
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def cancel(self) -> None:
+        """Cancels the call and runs the registered callbacks."""
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback) -> None:
+        """Registers a callback to run on cancellation (immediately if already cancelled)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+def current_cancel_token():
+    """Returns the CancelToken of the tool call running in this context, if any."""
+    return _current_cancel_token.get()
+
+
+@contextmanager
+def deadline_scope(deadline: float = None):
+    """
+    Runs the enclosed tool calls under a deadline: each call is limited to the time
+    left and cancelled when it runs out.
+
+    Args:
+        deadline (float, optional): time.monotonic() value. None leaves calls unbounded.
+    """
+    reset_token = _current_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _current_deadline.reset(reset_token)
+
+
+def remaining_time():
+    """Seconds left before the deadline of the current run, or None if it has none."""
+    deadline = _current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def report_call_details(**details) -> None:
+    """
+    Lets the running tool add facts (e.g. rows returned, the SQL it ran) to the profile
+    of its call. Does nothing outside a tool call.
+    """
+    current = _current_call_details.get()
+    if current is not None:
+        current.update(details)
+
+
+class ToolPolicy:
+    """
+    Execution limits for a tool.
+    """
+    def __init__(self, timeout: float = None, max_concurrency: int = None, use_process: bool = False):
+        """
+        Args:
+            timeout (float, optional): Wall-clock limit in seconds for one call.
+            max_concurrency (int, optional): Maximum number of calls of this tool running at once.
+            use_process (bool): Run the tool in a process pool (for CPU-heavy tools). The
+                                function and its arguments must be picklable, and a timed
+                                out call keeps its worker process busy until it finishes.
+        """
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.use_process = use_process
+
+
 class BaseTool:
     """
     A base class for all tools.
     The description of the tool is automatically taken from the function's docstring.
     """
-    def __init__(self, name: str, func):
+    def __init__(self, name: str, func, keywords: str = "", policy: ToolPolicy = None):
         """
         Initializes the tool.
 
         Args:
             name (str): The name of the tool.
             func (callable): The function that the tool will execute.
+            keywords (str, optional): Extra words (e.g. in the users' language) that help
+                                      match this tool to a question. Not shown in prompts.
+            policy (ToolPolicy, optional): Timeout, concurrency and isolation limits.
+                                           Without a policy the tool runs inline.
         """
         self.name = name
         self.description = func.__doc__
         self.func = func
+        self.keywords = keywords
+        self.policy = policy
+        self._slots = None
+        if policy is not None and policy.max_concurrency:
+            self._slots = threading.BoundedSemaphore(policy.max_concurrency)
 
     def run(self, *args):
-        """Executes the tool's function with the given arguments."""
+        """Executes the tool's function with the given arguments and profiles the call."""
+        details = {}
+        reset_token = _current_call_details.set(details)
+        start = time.perf_counter()
         try:
-            return self.func(*args)
+            result = self._run(args)
+        finally:
+            _current_call_details.reset(reset_token)
+        tool_profiler.record(self.name, time.perf_counter() - start, result, details)
+        return result
+
+    def _run(self, args):
+        remaining = remaining_time()
+        if self.policy is None and remaining is None:
+            try:
+                return self.func(*args)
+            except Exception as e:
+                return f"Error running tool '{self.name}': {e}"
+        return self._run_with_policy(args, remaining)
+
+    def _invoke(self, token: CancelToken, args):
+        _current_cancel_token.set(token)
+        return self.func(*args)
+
+    def _run_with_policy(self, args, remaining: float = None):
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+
+        policy = self.policy or ToolPolicy()
+        timeout = policy.timeout
+        # Under a run deadline the call gets at most the time left.
+        by_deadline = remaining is not None and (timeout is None or remaining < timeout)
+        if by_deadline:
+            if remaining <= 0:
+                return tool_error(self.name, "DeadlineExceeded",
+                                  f"The time budget of the request ran out before '{self.name}' could start.")
+            timeout = remaining
+        if self._slots is not None and not self._slots.acquire(timeout=timeout):
+            return tool_error(self.name, "ToolBusy",
+                              f"Too many '{self.name}' calls are already running. Try again later or use fewer calls.")
+
+        token = CancelToken()
+        try:
+            if policy.use_process:
+                future = _get_process_pool().submit(self.func, *args)
+            else:
+                future = _get_thread_pool().submit(contextvars.copy_context().run, self._invoke, token, args)
+        except Exception as e:
+            if self._slots is not None:
+                self._slots.release()
+            return f"Error running tool '{self.name}': {e}"
+        # The slot is held until the call really finishes, even if we stop waiting for it.
+        if self._slots is not None:
+            future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            token.cancel()
+            future.cancel()
+            if by_deadline:
+                return tool_error(self.name, "DeadlineExceeded",
+                                  f"'{self.name}' was cancelled when the time budget of the request ran out.")
+            return tool_error(self.name, "ToolTimeout",
+                              f"'{self.name}' did not finish within {timeout} seconds and was cancelled. "
+                              f"Simplify the call (e.g. add filters, aggregate or LIMIT) and try again.")
         except Exception as e:
             return f"Error running tool '{self.name}': {e}"
 
@@ -33,12 +249,23 @@ class ToolManager:
     """
     def __init__(self):
         self.tools = {}
+        self.pinned = set()
+        self._index = None
+
+    def add_tool(self, tool: BaseTool, pinned: bool = False):
+        """
+        Adds a tool to the manager.
 
-    def add_tool(self, tool: BaseTool):
-        """Adds a tool to the manager."""
+        Args:
+            tool (BaseTool): The tool to register.
+            pinned (bool): If True, the tool is always offered to the agent (e.g. Final_Answer).
+        """
         if not isinstance(tool, BaseTool):
             raise TypeError("Only instances of BaseTool can be added.")
         self.tools[tool.name] = tool
+        if pinned:
+            self.pinned.add(tool.name)
+        self._index = None
 
     def get_tool(self, tool_name: str) -> BaseTool:
         """Retrieves a tool by its name."""
@@ -51,11 +278,60 @@ class ToolManager:
         """Returns a list of all registered tools."""
         return list(self.tools.values())
 
-    def get_descriptions(self) -> List[str]:
-        """Returns a list of descriptions of all registered tools."""
-        tool_descriptions = "\n".join([f"- {tool.name}: {tool.description}" for tool in self.get_all_tools()])
+    def _get_index(self):
+        """Builds (once per registry change) the similarity index over tool descriptions."""
+        if self._index is None:
+            from vector_store import VectorStoreMemory
+            candidates = [tool for tool in self.get_all_tools() if tool.name not in self.pinned]
+            index = VectorStoreMemory()
+            index.add([f"{tool.name} {tool.keywords} {tool.description or ''}" for tool in candidates], kind="tool")
+            self._index = (index, {text: tool.name for text, tool in zip(index.texts, candidates)})
+        return self._index
+
+    def select_tools(self, query: str, k: int = None) -> List[BaseTool]:
+        """
+        Selects the tools relevant to a query.
+
+        Args:
+            query (str): The user question.
+            k (int, optional): Number of non-pinned tools to keep. None keeps every tool.
+
+        Returns:
+            List[BaseTool]: Pinned tools plus the k most relevant others, in registration order.
+        """
+        if k is None or not query:
+            return self.get_all_tools()
+        index, names = self._get_index()
+        selected = set(self.pinned)
+        selected.update(names[text] for text, _ in index.search(query, k=k, kind="tool"))
+        return [tool for tool in self.get_all_tools() if tool.name in selected]
+
+    def get_descriptions(self, query: str = None, k: int = None) -> str:
+        """
+        Returns the descriptions of the registered tools, one per line.
+
+        Args:
+            query (str, optional): The user question. When given with k, only the
+                                   relevant tools are described.
+            k (int, optional): Number of non-pinned tools to describe.
+        """
+        tool_descriptions = "\n".join([f"- {tool.name}: {tool.description}" for tool in self.select_tools(query, k)])
         return tool_descriptions
 
+    def description_savings(self, query: str, k: int) -> dict:
+        """
+        Measures how many prompt tokens tool selection saves for a query.
+
+        Returns:
+            dict: Estimated tokens for all tools, for the selected tools, and the difference.
+        """
+        from prompt_template import estimate_tokens
+        all_tokens = estimate_tokens(self.get_descriptions())
+        selected_tokens = estimate_tokens(self.get_descriptions(query, k))
+        return {"all_tokens": all_tokens,
+                "selected_tokens": selected_tokens,
+                "saved_tokens": all_tokens - selected_tokens}
+
 # --- Concrete Tool Implementations ---
 
 def get_current_time(component: str = "datetime"):
@@ -80,6 +356,14 @@ def get_current_time(component: str = "datetime"):
         return f"Unsupported time component: {component}. Options are 'year', 'month', 'day', or 'datetime'."
 
 
+def _to_number(value):
+    """Reads numbers given as strings (e.g. '1,250,000'); whole numbers become int."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    number = float(str(value).strip().replace(",", ""))
+    return int(number) if number.is_integer() else number
+
+
 def calculator(operation: str, *args):
     """
     Performs basic mathematical operations (e.g., add, subtract, multiply, divide).
@@ -89,8 +373,10 @@ def calculator(operation: str, *args):
     """
 
     # We'll use a simple, safe set of operations
-    for num in args:
-        num = int(num)
+    try:
+        args = [_to_number(num) for num in args]
+    except (TypeError, ValueError):
+        return f"All arguments must be numbers, got {list(args)}."
     if operation == 'add':
         return sum(args)
     elif operation == 'subtract':
@@ -111,6 +397,31 @@ def calculator(operation: str, *args):
     else:
         return f"Unsupported operation: {operation}"
 
+def evaluate_expression(expression: str, variables: dict = None):
+    """
+    Evaluates a whole arithmetic expression in one step, e.g. "sum(revenue) / months" or
+    "pct_change(monthly) * 100". Prefer it over chaining several calculator calls.
+
+    Args:
+        expression (str): Numbers, + - * / // % **, parentheses, [lists], indexing (x[0], x[-3:]) and the
+                          functions sum, mean, median, min, max, std, var, count, abs, round, sqrt, log, exp,
+                          cumsum, diff, pct_change, share, first, last. Operators work element-wise on lists.
+        variables (dict, optional): The names used in the expression and their values, usually results,
+                                    e.g. {"revenue": "$a", "months": 3}. A query result becomes a number, or
+                                    a list for a single numeric column; with several numeric columns pick one
+                                    by name: revenue["total"].
+
+    Returns:
+        The number or list of numbers, or an error message.
+    """
+    # NumPy is only loaded the first time this tool is used.
+    from expression import evaluate, ExpressionError
+
+    try:
+        return evaluate(expression, variables)
+    except ExpressionError as e:
+        return f"Cannot evaluate '{expression}': {e}"
+
 def run_sql_query(query: str, params: tuple = (), db_file="sales_data.db"):
     """
     Executes a SQL query on the specified SQLite database file using parameterized queries
@@ -124,17 +435,42 @@ def run_sql_query(query: str, params: tuple = (), db_file="sales_data.db"):
     Returns:
         str: The query results formatted as a string, or an error message.
     """
+    # Imported here so that registering tools does not pay for pandas/sqlite at startup.
+    import sqlite3
+    import pandas as pd
+    from sql_guard import default_guard, SqlGuardError
+    from snapshot import connect
+
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
+        # Reads the in-memory snapshot of the file when AGENT_SQL_SNAPSHOT is enabled.
+        conn = connect(db_file)
+        token = current_cancel_token()
+        if token is not None:
+            # Abort the statement as soon as the caller times out or cancels.
+            conn.set_progress_handler(lambda: 1 if token.cancelled else 0, SQL_PROGRESS_STEPS)
+            token.on_cancel(conn.interrupt)
+
+        # Refuse writes and runaway plans, and bound results of queries without a LIMIT.
+        report_call_details(sql=query, params=params, db_file=db_file)
+        try:
+            executed, limited = default_guard.prepare(conn, query, params)
+        except SqlGuardError as e:
+            return f"Query rejected: {e}"
 
         # Use pandas.read_sql_query with the params argument for safe execution
-        df = pd.read_sql_query(query, conn, params=params)
+        df = pd.read_sql_query(executed, conn, params=params)
+        report_call_details(executed_sql=executed, rows=len(df))
 
         # If the result is a single value, return it directly.
         if len(df) == 1 and len(df.columns) == 1:
             return df.iloc[0, 0]
 
+        if limited and len(df) > default_guard.max_rows:
+            return (df.head(default_guard.max_rows).to_string() +
+                    f"\n(showing the first {default_guard.max_rows} rows; add filters, aggregate with GROUP BY "
+                    f"or add an explicit LIMIT)")
+
         # Otherwise, return the results as a string
         return df.to_string()
     except sqlite3.Error as e:
@@ -147,6 +483,82 @@ def run_sql_query(query: str, params: tuple = (), db_file="sales_data.db"):
         if conn:
             conn.close()
 
+def run_sharded_query(query: str, period: str, params: tuple = (), table: str = "unified_sales_data"):
+    """
+    Executes a SELECT over a logical table split into one database file per year, reading only
+    the years of the period. Each yearly file runs the query in parallel and the results are
+    merged: SUM, COUNT, TOTAL, MAX, MIN and AVG are combined across years, then HAVING,
+    ORDER BY and LIMIT apply to the merged result. Subqueries and WITH clauses are not supported.
+
+    Args:
+        query (str): The SQL query over `table`, using '?' placeholders for parameters.
+        period (str): '2025', '2025-03', '2025-03-15' or an inclusive range like '2024-07:2025-06'.
+                      Only rows of this period are seen by the query.
+        params (tuple): A tuple of values to substitute into the query placeholders.
+        table (str): The logical table.
+
+    Returns:
+        str: The query results formatted as a string, or an error message.
+    """
+    # Imported here so that registering tools does not pay for pandas/sqlite at startup.
+    import sqlite3
+    import pandas as pd
+    from sql_guard import default_guard, SqlGuardError
+    from shards import get_shard_set, ShardError
+
+    try:
+        shard_set = get_shard_set(table)
+        report_call_details(sql=query, params=params, period=period)
+        names, rows, plan, paths = shard_set.query(query, period, params, cancel_token=current_cancel_token())
+        # Slow calls are explained on the first shard; its parameters are already inlined.
+        report_call_details(executed_sql=plan.shard_query, params=(), db_file=paths[0], rows=len(rows),
+                            shards=paths)
+    except ShardError as e:
+        return f"Sharded query rejected: {e}"
+    except SqlGuardError as e:
+        return f"Query rejected: {e}"
+    except sqlite3.Error as e:
+        return f"Database error: {e}"
+    except Exception as e:
+        return f"An unexpected error occurred: {e}"
+
+    df = pd.DataFrame(rows, columns=names)
+    if len(df) == 1 and len(df.columns) == 1:
+        return df.iloc[0, 0]
+
+    if plan.limit is None and len(df) > default_guard.max_rows:
+        return (df.head(default_guard.max_rows).to_string() +
+                f"\n(showing the first {default_guard.max_rows} rows; add filters, aggregate with GROUP BY "
+                f"or add an explicit LIMIT)")
+    return df.to_string()
+
+def aggregate_sales(metric: str = "total_net", group_by=None, filters: dict = None, period: str = None, db_file="sales_data.db"):
+    """
+    Computes totals, counts or closing debt balances over `unified_sales_data` without writing SQL.
+    Prefer this tool over run_sql_query for sums, counts and end-of-period balances.
+
+    Args:
+        metric (str): 'total_net' (sum of Thành_tiền_Total_Net), 'ticket_price' (sum of Giá_vé_Ticket_Price),
+                      'count' (number of transactions) or 'closing_balance' (last Tiền_nợ of the period/group).
+        group_by (str or list, optional): Any of 'T', 'customer' (Rmks), 'route', 'currency', 'year', 'month', 'day',
+                                          e.g. "month" or ["month", "T"]. Omit for a single total.
+        filters (dict, optional): Equality filters, e.g. {"T": "S"} or {"T": ["S", "R"], "customer": "KH05234"}.
+        period (str, optional): '2025', '2025-03', '2025-03-15' or an inclusive range like '2025-01:2025-03'.
+        db_file (str): The name of the database file.
+
+    Returns:
+        The value itself when there is no grouping, otherwise one 'group: value' line per group.
+    """
+    # NumPy and the column store are only loaded the first time this tool is used.
+    from analytics import get_store
+
+    result = get_store(db_file).aggregate(metric, group_by=group_by, filters=filters, period=period)
+    if not isinstance(result, list):
+        return result
+    if not result:
+        return "No matching transactions."
+    return "\n".join(f"{' | '.join(labels)}: {value}" for labels, value in result)
+
 def Final_Answer(answer: str, *arg):
     """
     Print the final answer to the user.
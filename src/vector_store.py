@@ -0,0 +1,213 @@
+import os
+import json
+import zlib
+import unicodedata
+import numpy as np
+from memory import BaseMemory
+
+
+class HashingEmbedder:
+    """
+    A local, dependency-free text embedder.
+
+    Character n-grams and whole words are hashed (with a stable CRC32, so vectors can be
+    persisted across processes) into a fixed number of signed buckets. Vietnamese
+    diacritics are stripped first so that "công nợ" and "cong no" land on the same features.
+    """
+    def __init__(self, dim: int = 512, ngram: int = 3):
+        """
+        Initializes the embedder.
+
+        Args:
+            dim (int): Size of the embedding vectors.
+            ngram (int): Length of the character n-grams.
+        """
+        self.dim = dim
+        self.ngram = ngram
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercases text and removes diacritics."""
+        text = unicodedata.normalize("NFKD", str(text).lower().replace("đ", "d"))
+        return "".join(c for c in text if not unicodedata.combining(c))
+
+    def features(self, text: str):
+        """Yields the hashed features of a text."""
+        text = self.normalize(text)
+        for word in text.split():
+            yield "w:" + word
+        padded = f" {' '.join(text.split())} "
+        for i in range(len(padded) - self.ngram + 1):
+            yield padded[i:i + self.ngram]
+
+    def embed(self, texts) -> np.ndarray:
+        """
+        Embeds a batch of texts.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            np.ndarray: A C-contiguous float32 matrix of L2-normalized rows.
+        """
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                cols.append(h % self.dim)
+                signs.append(1.0 if (h >> 31) & 1 else -1.0)
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)),
+                  np.asarray(signs, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return np.ascontiguousarray(matrix)
+
+
+class VectorStoreMemory(BaseMemory):
+    """
+    An in-process knowledge base searched by cosine similarity.
+
+    All vectors live in one contiguous float32 matrix, so a search is a single
+    matrix-vector product followed by a partial sort. Each entry has a `kind`
+    (e.g. 'schema' or 'example') so a prompt can ask for the top-k of every kind.
+    """
+    def __init__(self, embedder: HashingEmbedder = None):
+        """
+        Initializes an empty store.
+
+        Args:
+            embedder (HashingEmbedder, optional): The embedder to use.
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.texts = []
+        self.kinds = []
+        self.vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, texts, kind: str = "default") -> None:
+        """
+        Embeds and stores a batch of texts.
+
+        Args:
+            texts (list[str]): The texts to store.
+            kind (str): The category of these texts.
+        """
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        if not texts:
+            return
+        new_vectors = self.embedder.embed(texts)
+        self.vectors = np.ascontiguousarray(np.vstack([self.vectors, new_vectors]))
+        self.texts.extend(texts)
+        self.kinds.extend([kind] * len(texts))
+
+    def search_batch(self, queries, k: int = 4, kind: str = None):
+        """
+        Finds the k most similar entries for each query.
+
+        Args:
+            queries (list[str]): The query texts.
+            k (int): Number of results per query.
+            kind (str, optional): Restrict the search to entries of this kind.
+
+        Returns:
+            list[list[tuple[str, float]]]: (text, score) pairs per query, best first.
+        """
+        if kind is None:
+            candidates = np.arange(len(self.texts))
+        else:
+            candidates = np.flatnonzero(np.asarray(self.kinds) == kind)
+        if len(candidates) == 0 or k <= 0:
+            return [[] for _ in queries]
+
+        scores = self.embedder.embed(queries) @ self.vectors[candidates].T
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for q, idx in enumerate(top):
+            idx = idx[np.argsort(-scores[q, idx])]
+            results.append([(self.texts[candidates[i]], float(scores[q, i])) for i in idx])
+        return results
+
+    def search(self, query: str, k: int = 4, kind: str = None):
+        """Finds the k most similar entries for a single query."""
+        return self.search_batch([query], k=k, kind=kind)[0]
+
+    def load(self, query: str, k: int = 4) -> str:
+        """
+        Renders the k most relevant entries of every kind as prompt text.
+
+        Args:
+            query (str): The user question.
+            k (int): Number of entries per kind.
+        """
+        sections = []
+        for kind in dict.fromkeys(self.kinds):
+            hits = self.search(query, k=k, kind=kind)
+            if hits:
+                sections.append(f"[{kind}]\n" + "\n".join(text for text, _ in hits))
+        return "\n\n".join(sections)
+
+    def clear(self) -> None:
+        """Removes every entry from the store."""
+        self.texts = []
+        self.kinds = []
+        self.vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+
+    def save(self, path: str) -> None:
+        """
+        Persists the store as `<path>.npy` (vectors) and `<path>.json` (texts).
+
+        Args:
+            path (str): The path prefix to write to.
+        """
+        np.save(path + ".npy", self.vectors)
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.embedder.dim, "ngram": self.embedder.ngram,
+                       "texts": self.texts, "kinds": self.kinds}, f, ensure_ascii=False)
+
+    @classmethod
+    def from_file(cls, path: str, mmap: bool = True) -> "VectorStoreMemory":
+        """
+        Loads a store written by `save`.
+
+        Args:
+            path (str): The path prefix used when saving.
+            mmap (bool): Memory-map the vectors instead of reading them into RAM.
+        """
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(HashingEmbedder(dim=meta["dim"], ngram=meta["ngram"]))
+        store.texts = meta["texts"]
+        store.kinds = meta["kinds"]
+        store.vectors = np.load(path + ".npy", mmap_mode="r" if mmap else None)
+        return store
+
+    @classmethod
+    def from_texts(cls, texts_by_kind: dict, path: str = None) -> "VectorStoreMemory":
+        """
+        Builds a store from {kind: [texts]}, reusing the persisted copy at `path` when it
+        holds exactly the same texts.
+
+        Args:
+            texts_by_kind (dict): The texts to index, grouped by kind.
+            path (str, optional): Path prefix of a persisted copy.
+        """
+        texts = [text for group in texts_by_kind.values() for text in group]
+        kinds = [kind for kind, group in texts_by_kind.items() for _ in group]
+        if path and os.path.exists(path + ".json") and os.path.exists(path + ".npy"):
+            cached = cls.from_file(path)
+            if cached.texts == texts and cached.kinds == kinds:
+                return cached
+
+        store = cls()
+        for kind, group in texts_by_kind.items():
+            store.add(group, kind=kind)
+        if path:
+            store.save(path)
+        return store